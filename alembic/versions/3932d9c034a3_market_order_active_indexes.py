@@ -0,0 +1,62 @@
+"""market_order active indexes
+
+撮合、盘口、最优买卖价都按 (resource_id, order_type, status=0) 过滤，按 (price_per_unit, id) 排序。
+按买卖方向各建一条部分索引，只包含进行中的订单，历史订单再多也不影响索引大小。
+表结构由 create_all 建立，这是第一条迁移。
+
+Revision ID: 3932d9c034a3
+Revises:
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3932d9c034a3'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INCLUDE = ["player_id", "total_quantity", "filled_quantity"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 大表在线建索引，CONCURRENTLY 不能在事务里执行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_market_order_asks_active", "market_order",
+            ["resource_id", "price_per_unit", "id"],
+            postgresql_where=sa.text("status = 0 AND order_type = 'sell'"),
+            postgresql_include=INCLUDE,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_market_order_bids_active", "market_order",
+            ["resource_id", sa.text("price_per_unit DESC"), "id"],
+            postgresql_where=sa.text("status = 0 AND order_type = 'buy'"),
+            postgresql_include=INCLUDE,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_market_order_active_id", "market_order", ["id"],
+            postgresql_where=sa.text("status = 0"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.execute("ANALYZE market_order")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_market_order_active_id", table_name="market_order", postgresql_concurrently=True)
+        op.drop_index("ix_market_order_bids_active", table_name="market_order", postgresql_concurrently=True)
+        op.drop_index("ix_market_order_asks_active", table_name="market_order", postgresql_concurrently=True)
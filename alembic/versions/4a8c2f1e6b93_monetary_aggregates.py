@@ -0,0 +1,64 @@
+"""monetary aggregates
+
+货币总量（分片）与全服库存的增量汇总表，迁移时用全表扫描初始化。
+
+Revision ID: 4a8c2f1e6b93
+Revises: e3f6a9d27c15
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from app.core.config import MONETARY_AGGREGATE_SHARDS
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a8c2f1e6b93'
+down_revision: Union[str, Sequence[str], None] = 'e3f6a9d27c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "monetary_aggregate",
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("cash", sa.Float(), nullable=False),
+        sa.Column("locked_cash", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("shard"),
+    )
+    op.create_table(
+        "inventory_aggregate",
+        sa.Column("resource_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["resource_id"], ["resource.id"]),
+        sa.PrimaryKeyConstraint("resource_id"),
+    )
+    # 全部分片、全部资源都建好行，之后的增量写入与对账锁的都是已有行。政府（id 0）不计入
+    op.execute(f"""
+        INSERT INTO monetary_aggregate (shard, cash, locked_cash)
+        SELECT 0,
+               (SELECT coalesce(sum(cash), 0) FROM player WHERE id != 0),
+               (SELECT coalesce(sum(price_per_unit * (total_quantity - filled_quantity)), 0)
+                FROM market_order WHERE order_type = 'buy' AND status = 0 AND player_id != 0)
+        UNION ALL
+        SELECT shard, 0, 0 FROM generate_series(1, {MONETARY_AGGREGATE_SHARDS - 1}) AS shard
+    """)
+    op.execute("""
+        INSERT INTO inventory_aggregate (resource_id, quantity)
+        SELECT resource.id, coalesce(sum(inventory.quantity), 0)
+        FROM resource
+        LEFT JOIN inventory ON inventory.resource_id = resource.id AND inventory.player_id != 0
+        GROUP BY resource.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("inventory_aggregate")
+    op.drop_table("monetary_aggregate")
@@ -0,0 +1,65 @@
+"""market_order archive
+
+已结束的委托移到 market_order_archive，market_order 只保留进行中的订单。
+两张表都按 (player_id, id) 建索引，委托历史按 id 倒序 keyset 分页。
+
+Revision ID: 7c1e5a2b9f40
+Revises: 3932d9c034a3
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5a2b9f40'
+down_revision: Union[str, Sequence[str], None] = '3932d9c034a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "market_order_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("player_id", sa.Integer(), nullable=False),
+        sa.Column("order_type", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("resource_id", sa.Integer(), nullable=False),
+        sa.Column("quality", sa.Integer(), nullable=False),
+        sa.Column("total_quantity", sa.Integer(), nullable=False),
+        sa.Column("filled_quantity", sa.Integer(), nullable=False),
+        sa.Column("price_per_unit", sa.Float(), nullable=False),
+        sa.Column("status", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_market_order_archive_player_id", "market_order_archive", ["player_id", "id"],
+                    if_not_exists=True)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_market_order_player_id", "market_order", ["player_id", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_market_order_player_id", table_name="market_order", postgresql_concurrently=True)
+    # 归档数据搬回 market_order
+    op.execute(
+        "INSERT INTO market_order (id, player_id, order_type, resource_id, quality, total_quantity, "
+        "filled_quantity, price_per_unit, status, created_at) "
+        "SELECT id, player_id, order_type, resource_id, quality, total_quantity, "
+        "filled_quantity, price_per_unit, status, created_at FROM market_order_archive"
+    )
+    op.drop_index("ix_market_order_archive_player_id", table_name="market_order_archive")
+    op.drop_table("market_order_archive")
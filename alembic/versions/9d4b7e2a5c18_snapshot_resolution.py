@@ -0,0 +1,39 @@
+"""snapshot resolution
+
+market_snapshot / resource_snapshot 增加 resolution（1h / 1d / 1w），过了保留期的小时快照压缩为日、周；
+已有的行都是心跳写入的小时快照。补上按时间范围查询用的索引。
+
+Revision ID: 9d4b7e2a5c18
+Revises: 4a8c2f1e6b93
+Create Date: 2026-10-18 22:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7e2a5c18'
+down_revision: Union[str, Sequence[str], None] = '4a8c2f1e6b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("market_snapshot", "resource_snapshot"):
+        op.add_column(table, sa.Column("resolution", sqlmodel.sql.sqltypes.AutoString(length=2),
+                                       nullable=False, server_default="1h"))
+    op.create_index("ix_market_snapshot_timestamp", "market_snapshot", ["timestamp"])
+    op.create_index("ix_resource_snapshot_resource_timestamp", "resource_snapshot", ["resource_id", "timestamp"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_resource_snapshot_resource_timestamp", table_name="resource_snapshot")
+    op.drop_index("ix_market_snapshot_timestamp", table_name="market_snapshot")
+    for table in ("market_snapshot", "resource_snapshot"):
+        op.drop_column(table, "resolution")
@@ -0,0 +1,82 @@
+"""partition exchange_trade_history
+
+exchange_trade_history 改为按 created_at 的 RANGE 分区表（按天），主键改为 (id, created_at)。
+已有数据放进一个 legacy 分区 [最早成交日, 今天)，今天起按天建分区；之后由
+ArchiveService.maintain_trade_partitions 预建和清理。id 沿用原序列。
+
+Revision ID: b5d2e8c41a73
+Revises: 7c1e5a2b9f40
+Create Date: 2026-10-18 14:30:00.000000
+
+"""
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e8c41a73'
+down_revision: Union[str, Sequence[str], None] = '7c1e5a2b9f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, resource_id, seller_id, buyer_id, quantity, price_per_unit, total_amount, created_at"
+PREMAKE_DAYS = 7
+
+
+def create_trade_table(partitioned: bool):
+    primary_key = "PRIMARY KEY (id, created_at)" if partitioned else "PRIMARY KEY (id)"
+    op.execute(f"""
+        CREATE TABLE exchange_trade_history (
+            id INTEGER NOT NULL DEFAULT nextval('exchange_trade_history_id_seq'),
+            resource_id INTEGER NOT NULL REFERENCES resource (id),
+            seller_id INTEGER NOT NULL REFERENCES player (id),
+            buyer_id INTEGER NOT NULL REFERENCES player (id),
+            quantity INTEGER NOT NULL,
+            price_per_unit FLOAT NOT NULL,
+            total_amount FLOAT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            {primary_key}
+        ) {"PARTITION BY RANGE (created_at)" if partitioned else ""}
+    """)
+    op.execute("ALTER SEQUENCE exchange_trade_history_id_seq OWNED BY exchange_trade_history.id")
+    if partitioned:
+        op.create_index("ix_exchange_trade_history_resource_created", "exchange_trade_history",
+                        ["resource_id", "created_at"])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE exchange_trade_history RENAME TO exchange_trade_history_old")
+    op.execute("ALTER TABLE exchange_trade_history_old "
+               "RENAME CONSTRAINT exchange_trade_history_pkey TO exchange_trade_history_old_pkey")
+    create_trade_table(partitioned=True)
+
+    bind = op.get_bind()
+    first_day = bind.execute(sa.text("SELECT min(created_at)::date FROM exchange_trade_history_old")).scalar()
+    today = bind.execute(sa.text("SELECT (now() AT TIME ZONE 'utc')::date")).scalar()
+    if first_day is not None and first_day < today:
+        op.execute(f"CREATE TABLE exchange_trade_history_legacy PARTITION OF exchange_trade_history "
+                   f"FOR VALUES FROM ('{first_day}') TO ('{today}')")
+    for offset in range(PREMAKE_DAYS + 1):
+        day = today + timedelta(days=offset)
+        op.execute(f"CREATE TABLE exchange_trade_history_p{day:%Y%m%d} PARTITION OF exchange_trade_history "
+                   f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')")
+
+    op.execute(f"INSERT INTO exchange_trade_history ({COLUMNS}) SELECT {COLUMNS} FROM exchange_trade_history_old")
+    op.execute("DROP TABLE exchange_trade_history_old")
+    op.execute("ANALYZE exchange_trade_history")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE exchange_trade_history RENAME TO exchange_trade_history_part")
+    op.execute("ALTER TABLE exchange_trade_history_part "
+               "RENAME CONSTRAINT exchange_trade_history_pkey TO exchange_trade_history_part_pkey")
+    op.drop_index("ix_exchange_trade_history_resource_created", table_name="exchange_trade_history_part")
+    create_trade_table(partitioned=False)
+    op.execute(f"INSERT INTO exchange_trade_history ({COLUMNS}) SELECT {COLUMNS} FROM exchange_trade_history_part")
+    op.execute("DROP TABLE exchange_trade_history_part")
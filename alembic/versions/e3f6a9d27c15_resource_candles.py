@@ -0,0 +1,67 @@
+"""resource candles
+
+1m / 5m / 1h / 1d 四张 K 线表，主键 (resource_id, bucket)，结算时 UPSERT 增量维护。
+迁移时用已有成交一次性回填。
+
+Revision ID: e3f6a9d27c15
+Revises: b5d2e8c41a73
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f6a9d27c15'
+down_revision: Union[str, Sequence[str], None] = 'b5d2e8c41a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 表名 -> 周期起始时间表达式
+RESOLUTIONS = {
+    "resource_candle_1m": "date_bin('1 minute', created_at, '1970-01-01')",
+    "resource_candle_5m": "date_bin('5 minutes', created_at, '1970-01-01')",
+    "resource_candle_1h": "date_bin('1 hour', created_at, '1970-01-01')",
+    "resource_candle_1d": "date_bin('1 day', created_at, '1970-01-01')",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, bucket in RESOLUTIONS.items():
+        op.create_table(
+            table,
+            sa.Column("resource_id", sa.Integer(), nullable=False),
+            sa.Column("bucket", sa.DateTime(), nullable=False),
+            sa.Column("open", sa.Float(), nullable=False),
+            sa.Column("high", sa.Float(), nullable=False),
+            sa.Column("low", sa.Float(), nullable=False),
+            sa.Column("close", sa.Float(), nullable=False),
+            sa.Column("volume", sa.Integer(), nullable=False),
+            sa.Column("turnover", sa.Float(), nullable=False),
+            sa.Column("trade_count", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["resource_id"], ["resource.id"]),
+            sa.PrimaryKeyConstraint("resource_id", "bucket"),
+            if_not_exists=True,
+        )
+        op.execute(f"""
+            INSERT INTO {table} (resource_id, bucket, open, high, low, close, volume, turnover, trade_count)
+            SELECT resource_id, {bucket},
+                   (array_agg(price_per_unit ORDER BY created_at, id))[1],
+                   max(price_per_unit), min(price_per_unit),
+                   (array_agg(price_per_unit ORDER BY created_at DESC, id DESC))[1],
+                   sum(quantity), sum(total_amount), count(*)
+            FROM exchange_trade_history
+            GROUP BY resource_id, {bucket}
+            ON CONFLICT DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(list(RESOLUTIONS)):
+        op.drop_table(table)
@@ -19,6 +19,43 @@ INITIAL_CASH = int(os.getenv("INITIAL_CASH", 5000))
 
 GOVERNMENT_PLAYER_ID = 0
 
+# 撮合：每个资源的排队上限，撮合线程数
+MATCHING_QUEUE_SIZE = int(os.getenv("MATCHING_QUEUE_SIZE", 1000))
+MATCHING_THREADS = int(os.getenv("MATCHING_THREADS", 8))
+# 批量下单/撤单每次最多条数
+MARKET_BATCH_SIZE = int(os.getenv("MARKET_BATCH_SIZE", 100))
+# 订单归档每批条数
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", 5000))
+# 成交记录按天分区：提前建几天的分区；保留天数（0 表示不清理）；过期分区 detach（保留为独立表）或 drop
+# 建分区要锁父表，等锁超过 TRADE_PARTITION_LOCK_TIMEOUT_MS 毫秒放弃，下次再建，提前量留足重试的余地
+TRADE_PARTITION_PREMAKE_DAYS = int(os.getenv("TRADE_PARTITION_PREMAKE_DAYS", 30))
+TRADE_PARTITION_LOCK_TIMEOUT_MS = int(os.getenv("TRADE_PARTITION_LOCK_TIMEOUT_MS", 500))
+TRADE_HISTORY_RETENTION_DAYS = int(os.getenv("TRADE_HISTORY_RETENTION_DAYS", 90))
+TRADE_HISTORY_RETENTION_ACTION = os.getenv("TRADE_HISTORY_RETENTION_ACTION", "detach")
+# 盘口推送合并间隔（毫秒），同一资源一个间隔内最多推送一次；0 表示逐笔推送
+EXCHANGE_PUSH_INTERVAL_MS = int(os.getenv("EXCHANGE_PUSH_INTERVAL_MS", 100))
+# 交易所事件日志目录（为空则不记录）；成组刷盘间隔（毫秒）；快照间隔（秒）
+EXCHANGE_JOURNAL_DIR = os.getenv("EXCHANGE_JOURNAL_DIR", os.path.join(BASE_DIR, "data/exchange_journal"))
+EXCHANGE_JOURNAL_FSYNC_MS = int(os.getenv("EXCHANGE_JOURNAL_FSYNC_MS", 10))
+EXCHANGE_JOURNAL_SNAPSHOT_SECONDS = int(os.getenv("EXCHANGE_JOURNAL_SNAPSHOT_SECONDS", 300))
+# /api/public/economy 视图后台重建间隔（秒）
+ECONOMY_VIEW_REFRESH_SECONDS = int(os.getenv("ECONOMY_VIEW_REFRESH_SECONDS", 30))
+# 货币总量分片行数；与全表扫描对账的间隔（分钟）
+MONETARY_AGGREGATE_SHARDS = int(os.getenv("MONETARY_AGGREGATE_SHARDS", 16))
+MONETARY_RECONCILE_MINUTES = int(os.getenv("MONETARY_RECONCILE_MINUTES", 10))
+# 财富分布：服务端游标每块行数；玩家数超过阈值改用分位数草图；草图分位数相对误差
+WEALTH_STREAM_CHUNK_SIZE = int(os.getenv("WEALTH_STREAM_CHUNK_SIZE", 10000))
+WEALTH_APPROX_THRESHOLD = int(os.getenv("WEALTH_APPROX_THRESHOLD", 1000000))
+WEALTH_SKETCH_ACCURACY = float(os.getenv("WEALTH_SKETCH_ACCURACY", 0.01))
+# 经济心跳（宏观 + 资源快照）耗时预算（秒），超出打警告
+HEARTBEAT_BUDGET_SECONDS = float(os.getenv("HEARTBEAT_BUDGET_SECONDS", 10))
+# 快照压缩：小时快照保留天数（之后压缩为日），日快照保留天数（之后压缩为周）；区间查询默认点数
+SNAPSHOT_HOURLY_RETENTION_DAYS = int(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", 7))
+SNAPSHOT_DAILY_RETENTION_DAYS = int(os.getenv("SNAPSHOT_DAILY_RETENTION_DAYS", 90))
+SNAPSHOT_SERIES_POINTS = int(os.getenv("SNAPSHOT_SERIES_POINTS", 200))
+# 全部资源流动性指标的缓存时间（秒）
+LIQUIDITY_CACHE_SECONDS = float(os.getenv("LIQUIDITY_CACHE_SECONDS", 10))
+
 APP_CONFIG = {}
 
 def load_config():
@@ -3,6 +3,9 @@ class GameError(Exception):
     def __init__(self, message:str):
         self.message = message
 
+class NotFoundError(GameError):
+    """ 业务对象不存在，接口返回 404 """
+
 from enum import Enum
 
 class RedirectToLoginException(Exception):
@@ -6,6 +6,8 @@ from typing import Optional, List, Sequence
 from sqlmodel import Session, select, func, and_
 from app.models import BuildingMeta, PlayerBuilding, BuildingTask, PlayerBuildingCreate, Recipe, BuildingMetaCreate
 from app.db.session import SessionDep
+from sqlalchemy.orm import selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 def get_all_building_metas(session: SessionDep) -> List[BuildingMeta]:
     return session.exec(select(BuildingMeta)).all()
@@ -57,6 +59,20 @@ def get_player_buildings(session: SessionDep, player_id:int) -> List[PlayerBuild
     return session.exec(select(PlayerBuilding).where(PlayerBuilding.player_id == player_id)
                         ).all()
 
+async def get_player_buildings_with_tasks_async(session: AsyncSession, player_id: int) \
+        -> List[tuple[PlayerBuilding, BuildingTask | None]]:
+    """ 玩家全部建筑及各自的任务：建筑原型一并预加载，任务一次查询取回 """
+    buildings = (await session.exec(
+        select(PlayerBuilding).where(PlayerBuilding.player_id == player_id)
+        .options(selectinload(PlayerBuilding.building_meta))
+    )).all()
+    tasks = {}
+    if buildings:
+        statement = select(BuildingTask).where(BuildingTask.player_building_id.in_([b.id for b in buildings]))
+        tasks = {t.player_building_id: t for t in (await session.exec(statement)).all()}
+    return [(building, tasks.get(building.id)) for building in buildings]
+
+
 def get_player_building_by_id(session: SessionDep, id: int) -> PlayerBuilding | None:
     return session.get(PlayerBuilding, id)
 
@@ -165,3 +181,8 @@ def get_building_meta_by_resource_id(session: SessionDep, resource_id: int) -> O
     """ 通过resource id 找到 building meta """
     statement = select(BuildingMeta).join(Recipe).where(Recipe.output_resource_id == resource_id)
     return session.exec(statement).one_or_none()
+
+
+async def get_building_meta_by_resource_id_async(session: AsyncSession, resource_id: int) -> Optional[BuildingMeta]:
+    statement = select(BuildingMeta).join(Recipe).where(Recipe.output_resource_id == resource_id)
+    return (await session.exec(statement)).one_or_none()
@@ -3,6 +3,7 @@ from datetime import timedelta
 from app.db.session import SessionDep
 from app.models import BuildingTask,BuildingTaskCreate
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 def get_building_task(session: Session, task_id: int) -> BuildingTask | None:
     return session.get(BuildingTask, task_id)
@@ -12,6 +13,12 @@ def get_building_task_by_player_building_id(session: Session, player_building_id
         select(BuildingTask).where(BuildingTask.player_building_id == player_building_id)
     ).one_or_none()
 
+async def get_building_task_by_player_building_id_async(session: AsyncSession,
+                                                       player_building_id: int) -> BuildingTask | None:
+    return (await session.exec(
+        select(BuildingTask).where(BuildingTask.player_building_id == player_building_id)
+    )).one_or_none()
+
 def get_multi_by_player(session: Session, player_id: int, skip: int = 0, limit: int = 100) -> list[BuildingTask]:
     statement = select(BuildingTask).where(BuildingTask.player_id == player_id).offset(skip).limit(limit)
     return session.exec(statement).all()
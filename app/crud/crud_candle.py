@@ -0,0 +1,101 @@
+"""
+K 线（OHLCV）
+
+每个周期一张表，主键 (resource_id, bucket)。成交结算时把本批成交按周期聚合，
+一条多行 INSERT ... ON CONFLICT DO UPDATE 合并进已有 K 线，不再对成交表做 GROUP BY。
+同一资源的结算由撮合 worker 串行执行，后写入的就是更晚的成交，close 直接覆盖。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import CandleBase, CandleResolution, ResourceCandle1m, ResourceCandle5m, ResourceCandle1h, \
+    ResourceCandle1d
+
+# 周期 -> (表, 秒数)
+CANDLE_TABLES: Dict[CandleResolution, Tuple[Type[CandleBase], int]] = {
+    CandleResolution.M1: (ResourceCandle1m, 60),
+    CandleResolution.M5: (ResourceCandle5m, 5 * 60),
+    CandleResolution.H1: (ResourceCandle1h, 60 * 60),
+    CandleResolution.D1: (ResourceCandle1d, 24 * 60 * 60),
+}
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    """ ts（UTC）所在周期的起始时间 """
+    elapsed = int((ts - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def aggregate_trades(trades: List[dict], seconds: int) -> List[dict]:
+    """ 成交（按时间先后）按 (resource_id, 周期) 聚合成 K 线 """
+    candles: Dict[Tuple[int, datetime], dict] = {}
+    for t in trades:
+        key = (t["resource_id"], bucket_start(t["created_at"], seconds))
+        price = t["price_per_unit"]
+        candle = candles.get(key)
+        if candle is None:
+            candles[key] = {"resource_id": key[0], "bucket": key[1],
+                            "open": price, "high": price, "low": price, "close": price,
+                            "volume": t["quantity"], "turnover": t["total_amount"], "trade_count": 1}
+            continue
+        candle["high"] = max(candle["high"], price)
+        candle["low"] = min(candle["low"], price)
+        candle["close"] = price
+        candle["volume"] += t["quantity"]
+        candle["turnover"] += t["total_amount"]
+        candle["trade_count"] += 1
+    return list(candles.values())
+
+
+def upsert_candles(session: Session, trades: List[dict]):
+    """ 把一批成交（需已带 created_at）合并进各周期 K 线 """
+    if not trades:
+        return
+    for model, seconds in CANDLE_TABLES.values():
+        rows = aggregate_trades(trades, seconds)
+        table = model.__table__
+        statement = insert(table).values(rows)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.resource_id, table.c.bucket],
+            set_={
+                "high": func.greatest(table.c.high, excluded.high),
+                "low": func.least(table.c.low, excluded.low),
+                "close": excluded.close,
+                "volume": table.c.volume + excluded.volume,
+                "turnover": table.c.turnover + excluded.turnover,
+                "trade_count": table.c.trade_count + excluded.trade_count,
+            },
+        )
+        session.execute(statement)
+
+
+def _candles_statement(resource_id: int, resolution: CandleResolution,
+                       start: Optional[datetime], end: Optional[datetime], limit: int):
+    """ 与 [start, end) 有交集的最近 limit 根 K 线（倒序） """
+    model, seconds = CANDLE_TABLES[resolution]
+    statement = select(model).where(model.resource_id == resource_id)
+    if start:
+        statement = statement.where(model.bucket >= bucket_start(start, seconds))
+    if end:
+        statement = statement.where(model.bucket < end)
+    return statement.order_by(model.bucket.desc()).limit(limit)
+
+
+def get_candles(session: Session, resource_id: int, resolution: CandleResolution,
+                start: Optional[datetime], end: Optional[datetime], limit: int) -> List[CandleBase]:
+    """ 与 [start, end) 有交集的最近 limit 根 K 线，按时间升序 """
+    statement = _candles_statement(resource_id, resolution, start, end, limit)
+    return list(reversed(session.exec(statement).all()))
+
+
+async def get_candles_async(session: AsyncSession, resource_id: int, resolution: CandleResolution,
+                            start: Optional[datetime], end: Optional[datetime], limit: int) -> List[CandleBase]:
+    statement = _candles_statement(resource_id, resolution, start, end, limit)
+    return list(reversed((await session.exec(statement)).all()))
@@ -1,8 +1,12 @@
-from typing import List
+from typing import Dict, List
 
 from datetime import timedelta
 from sqlmodel import Session, select, col,func
-from app.models import MarketOrder,ExchangeTradeHistory
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import and_, case, delete, insert, true, union_all
+from sqlalchemy.orm import aliased
+from app.models import MarketOrder, MarketOrderArchive, ExchangeTradeHistory, Resource, Inventory, ResourceSnapshot, \
+    InventoryAggregate
 from datetime import datetime
 from app.db.session import SessionDep
 
@@ -16,11 +20,55 @@ def create_market_order(session: Session, order: MarketOrder) -> MarketOrder:
     return order
 
 
+def create_market_orders(session: Session, orders: List[MarketOrder]) -> List[MarketOrder]:
+    """批量插入委托单，flush 后回填 id"""
+    session.add_all(orders)
+    session.flush()
+    return orders
+
+
 def get_order_by_id(session: Session, order_id: int) -> MarketOrder | None:
     """基础查询：通过 ID 获取订单信息"""
     return session.get(MarketOrder, order_id)
 
 
+async def get_order_by_id_async(session: AsyncSession, order_id: int) -> MarketOrder | None:
+    return await session.get(MarketOrder, order_id)
+
+
+def get_orders_by_ids(session: Session, order_ids: List[int]) -> dict[int, MarketOrder]:
+    """批量查询：一次取回多个订单，按 id 建索引"""
+    if not order_ids:
+        return {}
+    statement = select(MarketOrder).where(col(MarketOrder.id).in_(order_ids))
+    return {o.id: o for o in session.exec(statement).all()}
+
+
+async def get_orders_by_ids_async(session: AsyncSession, order_ids: List[int]) -> dict[int, MarketOrder]:
+    if not order_ids:
+        return {}
+    statement = select(MarketOrder).where(col(MarketOrder.id).in_(order_ids))
+    return {o.id: o for o in (await session.exec(statement)).all()}
+
+
+def get_all_active_orders(session: Session, resource_id: int | None = None) -> List[MarketOrder]:
+    """所有进行中的订单（重建订单簿用），按 id 升序即时间优先"""
+    statement = select(MarketOrder).where(MarketOrder.status == 0)
+    if resource_id is not None:
+        statement = statement.where(MarketOrder.resource_id == resource_id)
+    return session.exec(statement.order_by(MarketOrder.id.asc())).all()
+
+
+def _active_orders_statement(resource_id: int, order_type: str, limit: int):
+    """ 盘口前 limit 笔：卖单按价格升序，买单按价格降序，同价按 id """
+    price = MarketOrder.price_per_unit.asc() if order_type == "sell" else MarketOrder.price_per_unit.desc()
+    return (select(MarketOrder).where(
+        MarketOrder.resource_id == resource_id,
+        MarketOrder.status == 0,
+        MarketOrder.order_type == order_type,
+    ).order_by(price, MarketOrder.id.asc()).limit(limit))
+
+
 def get_active_orders_by_resource(
         session: Session,
         resource_id: int,
@@ -29,23 +77,19 @@ def get_active_orders_by_resource(
     """
     获取订单book, 卖单按价格升序 (由低到高)，买单按价格降序 (由高到低)
     """
-    statement = (select(MarketOrder).where(
-        MarketOrder.resource_id == resource_id,
-        MarketOrder.status == 0
-    ).where(MarketOrder.order_type == "sell")
-                 .order_by(MarketOrder.price_per_unit.asc(),MarketOrder.id.asc()).limit(limit))
-    asks = session.exec(statement).all()
+    return {
+        "asks": session.exec(_active_orders_statement(resource_id, "sell", limit)).all(),
+        "bids": session.exec(_active_orders_statement(resource_id, "buy", limit)).all(),
+    }
 
-    statement = (select(MarketOrder).where(
-        MarketOrder.resource_id == resource_id,
-        MarketOrder.status == 0
-    ).where(MarketOrder.order_type == "buy")
-                 .order_by(MarketOrder.price_per_unit.desc(), MarketOrder.id.asc()).limit(limit))
-    bids = session.exec(statement).all()
+
+async def get_active_orders_by_resource_async(session: AsyncSession, resource_id: int, limit: int = 10):
     return {
-        "asks":asks,
-        "bids":bids
+        "asks": (await session.exec(_active_orders_statement(resource_id, "sell", limit))).all(),
+        "bids": (await session.exec(_active_orders_statement(resource_id, "buy", limit))).all(),
     }
+
+
 def get_sell_orders_where_le_price(session: Session,
                                    resource_id: int,
                                    price: float,
@@ -106,20 +150,69 @@ def set_order_status(session: Session, order_id: int, new_status: int) -> bool:
     return True
 
 
-def get_player_orders(session: Session, player_id: int) -> list[MarketOrder]:
-    """查询玩家自己的所有委托（包含历史）"""
-    statement = select(MarketOrder).where(MarketOrder.player_id == player_id)
-    return session.exec(statement.order_by(col(MarketOrder.created_at).desc())).all()
+HISTORY_COLUMNS = ("id", "order_type", "resource_id", "quality", "price_per_unit",
+                   "total_quantity", "filled_quantity", "status", "created_at")
+ARCHIVE_COLUMNS = HISTORY_COLUMNS + ("player_id",)
+
 
-def total_locked_buy_cash(session:SessionDep) ->int:
-    """ 交易所中买单锁定的金额 """
+def _player_orders_statement(player_id: int, before_id: int | None, limit: int, resource_id: int | None):
+    def page(model):
+        statement = select(*[getattr(model, c) for c in HISTORY_COLUMNS]).where(model.player_id == player_id)
+        if before_id is not None:
+            statement = statement.where(model.id < before_id)
+        if resource_id is not None:
+            statement = statement.where(model.resource_id == resource_id)
+        return statement.order_by(model.id.desc()).limit(limit)
+
+    merged = union_all(page(MarketOrder), page(MarketOrderArchive)).subquery()
+    return select(merged).order_by(merged.c.id.desc()).limit(limit)
+
+
+def get_player_orders(session: Session, player_id: int, before_id: int | None = None, limit: int = 20,
+                      resource_id: int | None = None) -> list:
+    """
+    查询玩家自己的委托（进行中 + 归档），按 id 倒序 keyset 分页：下一页传入本页最后一条的 id。
+    两张表各按 (player_id, id) 索引取一页，UNION ALL 在同一快照里合并，归档中途也不会重复或遗漏。
+    """
+    statement = _player_orders_statement(player_id, before_id, limit, resource_id)
+    return session.execute(statement).mappings().all()
+
+
+async def get_player_orders_async(session: AsyncSession, player_id: int, before_id: int | None = None,
+                                  limit: int = 20, resource_id: int | None = None) -> list:
+    statement = _player_orders_statement(player_id, before_id, limit, resource_id)
+    return (await session.execute(statement)).mappings().all()
+
+
+def archive_orders(session: Session, batch_size: int) -> int:
+    """
+    把一批已完成/已撤销的委托从 market_order 移到 market_order_archive。
+    DELETE ... RETURNING 与 INSERT 在同一条语句里完成；SKIP LOCKED 不等待撮合事务。
+    返回本批条数。
+    """
+    batch = (select(MarketOrder.id)
+             .where(MarketOrder.status != 0)
+             .order_by(MarketOrder.id).limit(batch_size)
+             .with_for_update(skip_locked=True))
+    moved = (delete(MarketOrder).where(MarketOrder.id.in_(batch.scalar_subquery()))
+             .returning(*[getattr(MarketOrder, c) for c in ARCHIVE_COLUMNS])
+             .cte("moved"))
+    statement = insert(MarketOrderArchive).from_select(
+        [*ARCHIVE_COLUMNS, "archived_at"],
+        select(*[moved.c[c] for c in ARCHIVE_COLUMNS], func.now())
+    ).returning(MarketOrderArchive.id)
+    return len(session.execute(statement).all())
+
+
+def total_locked_buy_cash(session:SessionDep) -> float:
+    """ 交易所中买单锁定的金额（全表扫描，日常读取走 crud_monetary 的汇总） """
     statement = select(func.sum(MarketOrder.price_per_unit * (MarketOrder.total_quantity - MarketOrder.filled_quantity))).where(
         MarketOrder.order_type == "buy",
         MarketOrder.status == 0,
         MarketOrder.player_id != 0
     )
     result = session.exec(statement).one()
-    return int(result or 0)
+    return round(result or 0, 3)
 
 def count_active_orders(session: SessionDep):
     """ 挂单总数"""
@@ -151,6 +244,147 @@ def create_trade_record(session: Session,
     return db_trade
 
 
+def create_trade_records(session: Session, trades: List[dict]):
+    """批量创建成交记录，一条多行 INSERT"""
+    if not trades:
+        return
+    now = datetime.utcnow()
+    for t in trades:
+        t["created_at"] = now
+    session.execute(insert(ExchangeTradeHistory), trades)
+
+
+def trade_time_window(since: datetime, until: datetime | None = None):
+    """
+    成交时间区间条件 [since, until]，until 默认当前 UTC 时间。
+    成交表按天分区并预建了未来分区，带上上界才能裁剪到实际覆盖的一两个分区。
+    """
+    return ExchangeTradeHistory.created_at.between(since, until or datetime.utcnow())
+
+
+def get_trades_since(session: Session, since: datetime) -> List[ExchangeTradeHistory]:
+    """ 某时刻之后的全部成交，按时间升序 """
+    statement = select(ExchangeTradeHistory).where(
+        trade_time_window(since)
+    ).order_by(ExchangeTradeHistory.created_at, ExchangeTradeHistory.id)
+    return session.exec(statement).all()
+
+
+def get_trade_buckets(session: Session, since: datetime, unit: str) -> List[tuple]:
+    """
+    某时刻之后的成交按 (资源, 时间桶) 聚合，unit 为 date_trunc 单位（minute / hour）。
+    返回 (resource_id, 桶起始时间, 成交额, 成交量, 笔数)
+    """
+    bucket = func.date_trunc(unit, ExchangeTradeHistory.created_at).label("bucket")
+    statement = (
+        select(ExchangeTradeHistory.resource_id, bucket,
+               func.sum(ExchangeTradeHistory.total_amount),
+               func.sum(ExchangeTradeHistory.quantity),
+               func.count())
+        .where(trade_time_window(since))
+        .group_by(ExchangeTradeHistory.resource_id, bucket)
+    )
+    return session.exec(statement).all()
+
+
+def get_latest_trades_per_resource(session: Session, limit: int) -> List[ExchangeTradeHistory]:
+    """
+    每个资源最近 limit 笔成交。
+    逐资源 LATERAL 走 (resource_id, created_at) 索引倒序取，各分区归并后只读 limit 行。
+    """
+    latest = (select(ExchangeTradeHistory)
+              .where(ExchangeTradeHistory.resource_id == Resource.id)
+              .order_by(ExchangeTradeHistory.created_at.desc(), ExchangeTradeHistory.id.desc())
+              .limit(limit)
+              .lateral())
+    trade = aliased(ExchangeTradeHistory, latest)
+    statement = select(trade).select_from(Resource).join(latest, true())
+    return session.exec(statement).all()
+
+
+def create_resource_snapshots(session: Session, snapshots: List[dict]):
+    """批量写入资源快照，一条多行 INSERT"""
+    if not snapshots:
+        return
+    session.execute(insert(ResourceSnapshot), snapshots)
+
+
+def get_resource_market_rows(session: Session, snapshot_before: datetime):
+    """
+    全部资源的行情汇总，一条语句取回，往返次数与资源数量无关：
+    current_price  最新成交价（逐资源走 (resource_id, created_at) 索引取一行）
+    old_price      snapshot_before 之前最近一次资源快照价
+    stock          全服库存（含政府）
+    挂单深度、成交笔数见 get_liquidity_rows / 成交滚动统计
+    """
+    current_price = (select(ExchangeTradeHistory.price_per_unit)
+                     .where(ExchangeTradeHistory.resource_id == Resource.id)
+                     .order_by(ExchangeTradeHistory.created_at.desc(), ExchangeTradeHistory.id.desc())
+                     .limit(1).scalar_subquery())
+    old_price = (select(ResourceSnapshot.price)
+                 .where(ResourceSnapshot.resource_id == Resource.id, ResourceSnapshot.timestamp <= snapshot_before)
+                 .order_by(ResourceSnapshot.timestamp.desc())
+                 .limit(1).scalar_subquery())
+    stock = (select(Inventory.resource_id, func.sum(Inventory.quantity).label("stock"))
+             .group_by(Inventory.resource_id).subquery())
+
+    statement = (select(Resource.id.label("resource_id"),
+                        func.coalesce(current_price, 0.0).label("current_price"),
+                        old_price.label("old_price"),
+                        func.coalesce(stock.c.stock, 0).label("stock"))
+                 .select_from(Resource)
+                 .outerjoin(stock, stock.c.resource_id == Resource.id)
+                 .order_by(Resource.id))
+    return session.execute(statement).mappings().all()
+
+
+def get_liquidity_rows(session: Session, bands: Dict[str, float]):
+    """
+    流动性输入，全部资源一条语句：
+    进行中挂单扫描一遍，窗口函数取每个资源的 min_ask / max_bid，同一遍里按中间价 ± band 汇总深度，
+    bands 为 {列名后缀: 相对中间价的比例}，得到 ask_depth_<后缀> / bid_depth_<后缀> 列；
+    stock 为玩家持有量（库存汇总表，不含政府）。
+    """
+    remaining = MarketOrder.total_quantity - MarketOrder.filled_quantity
+    is_sell = MarketOrder.order_type == "sell"
+    is_buy = MarketOrder.order_type == "buy"
+    orders = (select(MarketOrder.resource_id, MarketOrder.order_type,
+                     MarketOrder.price_per_unit.label("price"), remaining.label("remaining"),
+                     func.min(MarketOrder.price_per_unit).filter(is_sell)
+                     .over(partition_by=MarketOrder.resource_id).label("min_ask"),
+                     func.max(MarketOrder.price_per_unit).filter(is_buy)
+                     .over(partition_by=MarketOrder.resource_id).label("max_bid"))
+              .where(MarketOrder.status == 0)
+              .subquery())
+    mid = case((and_(orders.c.min_ask.is_not(None), orders.c.max_bid.is_not(None)),
+                (orders.c.min_ask + orders.c.max_bid) / 2),
+               else_=func.coalesce(orders.c.min_ask, orders.c.max_bid))
+    sell = orders.c.order_type == "sell"
+    buy = orders.c.order_type == "buy"
+    band_depths = []
+    for name, band in bands.items():
+        band_depths.append(func.sum(orders.c.remaining).filter(sell, orders.c.price <= mid * (1 + band))
+                           .label(f"ask_depth_{name}"))
+        band_depths.append(func.sum(orders.c.remaining).filter(buy, orders.c.price >= mid * (1 - band))
+                           .label(f"bid_depth_{name}"))
+    book = (select(orders.c.resource_id,
+                   func.min(orders.c.min_ask).label("min_ask"),
+                   func.max(orders.c.max_bid).label("max_bid"),
+                   func.sum(orders.c.remaining).filter(sell).label("ask_depth"),
+                   func.sum(orders.c.remaining).filter(buy).label("bid_depth"),
+                   *band_depths)
+            .group_by(orders.c.resource_id).subquery())
+
+    statement = (select(Resource.id.label("resource_id"),
+                        *[c for c in book.c if c.name != "resource_id"],
+                        InventoryAggregate.quantity.label("stock"))
+                 .select_from(Resource)
+                 .outerjoin(book, book.c.resource_id == Resource.id)
+                 .outerjoin(InventoryAggregate, InventoryAggregate.resource_id == Resource.id)
+                 .order_by(Resource.id))
+    return session.execute(statement).mappings().all()
+
+
 def get_recent_trades_by_resource(session: Session, resource_id: int, limit: int = 20):
     """
     获取某个资源的最近成交（用于前端“最新成交”列表展示）
@@ -162,23 +396,31 @@ def get_recent_trades_by_resource(session: Session, resource_id: int, limit: int
 
 
 
+def _best_order_statement(resource_id: int, order_type: str):
+    """ 最优挂单：卖单价格最低，买单价格最高 """
+    price = MarketOrder.price_per_unit.asc() if order_type == "sell" else MarketOrder.price_per_unit.desc()
+    return select(MarketOrder).where(
+        MarketOrder.resource_id == resource_id,
+        MarketOrder.order_type == order_type,
+        MarketOrder.status == 0
+    ).order_by(price).limit(1)
+
+
 def get_resource_market_lowest_sell_order(session: Session, resource_id: int) -> MarketOrder:
     """ 最低卖价 """
-    statement = select(MarketOrder).where(
-        MarketOrder.resource_id ==resource_id,
-        MarketOrder.order_type=="sell",
-        MarketOrder.status == 0
-    ).order_by(MarketOrder.price_per_unit.asc()).limit(1) # 价格从低到高
-    return session.exec(statement).one_or_none()
+    return session.exec(_best_order_statement(resource_id, "sell")).one_or_none()
 
 def get_resource_market_highest_buy_order(session: Session, resource_id: int) -> MarketOrder:
     """ 最高买价 """
-    statement = select(MarketOrder).where(
-        MarketOrder.resource_id ==resource_id,
-        MarketOrder.order_type=="buy",
-        MarketOrder.status == 0
-    ).order_by(MarketOrder.price_per_unit.desc()).limit(1) # 价格从低到高
-    return session.exec(statement).one_or_none()
+    return session.exec(_best_order_statement(resource_id, "buy")).one_or_none()
+
+
+async def get_resource_market_lowest_sell_order_async(session: AsyncSession, resource_id: int) -> MarketOrder:
+    return (await session.exec(_best_order_statement(resource_id, "sell"))).one_or_none()
+
+
+async def get_resource_market_highest_buy_order_async(session: AsyncSession, resource_id: int) -> MarketOrder:
+    return (await session.exec(_best_order_statement(resource_id, "buy"))).one_or_none()
 
 def get_resource_market_price(session: Session, resource_id: int) -> float:
     """
@@ -187,7 +429,7 @@ def get_resource_market_price(session: Session, resource_id: int) -> float:
     """
     statement = select(ExchangeTradeHistory).where(
         ExchangeTradeHistory.resource_id == resource_id
-    ).order_by(ExchangeTradeHistory.created_at.desc()).limit(5)
+    ).order_by(ExchangeTradeHistory.created_at.desc(), ExchangeTradeHistory.id.desc()).limit(5)
 
     trades = session.exec(statement).all()
     if not trades:
@@ -0,0 +1,88 @@
+"""
+货币总量 / 全服库存的增量表
+
+写入都是 INSERT ... ON CONFLICT DO UPDATE 累加，行不存在时自动补上；
+多行写入按主键排序，不同事务之间加锁顺序一致。
+"""
+from typing import Dict, List
+
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, text
+
+from app.models import MonetaryAggregate, InventoryAggregate, Inventory, Resource
+
+
+def _monetary_upsert(shard: int, cash: float, locked_cash: float):
+    statement = insert(MonetaryAggregate).values(shard=shard, cash=cash, locked_cash=locked_cash)
+    return statement.on_conflict_do_update(
+        index_elements=["shard"],
+        set_={"cash": MonetaryAggregate.cash + statement.excluded.cash,
+              "locked_cash": MonetaryAggregate.locked_cash + statement.excluded.locked_cash},
+    )
+
+
+def _inventory_upsert(rows: List[dict]):
+    statement = insert(InventoryAggregate).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=["resource_id"],
+        set_={"quantity": InventoryAggregate.quantity + statement.excluded.quantity},
+    )
+
+
+def add_deltas(session: Session, shard: int, cash: float, locked_cash: float, inventory: Dict[int, int]):
+    """
+    一个事务的全部增量。两条语句按固定顺序执行：先资金分片行，再按 resource_id 升序的库存行，
+    与 lock_aggregates 的加锁顺序一致，事务之间不会互相等成环。
+    """
+    if cash or locked_cash:
+        session.execute(_monetary_upsert(shard, cash, locked_cash))
+    rows = [{"resource_id": rid, "quantity": qty} for rid, qty in sorted(inventory.items()) if qty]
+    if rows:
+        session.execute(_inventory_upsert(rows))
+
+
+def get_monetary_totals(session: Session) -> dict:
+    """ {"cash": M0, "locked_cash": 买单冻结资金}，只读分片行 """
+    cash, locked_cash = session.exec(
+        select(func.coalesce(func.sum(MonetaryAggregate.cash), 0.0),
+               func.coalesce(func.sum(MonetaryAggregate.locked_cash), 0.0))
+    ).one()
+    return {"cash": cash, "locked_cash": locked_cash}
+
+
+def get_inventory_value(session: Session) -> float:
+    """ 全服库存按 base_price 计价，行数等于资源数 """
+    return session.exec(
+        select(func.coalesce(func.sum(InventoryAggregate.quantity * Resource.base_price), 0.0))
+        .join(Resource, InventoryAggregate.resource_id == Resource.id)
+    ).one()
+
+
+def lock_aggregates(session: Session, shards: int, lock_timeout_ms: int):
+    """
+    对账时锁住全部增量行（顺序与写入一致：先分片，后资源），挡住其他事务的提交。
+    先补齐缺失的分片行与资源行，锁的是完整的集合，不会有对账期间新插入、未被锁住的行。
+    等锁超过 lock_timeout_ms 时报错放弃，不让对账长时间挡住结算。
+    """
+    session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+    session.execute(insert(MonetaryAggregate)
+                    .from_select(["shard", "cash", "locked_cash"],
+                                 select(func.generate_series(0, shards - 1), literal(0.0), literal(0.0)))
+                    .on_conflict_do_nothing(index_elements=["shard"]))
+    session.execute(insert(InventoryAggregate)
+                    .from_select(["resource_id", "quantity"], select(Resource.id, literal(0)).order_by(Resource.id))
+                    .on_conflict_do_nothing(index_elements=["resource_id"]))
+    rows = session.exec(select(MonetaryAggregate).order_by(MonetaryAggregate.shard).with_for_update()).all()
+    inventory = session.exec(select(InventoryAggregate).order_by(InventoryAggregate.resource_id)
+                             .with_for_update()).all()
+    return rows, {row.resource_id: row for row in inventory}
+
+
+def scan_inventory_totals(session: Session) -> Dict[int, int]:
+    """ 全表扫描：每种资源的库存（不含政府） """
+    rows = session.exec(
+        select(Inventory.resource_id, func.sum(Inventory.quantity))
+        .where(Inventory.player_id != 0).group_by(Inventory.resource_id)
+    ).all()
+    return {rid: int(qty or 0) for rid, qty in rows}
@@ -1,5 +1,6 @@
 from typing import List, Optional
 from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.db.session import SessionDep
 from app.models import Player,PlayerCreate
 from app.core.config import INITIAL_CASH
@@ -21,6 +22,15 @@ def get_player_by_id(session: SessionDep, player_id: int) -> Optional[Player]:
     return session.get(Player, player_id)
 
 
+async def get_player_by_id_async(session: AsyncSession, player_id: int) -> Optional[Player]:
+    return await session.get(Player, player_id)
+
+
+async def get_player_cash_async(session: AsyncSession, player_id: int) -> float:
+    """ 只查余额列，拿到的是最新提交的值（不经过 session 里缓存的实体） """
+    return (await session.exec(select(Player.cash).where(Player.id == player_id))).one()
+
+
 def get_player_by_email(session: SessionDep, email: str) -> Optional[Player]:
     statement = select(Player).where(Player.email == email)
     return session.exec(statement).first()
@@ -1,6 +1,8 @@
 from typing import List, Optional
 from sqlalchemy import exc
+from sqlalchemy.orm import selectinload
 from sqlmodel import select, func, delete, col
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.db.session import SessionDep
 from app.models import Recipe, RecipeRequirement, RecipeCreate
 
@@ -59,6 +61,12 @@ def get_recipe_by_output_resource_id(session: SessionDep, resource_id: int) -> R
         select(Recipe).where(Recipe.output_resource_id == resource_id)
     ).one_or_none()
 
+async def get_recipe_by_output_resource_id_async(session: AsyncSession, resource_id: int) -> Recipe:
+    """ 原料一并预加载，异步 session 里不能懒加载 """
+    return (await session.exec(
+        select(Recipe).where(Recipe.output_resource_id == resource_id).options(selectinload(Recipe.inputs))
+    )).one_or_none()
+
 # --- 改 ---
 def update_recipe(session: SessionDep, db_obj: Recipe, obj_in: Recipe) -> Recipe:
     update_data = obj_in.model_dump(exclude_unset=True)
@@ -1,5 +1,6 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.db.session import SessionDep
 from app.models import Resource,ResourceCreate,ResourcePublic
 
@@ -17,6 +18,40 @@ def get_resource(session: SessionDep, resource_id: int) -> Optional[Resource]:
     return session.get(Resource, resource_id)
 
 
+async def get_resource_async(session: AsyncSession, resource_id: int) -> Optional[Resource]:
+    return await session.get(Resource, resource_id)
+
+
+def get_resource_price_meta(session: SessionDep) -> List[tuple]:
+    """ 全部资源的 (id, base_price, base_weight, industry_id)，按 id 排序 """
+    return session.exec(
+        select(Resource.id, Resource.base_price, Resource.base_weight, Resource.industry_id).order_by(Resource.id)
+    ).all()
+
+
+# 资源表很少变动，进程内缓存一份（脱离 session 的副本），管理端修改后清空
+_resource_cache: Dict[int, Resource] = {}
+
+
+def get_resource_cached(session: SessionDep, resource_id: int) -> Optional[Resource]:
+    """ 从缓存取资源，首次访问或缓存清空后整表加载 """
+    if not _resource_cache:
+        for resource in session.exec(select(Resource)).all():
+            _resource_cache[resource.id] = Resource(**resource.model_dump())
+    return _resource_cache.get(resource_id)
+
+
+async def get_resource_cached_async(session: AsyncSession, resource_id: int) -> Optional[Resource]:
+    if not _resource_cache:
+        for resource in (await session.exec(select(Resource))).all():
+            _resource_cache[resource.id] = Resource(**resource.model_dump())
+    return _resource_cache.get(resource_id)
+
+
+def invalidate_resource_cache():
+    _resource_cache.clear()
+
+
 # --- 查（分页列表） ---
 def get_resources_page(session: SessionDep, page: int = 1, page_size: int = 10):
     skip = (page - 1) * page_size
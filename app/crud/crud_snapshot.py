@@ -0,0 +1,77 @@
+"""
+宏观 / 资源快照的压缩与区间查询
+
+心跳每小时写一行（resolution=1h）。过了保留期的行按日、周压缩：
+DELETE ... RETURNING 与按桶聚合的 INSERT 在同一条语句里完成，每个桶（资源快照还要按资源）一行，
+timestamp 为桶起始时间，指标取桶内均值。
+区间查询按指定粒度 date_trunc 分桶求均值，比该粒度更粗的行各自成一个桶。
+"""
+from datetime import datetime
+from typing import Dict, List, Sequence, Type
+
+from sqlalchemy import Integer, delete, insert, literal
+from sqlmodel import Session, SQLModel, select, func
+
+from app.models import MarketSnapshot, ResourceSnapshot, SnapshotResolution
+
+# 粒度 -> date_trunc 单位
+SNAPSHOT_UNITS: Dict[SnapshotResolution, str] = {
+    SnapshotResolution.HOUR: "hour",
+    SnapshotResolution.DAY: "day",
+    SnapshotResolution.WEEK: "week",
+}
+MARKET_METRICS = ("cpi", "m1_total", "turnover", "volume", "order_count", "gini_index", "total_assets")
+# 整数列，均值四舍五入
+INT_METRICS = {"volume", "order_count"}
+
+
+def _avg(column, name: str):
+    if name in INT_METRICS:
+        return func.round(func.avg(column)).cast(Integer)
+    return func.avg(column)
+
+
+def _rollup(session: Session, model: Type[SQLModel], keys: Sequence[str], metrics: Sequence[str],
+            source: SnapshotResolution, target: SnapshotResolution, before: datetime) -> int:
+    """ 把 before 之前粒度为 source 的行压缩为 target 粒度，返回写入的桶数 """
+    moved = (delete(model)
+             .where(model.resolution == source.value, model.timestamp < before)
+             .returning(model.timestamp, *[getattr(model, c) for c in (*keys, *metrics)])
+             .cte("moved"))
+    bucket = func.date_trunc(SNAPSHOT_UNITS[target], moved.c.timestamp)
+    rows = (select(*[moved.c[k] for k in keys], bucket,
+                   *[_avg(moved.c[m], m) for m in metrics], literal(target.value))
+            .group_by(*[moved.c[k] for k in keys], bucket))
+    statement = insert(model).from_select([*keys, "timestamp", *metrics, "resolution"], rows).returning(model.id)
+    return len(session.execute(statement).all())
+
+
+def rollup_market_snapshots(session: Session, source: SnapshotResolution, target: SnapshotResolution,
+                            before: datetime) -> int:
+    return _rollup(session, MarketSnapshot, (), MARKET_METRICS, source, target, before)
+
+
+def rollup_resource_snapshots(session: Session, source: SnapshotResolution, target: SnapshotResolution,
+                              before: datetime) -> int:
+    return _rollup(session, ResourceSnapshot, ("resource_id",), ("price",), source, target, before)
+
+
+def get_market_series(session: Session, start: datetime, end: datetime,
+                      resolution: SnapshotResolution) -> List[tuple]:
+    """ [start, end] 内按粒度分桶的宏观指标 (bucket, *MARKET_METRICS)，按时间升序 """
+    bucket = func.date_trunc(SNAPSHOT_UNITS[resolution], MarketSnapshot.timestamp).label("bucket")
+    statement = (select(bucket, *[_avg(getattr(MarketSnapshot, m), m).label(m) for m in MARKET_METRICS])
+                 .where(MarketSnapshot.timestamp.between(start, end))
+                 .group_by(bucket).order_by(bucket))
+    return session.exec(statement).all()
+
+
+def get_resource_series(session: Session, resource_id: int, start: datetime, end: datetime,
+                        resolution: SnapshotResolution) -> List[tuple]:
+    """ [start, end] 内按粒度分桶的资源价格 (bucket, price)，按时间升序 """
+    bucket = func.date_trunc(SNAPSHOT_UNITS[resolution], ResourceSnapshot.timestamp).label("bucket")
+    statement = (select(bucket, func.avg(ResourceSnapshot.price).label("price"))
+                 .where(ResourceSnapshot.resource_id == resource_id,
+                        ResourceSnapshot.timestamp.between(start, end))
+                 .group_by(bucket).order_by(bucket))
+    return session.exec(statement).all()
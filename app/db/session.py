@@ -1,10 +1,18 @@
 from typing import Annotated
 
 from sqlmodel import SQLModel, Session
-from app.db.db import engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.db import engine, async_engine
 from fastapi import Depends
 
 def get_session():
     with Session(engine) as session:
         yield session
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+SessionDep = Annotated[Session, Depends(get_session)]
+
+
+async def get_async_session():
+    # 提交后不过期实体，避免之后访问属性时触发隐式 IO
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
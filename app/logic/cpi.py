@@ -0,0 +1,94 @@
+"""
+CPI（物价指数）
+
+CPI = Σ w_i * P_i / B_i / Σ w_i * 100，P 为市场价（无成交时取基准价 B），w 为篮子权重。
+资源元数据一次查询取回，市场价取自行情缓存，各篮子的权重组成矩阵，一次矩阵乘法算出全部篮子。
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+DEFAULT_BASKET = "all"
+
+# 行业 id，与 Industry.id / Resource.industry_id 同类型（字符串，如 "food"）
+IndustryId = str
+# crud_resources.get_resource_price_meta 的行：(resource_id, base_price, base_weight, industry_id)
+ResourceMetaRow = Tuple[int, Optional[float], Optional[float], Optional[IndustryId]]
+
+
+class CpiBasket:
+    """
+    篮子定义：
+    weights     显式权重 {resource_id: 权重}，未列出的资源不计入；为空则用资源的 base_weight
+    industries  只计入这些行业的资源
+    equal       等权（忽略 base_weight）
+    """
+
+    def __init__(self, name: str, description: str = "", weights: Optional[Dict[int, float]] = None,
+                 industries: Optional[Iterable[IndustryId]] = None, equal: bool = False):
+        self.name = name
+        self.description = description
+        self.weights = weights
+        self.industries: Optional[Set[IndustryId]] = set(industries) if industries is not None else None
+        self.equal = equal
+
+    def weight_vector(self, meta: "ResourceMeta") -> np.ndarray:
+        if self.weights is not None:
+            w = np.array([self.weights.get(rid, 0.0) for rid in meta.ids], dtype=float)
+        elif self.equal:
+            w = np.ones(len(meta.ids))
+        else:
+            w = meta.base_weights.copy()
+        if self.industries is not None:
+            w[~np.isin(meta.industries, list(self.industries))] = 0.0
+        return w
+
+
+# 内置篮子；另外每个行业自动有一个 "industry:<行业 id>" 篮子
+BASKETS: Dict[str, CpiBasket] = {
+    "all": CpiBasket("all", "全部资源，按 base_weight 加权"),
+    "equal": CpiBasket("equal", "全部资源等权", equal=True),
+}
+
+
+def register_basket(basket: CpiBasket):
+    BASKETS[basket.name] = basket
+
+
+class ResourceMeta:
+    """ 资源的 id / 基准价 / 权重 / 行业，按 id 对齐的数组 """
+
+    def __init__(self, rows: List[ResourceMetaRow]):
+        self.ids: List[int] = [row[0] for row in rows]
+        self.base_prices = np.array([row[1] or 0.0 for row in rows], dtype=float)
+        self.base_weights = np.array([1.0 if row[2] is None else row[2] for row in rows], dtype=float)
+        # 各资源的 IndustryId，没有行业为 ""
+        self.industries = np.array([row[3] or "" for row in rows], dtype=object)
+
+    def baskets(self) -> Dict[str, CpiBasket]:
+        """ 内置篮子 + 每个行业一个篮子 """
+        result = dict(BASKETS)
+        for industry in sorted(set(self.industries) - {""}):
+            name = f"industry:{industry}"
+            result.setdefault(name, CpiBasket(name, f"{industry} 行业", industries=[industry]))
+        return result
+
+
+def compute_cpi(meta: ResourceMeta, market_prices: np.ndarray, baskets: List[CpiBasket]) -> Dict[str, float]:
+    """ market_prices 与 meta.ids 对齐，0 表示没有成交 """
+    if not meta.ids:
+        return {basket.name: 1.0 for basket in baskets}
+    valid = meta.base_prices > 0
+    prices = np.where(market_prices > 0, market_prices, meta.base_prices)
+    ratios = np.divide(prices, meta.base_prices, out=np.zeros_like(prices), where=valid)
+
+    weights = np.vstack([basket.weight_vector(meta) for basket in baskets])
+    weights[:, ~valid] = 0.0
+    totals = weights.sum(axis=1)
+    weighted = weights @ ratios
+
+    result = {}
+    for basket, total, value in zip(baskets, totals, weighted):
+        # 与原先一致：空篮子返回默认基准值 1.0
+        result[basket.name] = round(float(value / total), 3) * 100 if total > 0 else 1.0
+    return result
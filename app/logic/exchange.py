@@ -0,0 +1,242 @@
+"""
+交易所内存订单簿
+
+每个资源一本订单簿，价格优先、时间优先。
+启动时从 market_order(status=0) 重建，之后随挂单、成交、撤单同步更新，
+撮合只需要按价格档位从最优价往下走，不再扫描 market_order 表。
+
+订单簿同时维护 L2 行情：记录每次变动涉及的价格档位，由撮合 worker 在任务结束后取出，
+以递增的 seq 作为增量推送；订单簿重建后改推全量快照。
+"""
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class BookOrder:
+    """ 订单簿中的挂单，只保留撮合需要的字段 """
+    __slots__ = ("id", "player_id", "order_type", "price", "remaining")
+
+    def __init__(self, id: int, player_id: int, order_type: str, price: float, remaining: int):
+        self.id = id
+        self.player_id = player_id
+        self.order_type = order_type
+        self.price = price
+        self.remaining = remaining
+
+    @classmethod
+    def from_order(cls, order) -> "BookOrder":
+        """ 由 MarketOrder 构造 """
+        return cls(order.id, order.player_id, order.order_type, order.price_per_unit,
+                   order.total_quantity - order.filled_quantity)
+
+
+class PriceLevel:
+    """ 价格档位：同价订单按时间先后排队 """
+    __slots__ = ("price", "orders", "quantity")
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders: Deque[BookOrder] = deque()
+        self.quantity = 0
+
+
+class OrderBook:
+    """ 单个资源的订单簿 """
+
+    def __init__(self, resource_id: int):
+        self.resource_id = resource_id
+        self.asks: Dict[float, PriceLevel] = {}
+        self.bids: Dict[float, PriceLevel] = {}
+        # 价格升序；卖单从头部取最优，买单从尾部取最优
+        self._ask_prices: List[float] = []
+        self._bid_prices: List[float] = []
+        self._orders: Dict[int, BookOrder] = {}
+        # L2 行情序号，每推送一次增量 +1
+        self.seq = 0
+        # 自上次推送以来变动过的档位 (order_type, price)
+        self._changed: Set[Tuple[str, float]] = set()
+        # 重建后需要推送全量快照
+        self.needs_resync = False
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: int):
+        return order_id in self._orders
+
+    def _side(self, order_type: str) -> Tuple[Dict[float, PriceLevel], List[float]]:
+        if order_type == "sell":
+            return self.asks, self._ask_prices
+        return self.bids, self._bid_prices
+
+    def add(self, order: BookOrder):
+        """ 挂单入簿，排在同价位队尾 """
+        if order.remaining <= 0 or order.id in self._orders:
+            return
+        levels, prices = self._side(order.order_type)
+        level = levels.get(order.price)
+        if level is None:
+            level = PriceLevel(order.price)
+            levels[order.price] = level
+            insort(prices, order.price)
+        level.orders.append(order)
+        level.quantity += order.remaining
+        self._orders[order.id] = order
+        self._changed.add((order.order_type, order.price))
+
+    def _drop_level(self, order_type: str, price: float):
+        levels, prices = self._side(order_type)
+        del levels[price]
+        del prices[bisect_left(prices, price)]
+
+    def remove(self, order_id: int) -> Optional[BookOrder]:
+        """ 撤单出簿 """
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        levels, _ = self._side(order.order_type)
+        level = levels[order.price]
+        level.orders.remove(order)
+        level.quantity -= order.remaining
+        if not level.orders:
+            self._drop_level(order.order_type, order.price)
+        self._changed.add((order.order_type, order.price))
+        return order
+
+    def fill(self, order_id: int, quantity: int):
+        """ 挂单成交 quantity，全部成交后出簿 """
+        order = self._orders[order_id]
+        levels, _ = self._side(order.order_type)
+        level = levels[order.price]
+        quantity = min(quantity, order.remaining)
+        order.remaining -= quantity
+        level.quantity -= quantity
+        self._changed.add((order.order_type, order.price))
+        if order.remaining == 0:
+            level.orders.remove(order)
+            del self._orders[order_id]
+            if not level.orders:
+                self._drop_level(order.order_type, order.price)
+
+    def match(self, order_type: str, limit_price: float, quantity: int, player_id: int) \
+            -> List[Tuple[BookOrder, int]]:
+        """
+        新订单与对手盘撮合，直接在簿上扣减成交量。
+        买单吃价格 <= limit_price 的卖单，卖单吃价格 >= limit_price 的买单；
+        跳过同一玩家的挂单（自成交）。
+        返回 [(对手挂单, 成交量)]，按撮合先后排列。
+        """
+        fills: List[Tuple[BookOrder, int]] = []
+        levels, prices = self._side("sell" if order_type == "buy" else "buy")
+        i = 0
+        while quantity > 0 and i < len(prices):
+            price = prices[i] if order_type == "buy" else prices[-1 - i]
+            if order_type == "buy" and price > limit_price:
+                break
+            if order_type == "sell" and price < limit_price:
+                break
+            level = levels[price]
+            for resting in list(level.orders):
+                if quantity <= 0:
+                    break
+                if resting.player_id == player_id:
+                    continue
+                qty = min(quantity, resting.remaining)
+                fills.append((resting, qty))
+                quantity -= qty
+                self.fill(resting.id, qty)
+            # 档位被吃光会从价格列表移除，下标不前进
+            if price in levels:
+                i += 1
+        return fills
+
+    def orders(self) -> List[BookOrder]:
+        """ 全部挂单：卖盘、买盘各按价格升序，同价按时间先后 """
+        return [order
+                for levels, prices in ((self.asks, self._ask_prices), (self.bids, self._bid_prices))
+                for price in prices
+                for order in levels[price].orders]
+
+    def best_ask(self) -> Optional[float]:
+        return self._ask_prices[0] if self._ask_prices else None
+
+    def best_bid(self) -> Optional[float]:
+        return self._bid_prices[-1] if self._bid_prices else None
+
+    def _level_row(self, order_type: str, price: float) -> list:
+        """ [价格, 挂单量, 挂单数]，档位已清空时量为 0 """
+        levels, _ = self._side(order_type)
+        level = levels.get(price)
+        if level is None:
+            return [price, 0, 0]
+        return [price, level.quantity, len(level.orders)]
+
+    def l2_snapshot(self, depth: int | None = None) -> dict:
+        """ L2 盘口：卖盘价格升序，买盘价格降序；depth 为每侧档位数，默认全量 """
+        ask_prices = self._ask_prices[:depth]
+        bid_prices = self._bid_prices[::-1][:depth]
+        return {
+            "resource_id": self.resource_id,
+            "seq": self.seq,
+            "asks": [self._level_row("sell", p) for p in ask_prices],
+            "bids": [self._level_row("buy", p) for p in bid_prices],
+        }
+
+    def drain_changes(self) -> Optional[Tuple[str, dict]]:
+        """
+        取出自上次调用以来的盘口变动。
+        返回 ("snapshot", 全量) / ("delta", 变动档位) / None（无变动）。
+        增量带 prev_seq，客户端发现与本地 seq 不连续时应请求重新同步。
+        """
+        if self.needs_resync:
+            self.needs_resync = False
+            self._changed.clear()
+            return "snapshot", self.l2_snapshot()
+        if not self._changed:
+            return None
+        changed, self._changed = self._changed, set()
+        prev_seq = self.seq
+        self.seq += 1
+        return "delta", {
+            "resource_id": self.resource_id,
+            "seq": self.seq,
+            "prev_seq": prev_seq,
+            "asks": [self._level_row("sell", p) for t, p in sorted(changed) if t == "sell"],
+            "bids": [self._level_row("buy", p) for t, p in sorted(changed, reverse=True) if t == "buy"],
+        }
+
+
+class OrderBookManager:
+    """ 全部资源的订单簿 """
+
+    def __init__(self):
+        self.books: Dict[int, OrderBook] = {}
+
+    def get(self, resource_id: int) -> OrderBook:
+        book = self.books.get(resource_id)
+        if book is None:
+            book = OrderBook(resource_id)
+            self.books[resource_id] = book
+        return book
+
+    def load(self, orders: Iterable, resource_id: int | None = None):
+        """
+        用活跃订单重建订单簿，orders 需按 id 升序（即时间优先）。
+        指定 resource_id 时只重建该资源。
+        """
+        if resource_id is None:
+            self.books = {}
+        else:
+            # 序号延续旧簿，订阅者收到更大 seq 的快照后整体替换
+            old = self.books.get(resource_id)
+            book = OrderBook(resource_id)
+            if old is not None:
+                book.seq = old.seq + 1
+                book.needs_resync = True
+            self.books[resource_id] = book
+        for order in orders:
+            self.get(order.resource_id).add(BookOrder.from_order(order))
+        # 加载本身不产生增量
+        for book in (self.books.values() if resource_id is None else [self.books[resource_id]]):
+            book._changed.clear()
@@ -0,0 +1,236 @@
+"""
+交易所事件日志
+
+撮合 worker 在事务提交后追加事件，一行一个 JSON，带全局递增的 seq：
+  accepted  新委托入簿（数量为委托总量）
+  fill      成交：taker / maker 各扣减成交量，扣完出簿
+  cancel    撤单出簿
+  reset     订单簿以数据库为准重建（事务回滚后），带重建后的全部挂单
+写入只进文件缓冲区，后台线程每隔 fsync_interval 毫秒 flush + fsync 一次（成组刷盘），
+进程崩溃最多丢失最近一个刷盘间隔的事件。资金/库存仍以数据库为准，日志用来重建和核对订单簿。
+
+目录布局：
+  journal-<起始 seq>.log  日志分段；快照时切换到新分段，快照已覆盖的旧分段删除
+  snapshot.json           最近一次快照 {"seq": S, "books": {resource_id: {"after": L, "orders": [...]}}}
+每个资源的快照在该资源的撮合 worker 中取，after 为取快照时该资源最后一条事件的 seq，
+重放时该资源只应用 seq > after 的事件，因此不需要全局停顿。
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.logic.exchange import BookOrder, OrderBook, OrderBookManager
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_FILE = "snapshot.json"
+
+
+def order_rows(book: OrderBook) -> List[list]:
+    """ 订单簿挂单 [id, player_id, order_type, price, remaining]，顺序即重建时的入簿顺序 """
+    return [[o.id, o.player_id, o.order_type, o.price, o.remaining] for o in book.orders()]
+
+
+def load_rows(book: OrderBook, rows: List[list]):
+    for row in rows:
+        book.add(BookOrder(*row))
+
+
+def apply_event(books: OrderBookManager, event: dict):
+    """ 在订单簿上重放一条事件 """
+    resource_id = event["resource_id"]
+    kind = event["type"]
+    if kind == "accepted":
+        books.get(resource_id).add(BookOrder(event["order_id"], event["player_id"], event["order_type"],
+                                             event["price"], event["quantity"]))
+    elif kind == "fill":
+        book = books.get(resource_id)
+        for order_id in (event["taker_id"], event["maker_id"]):
+            if order_id in book:
+                book.fill(order_id, event["quantity"])
+    elif kind == "cancel":
+        books.get(resource_id).remove(event["order_id"])
+    elif kind == "reset":
+        book = OrderBook(resource_id)
+        load_rows(book, event["orders"])
+        books.books[resource_id] = book
+
+
+class ExchangeJournal:
+    """ 追加写、成组刷盘的事件日志，directory 为空时不记录 """
+
+    def __init__(self, directory: str, fsync_interval_ms: int):
+        self.directory = directory
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.seq = 0
+        self.flushed_seq = 0
+        # 每个资源最后一条事件的 seq
+        self.resource_seq: Dict[int, int] = {}
+        self.metrics = {"events": 0, "fsyncs": 0, "snapshots": 0}
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self):
+        """ 接着已有日志的 seq 开一个新分段，启动刷盘线程 """
+        if not self.enabled or self._file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = self.load_snapshot()
+        last = snapshot["seq"] if snapshot else 0
+        for event in self.read_events(last):
+            last = event["seq"]
+            self.resource_seq[event["resource_id"]] = last
+        self.seq = self.flushed_seq = last
+        self._open_segment()
+        self._closed.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="exchange-journal", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        with self.lock:
+            self._file.close()
+            self._file = None
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{self.seq + 1:012d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, events: List[dict]):
+        """ 追加事件（撮合 worker 中、事务提交后调用），不等待刷盘 """
+        if not events or self._file is None:
+            return
+        with self.lock:
+            lines = []
+            for event in events:
+                self.seq += 1
+                event["seq"] = self.seq
+                self.resource_seq[event["resource_id"]] = self.seq
+                lines.append(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+            self._file.write("\n".join(lines) + "\n")
+            self.metrics["events"] += len(events)
+
+    def flush(self):
+        """ 把已追加的事件刷到磁盘；fsync 时不挡住追加 """
+        with self._flush_lock:
+            with self.lock:
+                if self._file is None or self.flushed_seq == self.seq:
+                    return
+                self._file.flush()
+                seq, fd = self.seq, self._file.fileno()
+            os.fsync(fd)
+            self.flushed_seq = seq
+            self.metrics["fsyncs"] += 1
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception(f"exchange journal fsync failed. {e}")
+
+    def rotate(self) -> int:
+        """ 刷盘并切换到新分段，返回切换前最后一条事件的 seq """
+        with self._flush_lock, self.lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.flushed_seq = self.seq
+            self._file.close()
+            self._open_segment()
+            return self.seq
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """ [(起始 seq, 路径)]，按 seq 升序 """
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                start = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                result.append((start, os.path.join(self.directory, name)))
+        return sorted(result)
+
+    def read_events(self, after_seq: int = 0) -> Iterator[dict]:
+        """ 依次读出 seq > after_seq 的事件；崩溃时写了一半的尾行忽略 """
+        segments = self.segments()
+        for i, (start, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= after_seq + 1:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"exchange journal: torn record in {path}, ignored")
+                        break
+                    if event["seq"] > after_seq:
+                        yield event
+
+    def load_snapshot(self) -> Optional[dict]:
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_snapshot(self, seq: int, books: Dict[int, dict]):
+        """
+        写快照：books 为 {resource_id: {"after": L, "orders": 挂单行}}，seq 之前的事件都已被快照覆盖。
+        先写临时文件再改名，之后删除快照已覆盖的分段。
+        """
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "books": books}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        segments = self.segments()
+        for (start, old), (next_start, _) in zip(segments, segments[1:]):
+            if next_start <= seq + 1:
+                os.remove(old)
+        self.metrics["snapshots"] += 1
+
+    def replay(self) -> Tuple[OrderBookManager, int]:
+        """ 快照 + 之后的事件重建全部订单簿，返回 (订单簿, 最后一条事件 seq) """
+        books = OrderBookManager()
+        snapshot = self.load_snapshot()
+        last = snapshot["seq"] if snapshot else 0
+        after: Dict[int, int] = {}
+        for resource_id, state in (snapshot["books"] if snapshot else {}).items():
+            resource_id = int(resource_id)
+            load_rows(books.get(resource_id), state["orders"])
+            after[resource_id] = state["after"]
+        snapshot_seq = last
+        for event in self.read_events(last):
+            if event["seq"] > after.get(event["resource_id"], snapshot_seq):
+                apply_event(books, event)
+            last = event["seq"]
+        for book in books.books.values():
+            book._changed.clear()
+        return books, last
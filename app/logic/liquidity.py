@@ -0,0 +1,83 @@
+"""
+流动性评分
+
+全部资源的输入（最优价、盘口深度、24h 成交、库存）一次取齐，用 NumPy 按列计算：
+  liquidity       0-100 综合分：24h 成交笔数（热度，封顶 60）+ 买卖价差（市场共识，1% 内 +40，5% 内 +20）
+  spread_ratio    (最低卖价 - 最高买价) / 最低卖价，缺一侧为 None
+  mid             买卖中间价，缺一侧取另一侧最优价
+  *_depth_1pct    中间价 ±1% 内的挂单剩余量（卖盘 <= mid*1.01，买盘 >= mid*0.99），5pct 同理
+  player_stock    玩家持有量（库存汇总表，不含政府）
+  turnover_ratio  24h 成交量 / player_stock（换手率）
+"""
+from typing import Dict, List, Mapping
+
+import numpy as np
+
+# 盘口深度统计的价格带（相对中间价）
+DEPTH_BANDS = (0.01, 0.05)
+
+
+def band_name(band: float) -> str:
+    return f"{round(band * 100)}pct"
+
+
+# {列名后缀: 价格带}，查询深度时传给 crud_market.get_liquidity_rows
+DEPTH_BAND_COLUMNS = {band_name(band): band for band in DEPTH_BANDS}
+
+
+def score_liquidity(trade_count: np.ndarray, spread_ratio: np.ndarray) -> np.ndarray:
+    """ 综合分（算法可根据游戏手感调整），spread_ratio 为 NaN 表示没有价差，不加分 """
+    score = np.minimum(60, trade_count * 2)
+    score = score + np.where(spread_ratio < 0.01, 40, np.where(spread_ratio < 0.05, 20, 0))
+    return np.minimum(100, score)
+
+
+def _column(rows: List[Mapping], name: str) -> np.ndarray:
+    return np.array([np.nan if row[name] is None else float(row[name]) for row in rows], dtype=np.float64)
+
+
+def _value(x: float, digits: int):
+    return None if np.isnan(x) else round(float(x), digits)
+
+
+def compute_liquidity(rows: List[Mapping], trades_24h: Dict[int, dict]) -> Dict[int, dict]:
+    """
+    rows 为每个资源一行（resource_id, min_ask, max_bid, ask/bid_depth, 各价格带深度, stock），
+    trades_24h 为 {resource_id: {"turnover", "volume", "count"}}。返回 {resource_id: 指标}
+    """
+    ids = [row["resource_id"] for row in rows]
+    min_ask, max_bid = _column(rows, "min_ask"), _column(rows, "max_bid")
+    stock = np.nan_to_num(_column(rows, "stock"))
+    empty = {"turnover": 0.0, "volume": 0, "count": 0}
+    stats = [trades_24h.get(rid, empty) for rid in ids]
+    trade_count = np.array([s["count"] for s in stats], dtype=np.int64)
+    volume = np.array([s["volume"] for s in stats], dtype=np.float64)
+
+    # 最优价为 0 / 缺失按没有价差处理
+    quoted = (min_ask > 0) & (max_bid > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spread_ratio = np.where(quoted, (min_ask - max_bid) / min_ask, np.nan)
+        mid = np.where(quoted, (min_ask + max_bid) / 2, np.fmax(min_ask, max_bid))
+        turnover_ratio = np.where(stock > 0, volume / stock, 0.0)
+    score = score_liquidity(trade_count, spread_ratio)
+
+    depth_columns = ["ask_depth", "bid_depth"] + [f"{side}_depth_{name}"
+                                                  for name in DEPTH_BAND_COLUMNS for side in ("ask", "bid")]
+    depths = {name: np.nan_to_num(_column(rows, name)).astype(np.int64) for name in depth_columns}
+
+    result = {}
+    for i, rid in enumerate(ids):
+        result[rid] = {
+            "liquidity": int(score[i]),
+            "trade_count_24h": int(trade_count[i]),
+            "volume_24h": int(volume[i]),
+            "turnover_24h": stats[i]["turnover"],
+            "player_stock": int(stock[i]),
+            "turnover_ratio": round(float(turnover_ratio[i]), 4),
+            "min_ask": _value(min_ask[i], 3),
+            "max_bid": _value(max_bid[i], 3),
+            "mid": _value(mid[i], 3),
+            "spread_ratio": _value(spread_ratio[i], 4),
+            **{name: int(values[i]) for name, values in depths.items()},
+        }
+    return result
@@ -0,0 +1,118 @@
+"""
+交易所行情缓存
+
+每个资源维护最近 N 笔成交和 24h 滚动窗口：市场价（最近 N 笔成交加权均价）、最新价、
+24h 最高/最低/成交量/成交额/VWAP。
+成交结算提交后写入，启动时从 exchange_trade_history 预热，读取不再查询成交表。
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+# 市场价取最近几笔成交
+MARKET_PRICE_TRADES = 5
+WINDOW = timedelta(hours=24)
+
+
+class ResourceTicker:
+    """ 单个资源的行情 """
+
+    def __init__(self, resource_id: int, recent_size: int = MARKET_PRICE_TRADES):
+        self.resource_id = resource_id
+        self.lock = threading.Lock()
+        # 最近 N 笔 (price, quantity)
+        self.recent: Deque[Tuple[float, int]] = deque(maxlen=recent_size)
+        self.last_price: Optional[float] = None
+        self.last_trade_at: Optional[datetime] = None
+        # 24h 窗口内的成交 (created_at, price, quantity)，按时间先后
+        self.window: Deque[Tuple[datetime, float, int]] = deque()
+        # 单调队列：队首为窗口内最高价/最低价
+        self._highs: Deque[Tuple[datetime, float]] = deque()
+        self._lows: Deque[Tuple[datetime, float]] = deque()
+        self.volume_24h = 0
+        self.turnover_24h = 0.0
+
+    def add(self, price: float, quantity: int, created_at: datetime):
+        """ 记一笔成交，需按成交时间先后调用；顺带移出窗口外的成交，没人读取的资源内存也只有 24h 的量 """
+        with self.lock:
+            self._expire(created_at)
+            self.recent.append((price, quantity))
+            self.last_price = price
+            self.last_trade_at = created_at
+            self.window.append((created_at, price, quantity))
+            self.volume_24h += quantity
+            self.turnover_24h += price * quantity
+            while self._highs and self._highs[-1][1] <= price:
+                self._highs.pop()
+            self._highs.append((created_at, price))
+            while self._lows and self._lows[-1][1] >= price:
+                self._lows.pop()
+            self._lows.append((created_at, price))
+
+    def _expire(self, now: datetime):
+        """ 移出 24h 之前的成交 """
+        cutoff = now - WINDOW
+        while self.window and self.window[0][0] < cutoff:
+            _, price, quantity = self.window.popleft()
+            self.volume_24h -= quantity
+            self.turnover_24h -= price * quantity
+        while self._highs and self._highs[0][0] < cutoff:
+            self._highs.popleft()
+        while self._lows and self._lows[0][0] < cutoff:
+            self._lows.popleft()
+        if not self.window:
+            # 清掉浮点累计误差
+            self.volume_24h = 0
+            self.turnover_24h = 0.0
+
+    @property
+    def market_price(self) -> float:
+        """ 最近 N 笔成交的加权平均价，无成交返回 0 """
+        with self.lock:
+            total_q = sum(q for _, q in self.recent)
+            total_v = sum(p * q for p, q in self.recent)
+        return total_v / total_q if total_q > 0 else 0.0
+
+    def stats(self, now: datetime | None = None) -> dict:
+        """ 24h 行情 """
+        with self.lock:
+            self._expire(now or datetime.utcnow())
+            return {
+                "last_price": self.last_price,
+                "high_24h": self._highs[0][1] if self._highs else None,
+                "low_24h": self._lows[0][1] if self._lows else None,
+                "volume_24h": self.volume_24h,
+                "turnover_24h": round(self.turnover_24h, 3),
+                "vwap_24h": round(self.turnover_24h / self.volume_24h, 3) if self.volume_24h > 0 else None,
+            }
+
+
+class MarketDataCache:
+    """ 全部资源的行情 """
+
+    def __init__(self):
+        self.tickers: Dict[int, ResourceTicker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, resource_id: int) -> ResourceTicker:
+        ticker = self.tickers.get(resource_id)
+        if ticker is None:
+            with self._lock:
+                ticker = self.tickers.setdefault(resource_id, ResourceTicker(resource_id))
+        return ticker
+
+    def market_price(self, resource_id: int) -> float:
+        return self.get(resource_id).market_price
+
+    def record_trades(self, trades: Iterable[dict]):
+        """ 记入成交，trades 为 exchange_trade_history 行（dict），按时间先后 """
+        for trade in trades:
+            self.get(trade["resource_id"]).add(trade["price_per_unit"], trade["quantity"],
+                                               trade.get("created_at") or datetime.utcnow())
+
+    def load(self, trades: Iterable):
+        """ 用历史成交重建，trades 需按成交时间升序 """
+        self.tickers = {}
+        for trade in trades:
+            self.get(trade.resource_id).add(trade.price_per_unit, trade.quantity, trade.created_at)
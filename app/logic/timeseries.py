@@ -0,0 +1,33 @@
+"""
+时间序列降采样
+
+LTTB（Largest-Triangle-Three-Buckets）：首尾两点保留，中间的点均分成 threshold - 2 个桶，
+每个桶选出与「上一个选中点」「下一个桶的均值点」构成三角形面积最大的那个点。
+比等间隔抽样更能保留尖峰和拐点，图表用约 threshold 个点就能画出原曲线的形状。
+"""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """ 返回被选中点的下标（升序）；x 需升序，点数不超过 threshold 时原样返回 """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间 n - 2 个点分成 threshold - 2 个桶，edges[i]..edges[i + 1] 为第 i 个桶
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值点；最后一个桶的下一个「桶」就是终点
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
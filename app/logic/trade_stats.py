@@ -0,0 +1,173 @@
+"""
+成交滚动统计
+
+按资源、按行业、全服各维护一组环形桶，桶内累计 成交额 / 成交量 / 成交笔数：
+  分钟桶 1440 个（24h），回答 1h、24h 窗口（按整分钟对齐）
+  小时桶 168 个（7d），回答 7d 窗口（按整点对齐）
+窗口从当前分钟（小时）往前数整桶，与按精确时刻切的 SQL 相比，最早一个桶内的成交会被整体排除。
+每个桶记下所属的分钟（小时）号，环形复用时发现号不同即清零，不需要后台定时滚动；
+查询按桶号筛选窗口内的桶求和，代价只与桶数有关，与成交笔数无关。
+成交结算提交后写入，启动时从 exchange_trade_history 按分钟 / 小时聚合预热。
+"""
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+MINUTE_BUCKETS = 1440
+HOUR_BUCKETS = 168
+# 窗口名 -> 分钟数
+WINDOWS = {"1h": 60, "24h": 1440, "7d": 10080}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def minute_of(t: datetime) -> int:
+    """ 成交时间（UTC naive）对应的分钟号 """
+    return int((t - _EPOCH).total_seconds() // 60)
+
+
+class _Ring:
+    """ 环形桶：stamps 为各桶所属的分钟（小时）号，values 列为 成交额、成交量、笔数 """
+    __slots__ = ("stamps", "values")
+
+    def __init__(self, size: int):
+        self.stamps = np.full(size, -1, dtype=np.int64)
+        self.values = np.zeros((size, 3), dtype=np.float64)
+
+    def add(self, stamp: int, turnover: float, volume: float, count: int):
+        slot = stamp % len(self.stamps)
+        current = self.stamps[slot]
+        if current != stamp:
+            if current > stamp:
+                # 比环上最老的桶还早，已出窗口
+                return
+            self.stamps[slot] = stamp
+            self.values[slot] = 0
+        self.values[slot] += (float(turnover), float(volume), count)
+
+    def sum(self, first: int, last: int) -> np.ndarray:
+        """ 桶号在 [first, last] 内的累计 """
+        mask = (self.stamps >= first) & (self.stamps <= last)
+        return self.values[mask].sum(axis=0)
+
+
+class RollingTradeStats:
+    """ 单个维度（资源 / 行业 / 全服）的分钟桶 + 小时桶 """
+    __slots__ = ("minutes", "hours")
+
+    def __init__(self):
+        self.minutes = _Ring(MINUTE_BUCKETS)
+        self.hours = _Ring(HOUR_BUCKETS)
+
+    def add(self, minute: int, turnover: float, volume: float, count: int = 1):
+        self.minutes.add(minute, turnover, volume, count)
+        self.hours.add(minute // 60, turnover, volume, count)
+
+    def window(self, minutes: int, now_minute: int) -> dict:
+        if minutes <= MINUTE_BUCKETS:
+            turnover, volume, count = self.minutes.sum(now_minute - minutes + 1, now_minute)
+        else:
+            now_hour = now_minute // 60
+            turnover, volume, count = self.hours.sum(now_hour - minutes // 60 + 1, now_hour)
+        return {"turnover": round(float(turnover), 3), "volume": int(round(volume)), "count": int(round(count))}
+
+
+class TradeStatsAggregator:
+    """
+    全部维度的滚动统计。
+    resolve_industry(resource_id) 用于预热之后新出现的资源，找不到行业时只计资源和全服。
+    它可能查库，总在持锁之前调用，锁内只做内存累加。
+    """
+
+    def __init__(self, resolve_industry: Optional[Callable[[int], Optional[str]]] = None):
+        self.lock = threading.Lock()
+        self.total = RollingTradeStats()
+        self.resources: Dict[int, RollingTradeStats] = {}
+        self.industries: Dict[str, RollingTradeStats] = {}
+        self.industry_of: Dict[int, Optional[str]] = {}
+        self.resolve_industry = resolve_industry
+
+    def _add(self, resource_id: int, minute: int, turnover: float, volume: float, count: int):
+        self.total.add(minute, turnover, volume, count)
+        ring = self.resources.get(resource_id)
+        if ring is None:
+            ring = self.resources[resource_id] = RollingTradeStats()
+        ring.add(minute, turnover, volume, count)
+        industry_id = self.industry_of.get(resource_id)
+        if industry_id is not None:
+            ring = self.industries.get(industry_id)
+            if ring is None:
+                ring = self.industries[industry_id] = RollingTradeStats()
+            ring.add(minute, turnover, volume, count)
+
+    def record_trades(self, trades: Iterable[dict]):
+        """ 记入成交，trades 为 exchange_trade_history 行（dict） """
+        trades = list(trades)
+        resolved = {}
+        if self.resolve_industry is not None:
+            for resource_id in {trade["resource_id"] for trade in trades}:
+                if resource_id not in self.industry_of:
+                    resolved[resource_id] = self.resolve_industry(resource_id)
+        with self.lock:
+            for resource_id, industry_id in resolved.items():
+                self.industry_of.setdefault(resource_id, industry_id)
+            for trade in trades:
+                minute = minute_of(trade.get("created_at") or datetime.utcnow())
+                self._add(trade["resource_id"], minute, trade["total_amount"], trade["quantity"], 1)
+
+    def load(self, industry_of: Dict[int, Optional[str]], hour_rows: Iterable, minute_rows: Iterable):
+        """
+        预热：hour_rows 为 7d 内按 (资源, 小时) 的聚合，minute_rows 为 24h 内按 (资源, 分钟) 的聚合，
+        行为 (resource_id, 桶起始时间, 成交额, 成交量, 笔数)。
+        """
+        with self.lock:
+            self.total = RollingTradeStats()
+            self.resources = {}
+            self.industries = {}
+            self.industry_of = dict(industry_of)
+            for resource_id, bucket, turnover, volume, count in hour_rows:
+                for ring in self._rings(resource_id):
+                    ring.hours.add(minute_of(bucket) // 60, turnover, volume, count)
+            for resource_id, bucket, turnover, volume, count in minute_rows:
+                for ring in self._rings(resource_id):
+                    ring.minutes.add(minute_of(bucket), turnover, volume, count)
+
+    def _rings(self, resource_id: int) -> List[RollingTradeStats]:
+        rings = [self.total, self.resources.setdefault(resource_id, RollingTradeStats())]
+        industry_id = self.industry_of.get(resource_id)
+        if industry_id is not None:
+            rings.append(self.industries.setdefault(industry_id, RollingTradeStats()))
+        return rings
+
+    @staticmethod
+    def _minutes(window: str) -> int:
+        if window not in WINDOWS:
+            raise ValueError(f"unknown window {window}, expected one of {list(WINDOWS)}")
+        return WINDOWS[window]
+
+    def totals(self, window: str = "24h", now: datetime | None = None) -> dict:
+        """ 全服 {"turnover", "volume", "count"} """
+        minutes, now_minute = self._minutes(window), minute_of(now or datetime.utcnow())
+        with self.lock:
+            return self.total.window(minutes, now_minute)
+
+    def windows(self, resource_id: int | None = None, now: datetime | None = None) -> Dict[str, dict]:
+        """ 全服（或单个资源）各窗口的统计 {"1h": {...}, "24h": {...}, "7d": {...}} """
+        now_minute = minute_of(now or datetime.utcnow())
+        with self.lock:
+            ring = self.total if resource_id is None else self.resources.get(resource_id)
+            if ring is None:
+                return {name: {"turnover": 0.0, "volume": 0, "count": 0} for name in WINDOWS}
+            return {name: ring.window(minutes, now_minute) for name, minutes in WINDOWS.items()}
+
+    def by_resource(self, window: str = "24h", now: datetime | None = None) -> Dict[int, dict]:
+        minutes, now_minute = self._minutes(window), minute_of(now or datetime.utcnow())
+        with self.lock:
+            return {rid: ring.window(minutes, now_minute) for rid, ring in self.resources.items()}
+
+    def by_industry(self, window: str = "24h", now: datetime | None = None) -> Dict[str, dict]:
+        minutes, now_minute = self._minutes(window), minute_of(now or datetime.utcnow())
+        with self.lock:
+            return {iid: ring.window(minutes, now_minute) for iid, ring in self.industries.items()}
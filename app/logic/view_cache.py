@@ -0,0 +1,144 @@
+"""
+后台定期重建的只读视图缓存
+
+视图由 build（同步函数，在线程中执行）生成，序列化成 JSON 字节后整体替换，
+带 ETag（内容摘要）和 Last-Modified（内容最后一次变化的时间），接口可据此返回 304。
+每次重建都会变的字段（如生成时间）列在 volatile 中，不计入摘要，数据没变时 ETag 不变。
+同一时刻最多一个重建在进行：并发的未命中都等待同一个任务（single-flight）。
+TtlCache 为同步代码用的短期缓存，不序列化，按需重建。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+
+class CachedView:
+    """ 一份序列化好的视图 """
+    __slots__ = ("body", "etag", "last_modified", "built_at")
+
+    def __init__(self, body: bytes, etag: str, last_modified: datetime, built_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.built_at = built_at
+
+
+class ViewCache:
+    """
+    refresh_interval 秒重建一次；超过两个间隔还没有重建成功的视图视为过期，
+    请求时触发一次重建但仍先返回旧视图，只有还没有任何视图时才等待重建完成。
+    volatile 为视图（dict）中不参与 ETag 计算的顶层字段。
+    """
+
+    def __init__(self, name: str, build: Callable[[], Any], refresh_interval: float,
+                 volatile: Iterable[str] = ()):
+        self.name = name
+        self.build = build
+        self.refresh_interval = refresh_interval
+        self.volatile = frozenset(volatile)
+        self.view: Optional[CachedView] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self.metrics = {"builds": 0, "errors": 0, "build_seconds": 0.0}
+
+    @staticmethod
+    def _dumps(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def _build(self) -> CachedView:
+        start = time.perf_counter()
+        data = jsonable_encoder(self.build())
+        body = self._dumps(data)
+        if self.volatile and isinstance(data, dict):
+            digest = self._dumps({k: v for k, v in data.items() if k not in self.volatile})
+        else:
+            digest = body
+        etag = '"' + hashlib.sha1(digest).hexdigest() + '"'
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        # 内容没变时沿用上次的修改时间
+        last_modified = self.view.last_modified if self.view and self.view.etag == etag else now
+        self.metrics["build_seconds"] = round(time.perf_counter() - start, 3)
+        return CachedView(body, etag, last_modified, time.monotonic())
+
+    async def _refresh(self) -> CachedView:
+        try:
+            self.view = await asyncio.to_thread(self._build)
+            self.metrics["builds"] += 1
+            return self.view
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.exception(f"{self.name} view rebuild failed. {e}")
+            raise
+        finally:
+            self._inflight = None
+
+    def refresh(self) -> asyncio.Task:
+        """ 发起重建；已有重建在进行时返回同一个任务 """
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._refresh())
+            # 没人等待的重建（过期时后台触发）失败也不报 "exception was never retrieved"
+            self._inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._inflight
+
+    def is_stale(self) -> bool:
+        return self.view is None or time.monotonic() - self.view.built_at > self.refresh_interval * 2
+
+    async def get(self) -> CachedView:
+        if self.view is None:
+            # shield：单个请求断开不取消大家共享的重建
+            return await asyncio.shield(self.refresh())
+        if self.is_stale():
+            self.refresh()
+        return self.view
+
+    async def refresh_task(self):
+        """ 后台定期重建，失败时保留旧视图 """
+        while True:
+            try:
+                await asyncio.shield(self.refresh())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 已在 _refresh 中记录，继续提供旧视图
+                pass
+            await asyncio.sleep(self.refresh_interval)
+
+
+class TtlCache:
+    """
+    同步短期缓存：值超过 ttl 秒后，下一个调用者在锁内重建，并发的调用者等待并共用这次结果。
+    build 抛异常时不缓存，异常交给调用者。
+    """
+
+    def __init__(self, name: str, build: Callable[[], Any], ttl: float):
+        self.name = name
+        self.build = build
+        self.ttl = ttl
+        self.value: Any = None
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+        self.metrics = {"builds": 0, "hits": 0, "build_seconds": 0.0}
+
+    def get(self) -> Any:
+        with self.lock:
+            if self.value is not None and time.monotonic() - self.built_at <= self.ttl:
+                self.metrics["hits"] += 1
+                return self.value
+            start = time.perf_counter()
+            self.value = self.build()
+            self.built_at = time.monotonic()
+            self.metrics["builds"] += 1
+            self.metrics["build_seconds"] = round(time.perf_counter() - start, 3)
+            return self.value
+
+    def invalidate(self):
+        with self.lock:
+            self.value = None
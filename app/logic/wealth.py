@@ -0,0 +1,146 @@
+"""
+财富分布：Gini、分位数、洛伦茨曲线
+
+玩家资产按块流入（服务端游标），不在 Python 里建大列表，两种累加器：
+  ExactWealth   写进预分配的 NumPy 数组，排序后精确计算
+  WealthSketch  对数分桶的分位数草图（类似 DDSketch）：值 x 落在桶 ceil(log_γ x)，
+                γ = (1 + α) / (1 - α)，桶代表值与桶内任意值的相对误差不超过 α。
+                内存只与桶数有关，与玩家数无关；可合并。分位数、Gini、洛伦茨曲线都由桶算出（近似），
+                人数与总资产为精确值。
+资产为负的异常值不计入（与原 calculate_gini 一致）。
+"""
+import math
+from typing import Dict
+
+import numpy as np
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+# 洛伦茨曲线采样点数：人口比例 0, 0.05, ..., 1
+LORENZ_POINTS = 21
+
+
+def _summary(n: int, total: float, gini: float, percentiles: Dict[str, float],
+             cum_counts: np.ndarray, cum_wealth: np.ndarray, approximate: bool) -> dict:
+    """
+    cum_counts / cum_wealth 为按资产升序的累计人数与累计资产（从 0 开始），
+    洛伦茨曲线与头部占比在其上线性插值。
+    """
+    shares = np.linspace(0, 1, LORENZ_POINTS)
+    if n == 0 or total <= 0:
+        lorenz = shares
+        top = {0.01: 0.0, 0.1: 0.0}
+    else:
+        lorenz = np.interp(shares * n, cum_counts, cum_wealth) / total
+        top = {f: 1 - float(np.interp(n * (1 - f), cum_counts, cum_wealth)) / total for f in (0.01, 0.1)}
+    return {
+        "players": n,
+        "total": round(total, 3),
+        "mean": round(total / n, 3) if n else 0.0,
+        "gini": round(gini, 3),
+        "percentiles": percentiles,
+        "top_1_share": round(top[0.01], 4),
+        "top_10_share": round(top[0.1], 4),
+        "lorenz": [[round(float(p), 4), round(float(w), 4)] for p, w in zip(shares, lorenz)],
+        "approximate": approximate,
+    }
+
+
+class ExactWealth:
+    """ 精确累加：预分配 capacity，超出时按倍数扩容 """
+
+    def __init__(self, capacity: int):
+        self.values = np.empty(max(capacity, 1), dtype=np.float64)
+        self.size = 0
+
+    def add(self, chunk: np.ndarray):
+        chunk = chunk[chunk >= 0]
+        end = self.size + len(chunk)
+        if end > len(self.values):
+            self.values = np.resize(self.values, max(end, 2 * len(self.values)))
+        self.values[self.size:end] = chunk
+        self.size = end
+
+    def summary(self) -> dict:
+        assets = np.sort(self.values[:self.size])
+        n = len(assets)
+        if n == 0:
+            return _summary(0, 0.0, 0.0, {f"p{q}": 0.0 for q in PERCENTILES},
+                            np.zeros(1), np.zeros(1), False)
+        total = float(assets.sum())
+        # G = (2 * Σ i*y_i - (n + 1) * Σ y) / (n * Σ y)，i 从 1 开始
+        gini = float((2 * np.dot(np.arange(1, n + 1), assets) - (n + 1) * total) / (n * total)) if total > 0 else 0.0
+        percentiles = {f"p{q}": round(float(v), 3)
+                       for q, v in zip(PERCENTILES, np.percentile(assets, PERCENTILES))}
+        cum_wealth = np.concatenate(([0.0], np.cumsum(assets)))
+        return _summary(n, total, gini, percentiles, np.arange(n + 1), cum_wealth, False)
+
+
+class WealthSketch:
+    """ 对数分桶分位数草图，relative_accuracy 为分位数的相对误差上限 """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # 桶号 -> 人数；资产为 0 的单独计数
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, chunk: np.ndarray):
+        chunk = chunk[chunk >= 0]
+        self.count += len(chunk)
+        self.total += float(chunk.sum())
+        positive = chunk[chunk > 0]
+        self.zero_count += len(chunk) - len(positive)
+        if len(positive) == 0:
+            return
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, c in zip(keys.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + c
+
+    def merge(self, other: "WealthSketch"):
+        """ 合并另一个同精度的草图（如分片各自统计后汇总） """
+        if other.gamma != self.gamma:
+            raise ValueError("sketch relative_accuracy mismatch")
+        for key, c in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+
+    def _grouped(self):
+        """ 按值升序的 (桶代表值, 人数)；桶 (γ^(k-1), γ^k] 的代表值取 2γ^k / (γ + 1) """
+        keys = np.array(sorted(self.buckets), dtype=np.int64)
+        values = 2 * np.power(self.gamma, keys.astype(np.float64)) / (self.gamma + 1)
+        counts = np.array([self.buckets[k] for k in keys.tolist()], dtype=np.int64)
+        if self.zero_count:
+            values = np.concatenate(([0.0], values))
+            counts = np.concatenate(([self.zero_count], counts))
+        return values, counts
+
+    def summary(self) -> dict:
+        n = self.count
+        if n == 0:
+            return _summary(0, 0.0, 0.0, {f"p{q}": 0.0 for q in PERCENTILES},
+                            np.zeros(1), np.zeros(1), True)
+        values, counts = self._grouped()
+        cum_counts = np.concatenate(([0], np.cumsum(counts)))
+        # 分位数：第 q/100 * (n - 1) 名（从 0 起）所在桶的代表值
+        ranks = np.array(PERCENTILES) / 100 * (n - 1)
+        index = np.searchsorted(cum_counts[1:], ranks, side="right")
+        percentiles = {f"p{q}": round(float(values[i]), 3) for q, i in zip(PERCENTILES, index)}
+        # 分组 Gini：组内名次 s+1..s+c 之和为 c*s + c(c+1)/2
+        bucket_total = float(np.dot(values, counts))
+        if bucket_total > 0:
+            rank_sum = counts * cum_counts[:-1] + counts * (counts + 1) / 2
+            gini = float((2 * np.dot(rank_sum, values) - (n + 1) * bucket_total) / (n * bucket_total))
+        else:
+            gini = 0.0
+        # 累计资产按精确总量缩放，洛伦茨曲线终点为 1
+        cum_wealth = np.concatenate(([0.0], np.cumsum(values * counts)))
+        if bucket_total > 0:
+            cum_wealth *= self.total / bucket_total
+        return _summary(n, self.total, gini, percentiles, cum_counts, cum_wealth, True)
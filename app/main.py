@@ -1,3 +1,4 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -12,11 +13,13 @@ from fastapi import FastAPI,Request,status
 from fastapi.responses import FileResponse,JSONResponse
 from starlette.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
-from app.core.config import load_config
+from app.core.config import load_config, MONETARY_RECONCILE_MINUTES
 from app.core.error import RedirectToLoginException
 from app.routers import router
-from app.service import ChatService,ExchangeService, PlayerService
+from app.service import ChatService,ExchangeService, PlayerService, ArchiveService, EconomyService, MonetaryService, \
+    SnapshotService
 from app.service.ws import manager
+from app.service.MatchingService import matching_engine
 from contextlib import asynccontextmanager
 import logging
 from app.db.db import engine
@@ -34,6 +37,17 @@ load_config()
 # 1. 定义 Lifespan
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # 成交表分区，要在第一笔成交写入前建好
+    ArchiveService.maintain_trade_partitions()
+    # 货币总量汇总，与全表扫描对齐（首次启动时补齐）
+    MonetaryService.reconcile_aggregates()
+    # 内存订单簿
+    ExchangeService.load_order_books()
+    ExchangeService.load_market_data()
+    ExchangeService.load_trade_stats()
+    journal_snapshots = asyncio.create_task(ExchangeService.journal_snapshot_task())
+    # 经济指标视图后台重建
+    economy_refresh = asyncio.create_task(EconomyService.economy_view.refresh_task())
 
 #   后台定时任务
     scheduler = BackgroundScheduler()
@@ -41,6 +55,14 @@ async def lifespan(app: FastAPI):
     # trigger = CronTrigger(hour=0, minute=0, second=0)
     # scheduler.add_job(economy_heartbeat_task, trigger=trigger)
     scheduler.add_job(ExchangeService.economy_heartbeat_task, "interval", seconds=60 * 60)
+    # 已结束订单归档
+    scheduler.add_job(ArchiveService.archive_market_orders, "interval", minutes=5)
+    # 成交表分区预建与过期清理
+    scheduler.add_job(ArchiveService.maintain_trade_partitions, "interval", hours=6)
+    # 快照按保留期压缩为日 / 周
+    scheduler.add_job(SnapshotService.compact_snapshots, "interval", hours=6)
+    # 货币总量对账
+    scheduler.add_job(MonetaryService.reconcile_aggregates, "interval", minutes=MONETARY_RECONCILE_MINUTES)
 
     scheduler.start()
     logger.info("scheduler start")
@@ -49,6 +71,11 @@ async def lifespan(app: FastAPI):
 
     # --- 这里是关闭逻辑 ---
     logging.info("Shutting down...")
+    journal_snapshots.cancel()
+    economy_refresh.cancel()
+    await matching_engine.stop()
+    await ExchangeService.exchangeWs.stop()
+    ExchangeService.exchange_journal.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -3,7 +3,7 @@ from datetime import datetime,timezone
 from enum import IntEnum, StrEnum
 
 from pydantic import BaseModel
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 from sqlmodel import SQLModel, Field, Relationship,text
 from time import time
 from typing import Optional, List
@@ -84,7 +84,7 @@ class Resource(ResourceBase, table=True):
     name: str = Field(index=True, unique=True)
     base_price: float = Field(default=0)
     icon: str = Field(default="bi-box")
-    industry_id: str = Field(default=0, foreign_key="industry.id", nullable=True)
+    industry_id: Optional[str] = Field(default=None, foreign_key="industry.id", nullable=True)
 
     base_weight: float = Field(default=1, nullable=True)
     sensitivity: float = Field(default=0, nullable=True)
@@ -244,6 +244,19 @@ class MarketOrderBase(SQLModel):
 
 class MarketOrder(MarketOrderBase, table=True):
     __tablename__ = "market_order"
+    # 撮合 / 盘口 / 最优价查询只看进行中的订单：按买卖方向建部分索引，顺序与 order by 一致
+    __table_args__ = (
+        Index("ix_market_order_asks_active", "resource_id", "price_per_unit", "id",
+              postgresql_where=text("status = 0 AND order_type = 'sell'"),
+              postgresql_include=["player_id", "total_quantity", "filled_quantity"]),
+        Index("ix_market_order_bids_active", "resource_id", text("price_per_unit DESC"), "id",
+              postgresql_where=text("status = 0 AND order_type = 'buy'"),
+              postgresql_include=["player_id", "total_quantity", "filled_quantity"]),
+        # 启动时重建订单簿
+        Index("ix_market_order_active_id", "id", postgresql_where=text("status = 0")),
+        # 玩家委托历史按 id 倒序翻页
+        Index("ix_market_order_player_id", "player_id", "id"),
+    )
     id: int = Field(default=None, primary_key=True)
     # 发起者：买或者卖家
     player_id: int = Field(default=None, foreign_key="player.id")
@@ -265,6 +278,36 @@ class MarketOrder(MarketOrderBase, table=True):
     player: Player = Relationship()
     resource: Resource = Relationship()
 
+class MarketOrderArchive(SQLModel, table=True):
+    """ 已完成 / 已撤销的委托，由归档任务从 market_order 迁入，只读 """
+    __tablename__ = "market_order_archive"
+    # 玩家委托历史按 id 倒序翻页
+    __table_args__ = (
+        Index("ix_market_order_archive_player_id", "player_id", "id"),
+    )
+    # 沿用 market_order 的 id
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    player_id: int = Field()
+    order_type: str = Field()
+    resource_id: int = Field()
+    quality: int = Field(default=0)
+    total_quantity: int = Field(default=0)
+    filled_quantity: int = Field(default=0)
+    price_per_unit: float = Field()
+    # 1完成 2撤单了
+    status: int = Field()
+    created_at: datetime = Field()
+    archived_at: datetime = Field()
+
+class MarketOrderHistory(MarketOrderBase):
+    """ 委托历史（进行中 + 归档） """
+    id: int
+    quality: int
+    total_quantity: int
+    filled_quantity: int
+    status: int
+    created_at: datetime
+
 class MarketOrderPublic(MarketOrderBase):
     id:int
     quantity: int
@@ -273,10 +316,24 @@ class MarketOrderCreate(MarketOrderBase):
     quantity:int = Field(ge=1)
     created_at: str
 
+class MarketOrderBatchCreate(SQLModel):
+    """ 批量下单 """
+    orders: List[MarketOrderCreate] = Field(min_length=1)
+
+class MarketOrderBatchCancel(SQLModel):
+    """ 批量撤单 """
+    order_ids: List[int] = Field(min_length=1)
+
 class ExchangeTradeHistory(SQLModel, table=True):
     """ 成交记录：交易额 """
     __tablename__ = "exchange_trade_history"
-    id: int = Field(default=None, primary_key=True)
+    # 按 created_at 按天 RANGE 分区，分区由 ArchiveService.maintain_trade_partitions 预建和清理；
+    # 分区表的主键必须包含分区键
+    __table_args__ = (
+        Index("ix_exchange_trade_history_resource_created", "resource_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id: int = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
 
     # 关联字段
     resource_id: int = Field(foreign_key="resource.id")
@@ -291,7 +348,7 @@ class ExchangeTradeHistory(SQLModel, table=True):
     # 记录它能极大地优化后续全服 GDP 的统计效率
     total_amount: float = Field()
 
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
 
     resource: Resource = Relationship()
     seller: Player = Relationship(
@@ -306,6 +363,49 @@ class ExchangeTradeHistory(SQLModel, table=True):
     )
 
 
+class CandleResolution(StrEnum):
+    """ K 线周期 """
+    M1 = "1m"
+    M5 = "5m"
+    H1 = "1h"
+    D1 = "1d"
+
+class CandleBase(SQLModel):
+    """ K 线：一个资源一个周期一行，成交结算时 UPSERT 增量更新 """
+    resource_id: int = Field(primary_key=True, foreign_key="resource.id")
+    # 周期起始时间（UTC）
+    bucket: datetime = Field(primary_key=True)
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int = Field(default=0)
+    turnover: float = Field(default=0)
+    trade_count: int = Field(default=0)
+
+class ResourceCandle1m(CandleBase, table=True):
+    __tablename__ = "resource_candle_1m"
+
+class ResourceCandle5m(CandleBase, table=True):
+    __tablename__ = "resource_candle_5m"
+
+class ResourceCandle1h(CandleBase, table=True):
+    __tablename__ = "resource_candle_1h"
+
+class ResourceCandle1d(CandleBase, table=True):
+    __tablename__ = "resource_candle_1d"
+
+class CandlePublic(SQLModel):
+    bucket: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+    turnover: float
+    trade_count: int
+
+
 class Asset(SQLModel, table=True):
     """ 资产：房子/奢侈品 """
     id: int = Field(default=None, primary_key=True)
@@ -350,6 +450,8 @@ class TransactionActionType(IntEnum):
     MARKET_TAX_REVENUE = 22
     MARKET_TAX_COST = 23
 
+    MARKET_CANCEL_REFUND = 24 # 交易所撤单退回
+
 
 class TransactionLog(SQLModel, table=True):
     """ 全服记账表 """
@@ -425,11 +527,19 @@ class BuildingLevelsConfig(SQLModel, table=True):
 
     building_meta: BuildingMeta = Relationship()
 
+class SnapshotResolution(StrEnum):
+    """ 快照粒度：心跳按小时写入，过了保留期依次压缩为日、周 """
+    HOUR = "1h"
+    DAY = "1d"
+    WEEK = "1w"
+
 class MarketSnapshot(SQLModel, table=True):
     """ 市场快照：cpi历史 """
     __tablename__ = "market_snapshot"
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=datetime.now)
+    timestamp: datetime = Field(default_factory=datetime.now, index=True)
+    # 压缩后的行 timestamp 为所在日 / 周的起始时间，各指标为桶内均值
+    resolution: str = Field(default=SnapshotResolution.HOUR.value, max_length=2)
     cpi: float        # 存储当时的 CPI
     m1_total: float = Field(default=0) # 货币供应链
     turnover: float # 存储当时的交易额
@@ -442,10 +552,30 @@ class ResourceSnapshot(SQLModel, table=True):
 
     """ 市场资源快照： """
     __tablename__ = "resource_snapshot"
+    __table_args__ = (
+        Index("ix_resource_snapshot_resource_timestamp", "resource_id", "timestamp"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     resource_id: int = Field(index=True, foreign_key="resource.id")
     price: float
     timestamp: datetime = Field(default_factory=datetime.now, index=True)
+    resolution: str = Field(default=SnapshotResolution.HOUR.value, max_length=2)
+
+class MonetaryAggregate(SQLModel, table=True):
+    """
+    货币总量（不含政府）：资金变动、买单冻结/成交/撤单时在同一事务内按增量更新。
+    分成若干行（shard），各事务随机落到一行，避免全服写同一行；读时求和。
+    """
+    __tablename__ = "monetary_aggregate"
+    shard: int = Field(primary_key=True)
+    cash: float = Field(default=0)          # 玩家手中资金 M0
+    locked_cash: float = Field(default=0)   # 进行中买单冻结的资金
+
+class InventoryAggregate(SQLModel, table=True):
+    """ 每种资源的全服库存（不含政府），库存变动时同一事务内按增量更新 """
+    __tablename__ = "inventory_aggregate"
+    resource_id: int = Field(primary_key=True, foreign_key="resource.id")
+    quantity: int = Field(default=0)
 
 class GovernmentOrder(SQLModel, table=True):
     """
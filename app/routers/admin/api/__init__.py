@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from app.routers.admin.api import players,resources,buildings,accounting
+from app.routers.admin.api import players,resources,buildings,accounting,exchange
 
 router = APIRouter()
 router.include_router(players.router, prefix="/players", tags=["admin"])
 router.include_router(resources.router, prefix="/resources", tags=["admin"])
 router.include_router(buildings.router, prefix="/buildings", tags=["admin"])
 router.include_router(accounting.router, prefix="/accounting", tags=["admin"])
+router.include_router(exchange.router, prefix="/exchange", tags=["admin"])
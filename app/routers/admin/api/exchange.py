@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.core.config import EXCHANGE_PUSH_INTERVAL_MS
+from app.service import ExchangeService
+from app.service.MatchingService import matching_engine
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_exchange_metrics():
+    """ 撮合排队与盘口推送统计 """
+    return {
+        "matching_pending": matching_engine.pending(),
+        "book_push": {
+            "interval_ms": EXCHANGE_PUSH_INTERVAL_MS,
+            **ExchangeService.exchangeWs.metrics,
+        },
+        "journal": {
+            "enabled": ExchangeService.exchange_journal.is_open,
+            "seq": ExchangeService.exchange_journal.seq,
+            "flushed_seq": ExchangeService.exchange_journal.flushed_seq,
+            **ExchangeService.exchange_journal.metrics,
+        },
+    }
+
+
+@router.get("/journal/verify")
+async def verify_exchange_journal():
+    """ 重放事件日志并与数据库中的挂单核对；撮合进行中时，核对期间新提交的订单可能显示为差异 """
+    if not ExchangeService.exchange_journal.is_open:
+        raise HTTPException(status_code=400, detail="事件日志未启用")
+    return await run_in_threadpool(ExchangeService.verify_journal)
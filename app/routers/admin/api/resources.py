@@ -17,6 +17,7 @@ async def create_resource(resource:ResourceCreate, session:SessionDep):
     result = crud_resources.create_resource(session, resource)
     session.commit()
     session.refresh(result)
+    crud_resources.invalidate_resource_cache()
     return result
 
 @router.post("/recipe/")
@@ -69,6 +70,7 @@ async def update_resource_and_recipe(model:UpdateResourceRecipeRequest,session:S
         )
         session.add(new_ingredient)
     session.commit()
+    crud_resources.invalidate_resource_cache()
 
     return {"msg": "ok"}
 
@@ -5,7 +5,7 @@ from sqlmodel import SQLModel, select, or_
 
 from app.core.config import GOVERNMENT_PLAYER_ID
 from app.core.error import GameError
-from app.db.session import SessionDep
+from app.db.session import SessionDep, AsyncSessionDep
 from app.dependencies import get_current_user
 from app.models import PlayerBuilding, PlayerBuildingPublic, PlayerPublic, PlayerBuildingCreate, BuildingMetaPublic, \
     TransactionActionType, BuildingLevelsConfig
@@ -18,16 +18,14 @@ logger = logging.getLogger("fastapi")
 router = APIRouter()
 
 @router.get("/", response_model=List[PlayerBuildingPublic])
-async def get_buildings(session: SessionDep,
+async def get_buildings(session: AsyncSessionDep,
                         player_in: PlayerPublic = Depends(get_current_user)
                         ):
     """ 获取player的所有建筑"""
     result = []
-    buildings = crud_building.get_player_buildings(session, player_id=player_in.id)
-    for building in buildings:
+    for building, task in await crud_building.get_player_buildings_with_tasks_async(session, player_in.id):
         out = PlayerBuildingPublic.model_validate(building)
         out.building_meta = BuildingMetaPublic.model_validate(building.building_meta)
-        task  = crud_building.get_building_tasks_by_player_building(session, building.id)
         out.task = task
         result.append(out)
     return result
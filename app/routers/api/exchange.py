@@ -1,102 +1,229 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
-from app.db.session import SessionDep
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.db.session import SessionDep, AsyncSessionDep
 from app.dependencies import get_current_user
 
-from app.crud import crud_inventory, crud_market, crud_resources, crud_player
-from app.models import MarketOrder, MarketOrderCreate, PlayerPublic, MarketOrderPublic, TransactionActionType
-from app.core.error import GameError
+from app.crud import crud_inventory, crud_market, crud_resources, crud_player, crud_candle
+from app.models import MarketOrder, MarketOrderCreate, PlayerPublic, MarketOrderPublic, TransactionActionType, \
+    MarketOrderBatchCreate, MarketOrderBatchCancel, MarketOrderHistory, CandleResolution, CandlePublic
+from app.core.error import GameError, NotFoundError
 from app.service import AccountingService, ExchangeService, PlayerService, InventoryService
 import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, List
+from app.core.config import MARKET_BATCH_SIZE
+from app.service.MatchingService import matching_engine
 from app.service.ws import manager
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 深度接口每侧最多档位数
+MAX_DEPTH_LEVELS = 100
+# K 线接口单次最多根数
+MAX_CANDLES = 1000
+
+
+def to_utc(ts: datetime | None) -> datetime | None:
+    """ 带时区的时间转成库里使用的 naive UTC """
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 @router.post("/order")
-async def create_market_order(session: SessionDep, order_in: MarketOrderCreate,
+async def create_market_order(session: AsyncSessionDep, order_in: MarketOrderCreate,
                               player_in: PlayerPublic = Depends(get_current_user)):
     """ 提交委托订单 """
     try:
-        resource = crud_resources.get_resource(session, order_in.resource_id)
         # 涨跌停设置
-        min_price = resource.base_price * 0.5
-        max_price = resource.base_price * 2.0
+        await ExchangeService.check_price_band_async(session, order_in.resource_id, order_in.price_per_unit)
 
-        if order_in.price_per_unit > max_price:
-            raise HTTPException(status_code=400, detail=f"价格超出涨停价: {max_price}")
-
-        if order_in.price_per_unit < min_price:
-            raise HTTPException(status_code=400, detail=f"价格低于跌停价: {min_price}")
-
-        order = MarketOrder(
-            **order_in.model_dump()
+        # 排队期间不占用连接
+        await session.close()
+        # 交给该资源的撮合 worker 串行执行
+        result = await matching_engine.submit(
+            order_in.resource_id,
+            partial(ExchangeService.place_market_order, player_in.id, order_in)
         )
 
-        order.player_id = player_in.id
-        order.total_quantity = order_in.quantity
-        order.filled_quantity = 0
-        order.status = 0
-        crud_market.create_market_order(session, order)
-
-        # 如果是卖单，检查扣除库存
-        if order_in.order_type == "sell":
-            InventoryService.change_resource(session, player_in.id, order_in.resource_id, -order_in.quantity)
-        # 如果是买单，检查扣除资金
-        if order_in.order_type == "buy":
-            total_cost = order_in.quantity * order_in.price_per_unit
-            AccountingService.change_cash(session, player_in.id, -total_cost,
-                                          TransactionActionType.MARKET_BUY, order.id)
-        # 撮合订单
-        ExchangeService.match_order(session, order)
-        session.commit()
-
-        player = crud_player.get_player_by_id(session, player_in.id)
-        await PlayerService.playerWs.send_update_cash(player.name, player.cash)
-
-        # 撮合完成后，调用广播
-        # 这个 broadcast 不在 websocket 循环里，而是在业务逻辑里
-        new_orders = crud_market.get_active_orders_by_resource(session, order.resource_id)
-        ret_orders = {
-            'asks': [],
-            'bids': []
-        }
-        for o in new_orders['asks']:
-            op = o.model_dump()
-            op['quantity'] = o.total_quantity - o.filled_quantity
-            op = MarketOrderPublic.model_validate(op)
-            ret_orders['asks'].append(op.model_dump(mode="json"))
-        for o in new_orders['bids']:
-            op = o.model_dump()
-            op['quantity'] = o.total_quantity - o.filled_quantity
-            op = MarketOrderPublic.model_validate(op)
-            op.quantity = o.total_quantity - o.filled_quantity
-            ret_orders['bids'].append(op.model_dump(mode="json"))
-        logger.info("Match ok. will ws broadcast")
-        await ExchangeService.exchangeWs.broadcast_to_resource(order.resource_id, {
-            "type": "exchange",
-            "sub_type":"update",
-            "data": {
-                "resource_id": order.resource_id,
-                "orders": ret_orders
-            }
-        })
-
+        cash = await crud_player.get_player_cash_async(session, player_in.id)
+        await PlayerService.playerWs.send_update_cash(player_in.name, cash)
+        # 盘口变动由撮合 worker 在任务结束后按 seq 增量推送
+    except HTTPException:
+        raise
     except GameError as e:
         logger.error(f"create market order failed. {e}")
         raise HTTPException(status_code=400, detail=e.message)
     except Exception as e:
         logger.exception(f"create market order failed. {e}")
         raise HTTPException(status_code=500, detail="内部错误")
-    return {"msg": "订单创建成功"}
+    return {"msg": "订单创建成功", **result}
+
+
+@router.post("/order/{order_id}/cancel")
+async def cancel_market_order(session: AsyncSessionDep, order_id: int,
+                              player_in: PlayerPublic = Depends(get_current_user)):
+    """ 撤销委托订单 """
+    order = await crud_market.get_order_by_id_async(session, order_id)
+    if not order or order.player_id != player_in.id:
+        raise HTTPException(status_code=404, detail="订单不存在")
+    resource_id = order.resource_id
+    await session.close()
+    try:
+        await matching_engine.submit(
+            resource_id,
+            partial(ExchangeService.cancel_market_order, player_in.id, order_id)
+        )
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=e.message)
+    except GameError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    except Exception as e:
+        logger.exception(f"cancel market order failed. {e}")
+        raise HTTPException(status_code=500, detail="内部错误")
+
+    cash = await crud_player.get_player_cash_async(session, player_in.id)
+    await PlayerService.playerWs.send_update_cash(player_in.name, cash)
+    return {"msg": "订单已撤销"}
+
+
+@router.post("/orders/batch")
+async def create_market_orders_batch(session: AsyncSessionDep, batch_in: MarketOrderBatchCreate,
+                                     player_in: PlayerPublic = Depends(get_current_user)):
+    """
+    批量提交委托订单，按资源分组交给各自的撮合 worker，每组一个事务。
+    返回与提交顺序一致的逐单结果；同组出错时该组订单都带 error。
+    """
+    if len(batch_in.orders) > MARKET_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MARKET_BATCH_SIZE} 个订单")
+    results: List[dict] = [{} for _ in batch_in.orders]
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i, order_in in enumerate(batch_in.orders):
+        try:
+            await ExchangeService.check_price_band_async(session, order_in.resource_id, order_in.price_per_unit)
+        except GameError as e:
+            results[i] = {"error": e.message}
+            continue
+        groups[order_in.resource_id].append(i)
+    await session.close()
+
+    async def run_group(resource_id: int, indexes: List[int]):
+        orders = [batch_in.orders[i] for i in indexes]
+        try:
+            group_results = await matching_engine.submit(
+                resource_id, partial(ExchangeService.place_market_orders, player_in.id, orders)
+            )
+        except GameError as e:
+            group_results = [{"error": e.message}] * len(indexes)
+        except Exception as e:
+            logger.exception(f"batch market order failed. {e}")
+            group_results = [{"error": "内部错误"}] * len(indexes)
+        for i, result in zip(indexes, group_results):
+            results[i] = result
+
+    await asyncio.gather(*[run_group(resource_id, indexes) for resource_id, indexes in groups.items()])
+
+    cash = await crud_player.get_player_cash_async(session, player_in.id)
+    await PlayerService.playerWs.send_update_cash(player_in.name, cash)
+    return {"msg": "批量下单完成", "results": [{"index": i, **r} for i, r in enumerate(results)]}
+
+
+@router.post("/orders/cancel")
+async def cancel_market_orders_batch(session: AsyncSessionDep, batch_in: MarketOrderBatchCancel,
+                                     player_in: PlayerPublic = Depends(get_current_user)):
+    """ 批量撤单，按资源分组交给各自的撮合 worker，返回逐单结果 """
+    order_ids = list(dict.fromkeys(batch_in.order_ids))
+    if len(order_ids) > MARKET_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MARKET_BATCH_SIZE} 个订单")
+    orders = await crud_market.get_orders_by_ids_async(session, order_ids)
+    results: Dict[int, dict] = {}
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if not order or order.player_id != player_in.id:
+            results[order_id] = {"order_id": order_id, "error": "订单不存在"}
+        else:
+            groups[order.resource_id].append(order_id)
+    await session.close()
+
+    async def run_group(resource_id: int, ids: List[int]):
+        try:
+            group_results = await matching_engine.submit(
+                resource_id, partial(ExchangeService.cancel_market_orders, player_in.id, ids)
+            )
+        except Exception as e:
+            logger.exception(f"batch cancel failed. {e}")
+            group_results = [{"order_id": order_id, "error": "内部错误"} for order_id in ids]
+        for result in group_results:
+            results[result["order_id"]] = result
+
+    await asyncio.gather(*[run_group(resource_id, ids) for resource_id, ids in groups.items()])
+
+    cash = await crud_player.get_player_cash_async(session, player_in.id)
+    await PlayerService.playerWs.send_update_cash(player_in.name, cash)
+    return {"msg": "批量撤单完成", "results": [results[order_id] for order_id in order_ids]}
 
 
 @router.get("/orders")
-async def get_orders(session: SessionDep, resource_id: int,
+async def get_orders(session: AsyncSessionDep, resource_id: int,
                      player_in: PlayerPublic = Depends(get_current_user)):
-    return crud_market.get_active_orders_by_resource(session, resource_id)
+    return await crud_market.get_active_orders_by_resource_async(session, resource_id)
+
+
+@router.get("/history")
+async def get_order_history(session: AsyncSessionDep,
+                            before_id: int | None = None,
+                            limit: int = Query(20, ge=1, le=100),
+                            resource_id: int | None = None,
+                            player_in: PlayerPublic = Depends(get_current_user)):
+    """ 我的委托历史（含已归档），按 id 倒序；翻页时传入上一页返回的 next_before_id """
+    rows = await crud_market.get_player_orders_async(session, player_in.id, before_id, limit, resource_id)
+    items = [MarketOrderHistory.model_validate(row) for row in rows]
+    return {
+        "items": items,
+        "next_before_id": items[-1].id if len(items) == limit else None
+    }
+
+
+@router.get("/depth/{resource_id}")
+async def get_order_book_depth(session: AsyncSessionDep, resource_id: int,
+                               levels: int = Query(10, ge=1, le=MAX_DEPTH_LEVELS),
+                               cumulative: bool = False,
+                               player_in: PlayerPublic = Depends(get_current_user)):
+    """ 盘口深度：按价格档位聚合，每侧最多 levels 档 """
+    if not await crud_resources.get_resource_cached_async(session, resource_id):
+        raise HTTPException(status_code=404, detail="资源不存在")
+    await session.close()
+    try:
+        # 经撮合队列读取，与推送的 seq 一致
+        return await matching_engine.submit(
+            resource_id, partial(ExchangeService.get_order_book_depth, resource_id, levels, cumulative)
+        )
+    except GameError as e:
+        raise HTTPException(status_code=503, detail=e.message)
+
+
+@router.get("/candles/{resource_id}")
+async def get_candles(session: AsyncSessionDep, resource_id: int,
+                      resolution: CandleResolution = CandleResolution.M1,
+                      start: datetime | None = None,
+                      end: datetime | None = None,
+                      limit: int = Query(200, ge=1, le=MAX_CANDLES),
+                      player_in: PlayerPublic = Depends(get_current_user)):
+    """ K 线：[start, end) 内最近 limit 根，按时间升序；时间为 UTC，无成交的周期不返回 """
+    if not await crud_resources.get_resource_cached_async(session, resource_id):
+        raise HTTPException(status_code=404, detail="资源不存在")
+    start, end = to_utc(start), to_utc(end)
+    candles = await crud_candle.get_candles_async(session, resource_id, resolution, start, end, limit)
+    return {
+        "resource_id": resource_id,
+        "resolution": resolution,
+        "candles": [CandlePublic.model_validate(c) for c in candles]
+    }
 
 
 @router.get("/price_suggestion/{resource_id}")
@@ -108,24 +235,35 @@ async def get_suggested_price(session: SessionDep, resource_id: int,
 
 
 @router.get("/simple/{resource_id}")
-async def get_market_price(session: SessionDep, resource_id: int,
+async def get_market_price(session: AsyncSessionDep, resource_id: int,
                            player_in: PlayerPublic = Depends(get_current_user)):
-    """ 获取资源最近市价(已成交均价)， 最低卖单/最高买单 """
-    lowest_sell_order = crud_market.get_resource_market_lowest_sell_order(session, resource_id)
+    """ 获取资源最近市价(已成交均价)， 最低卖单/最高买单，24h 行情 """
+    lowest_sell_order = await crud_market.get_resource_market_lowest_sell_order_async(session, resource_id)
     if lowest_sell_order:
         lowest_sell_order = MarketOrderPublic(**lowest_sell_order.model_dump(),
                                               quantity=lowest_sell_order.total_quantity - lowest_sell_order.filled_quantity)
-    highest_buy_order = crud_market.get_resource_market_highest_buy_order(session, resource_id)
+    highest_buy_order = await crud_market.get_resource_market_highest_buy_order_async(session, resource_id)
     if highest_buy_order:
         highest_buy_order = MarketOrderPublic(**highest_buy_order.model_dump(),
                                               quantity=highest_buy_order.total_quantity - highest_buy_order.filled_quantity)
-    market_price = crud_market.get_resource_market_price(session, resource_id)
-    resource = crud_resources.get_resource(session, resource_id)
+    ticker = ExchangeService.market_data.get(resource_id)
+    market_price = ticker.market_price
+    resource = await crud_resources.get_resource_async(session, resource_id)
     if market_price == 0:
         market_price = resource.base_price
     return {
         "base_price": resource.base_price,
         "market_price": round(market_price, 3),
         "lowest_sell_order": lowest_sell_order,
-        "highest_buy_order": highest_buy_order
+        "highest_buy_order": highest_buy_order,
+        **ticker.stats(),
+        "trade_windows": ExchangeService.trade_stats.windows(resource_id),
+        "liquidity": (await asyncio.to_thread(ExchangeService.get_liquidity)).get(resource_id),
     }
+
+
+@router.get("/liquidity")
+async def get_liquidity(player_in: PlayerPublic = Depends(get_current_user)):
+    """ 全部资源的流动性：综合分、价差、中间价 ±1% / ±5% 深度、换手率（短期缓存） """
+    liquidity = await asyncio.to_thread(ExchangeService.get_liquidity)
+    return [{"resource_id": resource_id, **metrics} for resource_id, metrics in liquidity.items()]
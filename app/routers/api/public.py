@@ -1,77 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Cookie
-from sqlmodel import Session,select
-
-from app.core.config import GOVERNMENT_PLAYER_ID
-from app.db.session import SessionDep  # 假设你的 session 依赖项位置
-from app.crud import crud_player,crud_market,crud_inventory
-from app.dependencies import create_access_token, get_current_user
 from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
-from app.models import SpotContract, GovernmentOrder, GovernmentActionLog
-from app.service.ExchangeService import calculate_cpi, calculate_gini, get_cpi_trend, calculate_m1, calculate_total_assets, \
-    calculate_m0, get_all_resource_market_snapshot, get_market_history, \
-    calculate_sector_24h_trade_stats, get_24h_trade_stats
+from app.core.config import SNAPSHOT_SERIES_POINTS
+from app.core.error import GameError
+from app.crud import crud_resources
+from app.db.session import SessionDep
+from app.logic.view_cache import CachedView
+from app.service import SnapshotService
+from app.service.EconomyService import economy_view
 import logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/economy", tags=["economy"])
-def economic(session: SessionDep):
-    """
-    经济指标
-    """
-    # 1. 货币维度
-    m0_cash = crud_player.total_cash(session)  # 你已有的：所有玩家口袋里的钱
-    locked_cash = crud_market.total_locked_buy_cash(session)  # 正在买单中锁定的钱
-
-    # 2. 市场活跃维度
-    daily_volume = get_24h_trade_stats(session)  # 过去24小时成交总额
+# 时间序列单次最多点数
+MAX_SERIES_POINTS = 2000
 
-    # 3. 生产力维度 (社会总财富估计)
-    # 所有 Inventory 数量 * 该资源基础价格/市场均价
-    total_inventory_value = crud_inventory.get_all_assets_value(session)
 
-    #
-    cpi = calculate_cpi(session)
-    velocity_val = round(daily_volume['turnover'] / (m0_cash + locked_cash + total_inventory_value), 2)
+def to_local(ts: datetime | None) -> datetime | None:
+    """ 带时区的时间转成快照使用的 naive 本地时间 """
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone().replace(tzinfo=None)
 
-    # 政府公开
-    cash = crud_player.get_player_by_id(session, GOVERNMENT_PLAYER_ID).cash
-    inventoy = crud_inventory.get_player_inventory(session, GOVERNMENT_PLAYER_ID)
-    current_policy = session.exec(
-        select(GovernmentActionLog).where(GovernmentActionLog.is_active == True)
-    ).first()
 
-    # 2. 查【审计日志】：给下方那个滚动列表
-    history_logs = session.exec(
-        select(GovernmentActionLog).order_by(GovernmentActionLog.created_at.desc()).limit(10)
-    ).all()
+def not_modified(request: Request, view: CachedView) -> bool:
+    """ 条件请求：If-None-Match 优先，其次 If-Modified-Since """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or view.etag in tags or f"W/{view.etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return view.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
 
-    government_orders = session.exec(
-        select(GovernmentOrder).where(GovernmentOrder.status == 0)
-    ).all()
 
-    government = {
-        "cash":cash,
-        "inventory":inventoy,
-        "current_policy":current_policy,
-        "history": history_logs,
-        "orders": government_orders
+@router.get("/economy", tags=["economy"])
+async def economic(request: Request):
+    """
+    经济指标：后台定期重建的缓存视图，支持 ETag / Last-Modified 条件请求
+    """
+    view = await economy_view.get()
+    headers = {
+        "ETag": view.etag,
+        "Last-Modified": format_datetime(view.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
     }
+    if not_modified(request, view):
+        return Response(status_code=304, headers=headers)
+    return Response(content=view.body, media_type="application/json", headers=headers)
+
+
+@router.get("/history/market", tags=["economy"])
+def market_history(session: SessionDep,
+                   start: datetime | None = None,
+                   end: datetime | None = None,
+                   points: int = Query(SNAPSHOT_SERIES_POINTS, ge=3, le=MAX_SERIES_POINTS),
+                   metric: str = "cpi"):
+    """ 宏观指标时间序列：[start, end]（默认最近 30 天），按 metric 曲线形状降采样到约 points 个点 """
+    try:
+        return SnapshotService.get_market_series(session, to_local(start), to_local(end), points, metric)
+    except GameError as e:
+        raise HTTPException(status_code=400, detail=e.message)
 
-    return {
-        "m0": calculate_m0(session),
-        "m1": calculate_m1(session),
-        "market_24h": get_24h_trade_stats(session),
-        "total_assets_value": calculate_total_assets(session),
-        "cpi": cpi,  # 物价指数
-        "cpi_trend": get_cpi_trend(session, cpi),
-        "gini": calculate_gini(session),
-        "velocity_val": velocity_val, # 24h流转速率
-        "timestamp": datetime.utcnow(),
-        "history": get_market_history(session),
-        "sectors": calculate_sector_24h_trade_stats(session),
-        "resources": get_all_resource_market_snapshot(session),
-        "government": government
-    }
 
+@router.get("/history/resource/{resource_id}", tags=["economy"])
+def resource_history(session: SessionDep, resource_id: int,
+                     start: datetime | None = None,
+                     end: datetime | None = None,
+                     points: int = Query(SNAPSHOT_SERIES_POINTS, ge=3, le=MAX_SERIES_POINTS)):
+    """ 资源价格时间序列：[start, end]（默认最近 30 天），降采样到约 points 个点 """
+    if not crud_resources.get_resource_cached(session, resource_id):
+        raise HTTPException(status_code=404, detail="资源不存在")
+    try:
+        return SnapshotService.get_resource_series(session, resource_id, to_local(start), to_local(end), points)
+    except GameError as e:
+        raise HTTPException(status_code=400, detail=e.message)
@@ -2,11 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import defer
 
 from app.core.error import GameRespCode, GameError
-from app.db.session import SessionDep
+from app.db.session import SessionDep, AsyncSessionDep
 from app.dependencies import get_current_user
 from datetime import datetime, timedelta
 from app.crud import crud_building_task, crud_inventory, crud_player, crud_recipe
-from app.logic.task import calculate_task_cost
+from app.logic.task import calculate_task_cost, calculate_task_cost_async
 from app.models import PlayerPublic, BuildingTaskCreate, BuildingTaskBase, TransactionActionType, BuildingTask
 from app.service import AccountingService
 from app.service import InventoryService
@@ -17,11 +17,12 @@ router = APIRouter()
 
 
 @router.post("/create", tags=["task"])
-async def product(session: SessionDep, building_task: BuildingTaskCreate,
+async def product(session: AsyncSessionDep, building_task: BuildingTaskCreate,
                   player_in: PlayerPublic = Depends(get_current_user),
                   ):
     """开始生产"""
-    task = crud_building_task.get_building_task_by_player_building_id(session, building_task.player_building_id)
+    task = await crud_building_task.get_building_task_by_player_building_id_async(
+        session, building_task.player_building_id)
     if task:
         if task.end_time <= datetime.now():
             # 任务过期了，但还没领取
@@ -29,9 +30,9 @@ async def product(session: SessionDep, building_task: BuildingTaskCreate,
         else:
             raise HTTPException(status_code=400, detail=GameRespCode.BUILDING_BUSY.detail)
     # 计算时间成本
-    calculate_task_cost(session, building_task)
+    await calculate_task_cost_async(session, building_task)
 
-    recipe = crud_recipe.get_recipe_by_output_resource_id(session, building_task.resource_id)
+    recipe = await crud_recipe.get_recipe_by_output_resource_id_async(session, building_task.resource_id)
     if not recipe:
         raise HTTPException(status_code=400, detail="异常：找不到配方信息")
     hours = building_task.quantity / recipe.per_hour
@@ -39,23 +40,23 @@ async def product(session: SessionDep, building_task: BuildingTaskCreate,
     try:
         # 创建任务
         task = crud_building_task.create_building_task(session, building_task, player_id=player_in.id, duration=hours)
-        session.flush()
+        await session.flush()
         # 扣除成本
-        AccountingService.change_cash(session, player_in.id, -building_task.cash_cost,
-                                      TransactionActionType.PRODUCE_COST, task.id)
+        await AccountingService.change_cash_async(session, player_in.id, -building_task.cash_cost,
+                                                  TransactionActionType.PRODUCE_COST, task.id)
         # 扣除库存
         for input in recipe.inputs:
-            InventoryService.change_resource(session, player_in.id, input.resource_id,
-                                             -input.quantity * building_task.quantity)
-        session.commit()
-        player = crud_player.get_player_by_id(session, player_in.id)
-        await PlayerService.playerWs.send_update_cash(player_in.name, player.cash)
+            await InventoryService.change_resource_async(session, player_in.id, input.resource_id,
+                                                         -input.quantity * building_task.quantity)
+        await session.commit()
+        cash = await crud_player.get_player_cash_async(session, player_in.id)
+        await PlayerService.playerWs.send_update_cash(player_in.name, cash)
     except GameError as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e)
         raise HTTPException(status_code=400, detail=e.message)
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e)
         raise HTTPException(status_code=400, detail=str(e))
 
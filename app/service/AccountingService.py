@@ -1,7 +1,63 @@
+"""
+资金变动与流水
+
+流水（transaction_log）不逐条 session.add：变动时按顺序记在 session 上，
+事务提交前（before_commit）一条多行 INSERT 写入，回滚则丢弃。
+before / after 取自加锁读到（或本事务已更新）的余额，同一事务内同一玩家多次变动按先后累计。
+"""
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
 from app.core.error import GameError
 from app.db.session import SessionDep
 from app.models import Player, TransactionLog, LedgerLogFull, TransactionActionType
 from sqlmodel import select,func
+from sqlalchemy import insert, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.service import MonetaryService
+from datetime import datetime
+
+LEDGER_KEY = "ledger"
+
+
+def _ledger(session) -> List[dict]:
+    """ 本事务待写入的流水 """
+    rows = session.info.get(LEDGER_KEY)
+    if rows is None:
+        rows = session.info[LEDGER_KEY] = []
+    return rows
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _write_ledger(session):
+    rows = session.info.pop(LEDGER_KEY, None)
+    if rows:
+        session.execute(insert(TransactionLog), rows)
+
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _discard_ledger(session, transaction):
+    # 回滚或关闭时丢弃未提交的流水（提交时已在 before_commit 中取走）
+    if transaction.parent is None:
+        session.info.pop(LEDGER_KEY, None)
+
+
+def _cash_change_log(player_id: int, cash: float, amount: float, action_type: int, ref_id: int) -> dict:
+    """ 校验余额并生成流水行，amount 已取整 """
+    after = cash + amount
+    if after < 0:
+        raise GameError(f"player 资金不足 after:{after} change:{amount}")
+    return {
+        "player_id": player_id,
+        "action_type": action_type,
+        "change_amount": amount,
+        "before_balance": cash,
+        "after_balance": after,
+        "ref_id": ref_id,
+        "created_at": datetime.now(),
+    }
 
 def change_cash(
         session:SessionDep,
@@ -10,33 +66,68 @@ def change_cash(
         action_type:int,
         ref_id:int
 ):
-    # 锁定行
-    statement = select(Player).where(Player.id == player_id).with_for_update()
+    # 锁定行。FOR NO KEY UPDATE：不和外键检查的 KEY SHARE 锁互斥
+    statement = select(Player).where(Player.id == player_id).with_for_update(key_share=True)
     player = session.exec(statement).one_or_none()
 
     if not player:
         raise ValueError("player 异常")
     amount = round(amount, 3)
 
-    before = player.cash
-    after = player.cash + amount
-    if after < 0:
-        raise GameError(f"player 资金不足 after:{after} change:{amount}")
-    player.cash += amount
-
-    log = TransactionLog(
-        player_id=player_id,
-        action_type=action_type,
-        change_amount=amount,
-        before_balance=before,
-        after_balance=after,
-        ref_id=ref_id,
-    )
-    session.add(log)
+    log = _cash_change_log(player_id, player.cash, amount, action_type, ref_id)
+    player.cash = log["after_balance"]
+    _ledger(session).append(log)
     session.add(player)
+    MonetaryService.record_cash(session, player_id, amount)
 
     # Warn: 不执行commit， 外部事务提交
 
+async def change_cash_async(session: AsyncSession, player_id: int, amount: float, action_type: int, ref_id: int):
+    """ change_cash 的异步版本：只锁定并读取余额列，不把 Player 实体载入 session """
+    statement = select(Player.cash).where(Player.id == player_id).with_for_update(key_share=True)
+    cash = (await session.exec(statement)).one_or_none()
+    if cash is None:
+        raise ValueError("player 异常")
+    amount = round(amount, 3)
+
+    log = _cash_change_log(player_id, cash, amount, action_type, ref_id)
+    await session.exec(update(Player).where(Player.id == player_id).values(cash=log["after_balance"]))
+    _ledger(session).append(log)
+    MonetaryService.record_cash(session, player_id, amount)
+
+    # Warn: 不执行commit， 外部事务提交
+
+def change_cash_batch(session:SessionDep, changes):
+    """
+    批量资金变动：changes 为 [(player_id, amount, action_type, ref_id)]。
+    每个玩家只加锁、更新一次，流水逐条保留，before/after 按顺序累计。
+    """
+    if not changes:
+        return
+    player_ids = {player_id for player_id, _, _, _ in changes}
+    statement = (select(Player).where(Player.id.in_(player_ids)).order_by(Player.id)
+                 .with_for_update(key_share=True))
+    players = {player.id: player for player in session.exec(statement).all()}
+
+    ledger = _ledger(session)
+    for player_id, amount, action_type, ref_id in changes:
+        player = players.get(player_id)
+        if not player:
+            raise ValueError("player 异常")
+        amount = round(amount, 3)
+
+        log = _cash_change_log(player_id, player.cash, amount, action_type, ref_id)
+        player.cash = log["after_balance"]
+        MonetaryService.record_cash(session, player_id, amount)
+        ledger.append(log)
+    session.add_all(players.values())
+
+def lock_players(session:SessionDep, player_ids):
+    """ 按 id 顺序一次锁定多个玩家，多行加锁统一走这里避免死锁 """
+    statement = (select(Player.id).where(Player.id.in_(player_ids)).order_by(Player.id)
+                 .with_for_update(key_share=True))
+    session.exec(statement).all()
+
 def get_all_ledger(session:SessionDep, player_id:int,
                    page: int = 1,
                    page_size: int = 10,
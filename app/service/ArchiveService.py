@@ -0,0 +1,137 @@
+"""
+历史数据归档
+
+market_order 只保留进行中的订单：已完成 / 已撤销的订单由后台任务分批移到 market_order_archive，
+撮合、盘口等热点查询面对的表大小只和挂单量有关。
+exchange_trade_history 按 created_at 按天分区：提前建好未来几周的分区，超过保留期的分区整块 detach / drop，
+24h 统计只会扫到最近一两个分区。
+分区维护与结算写入同时进行，不能长时间持有父表的 ACCESS EXCLUSIVE 锁：
+  建分区每个一个短事务，带 lock_timeout，等不到锁就留给下次执行；
+  过期分区用 DETACH PARTITION ... CONCURRENTLY（不挡读写），drop 时先 detach 再删独立表。
+"""
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, text
+
+from app.core.config import ORDER_ARCHIVE_BATCH_SIZE, TRADE_PARTITION_PREMAKE_DAYS, \
+    TRADE_PARTITION_LOCK_TIMEOUT_MS, TRADE_HISTORY_RETENTION_DAYS, TRADE_HISTORY_RETENTION_ACTION
+from app.crud import crud_market
+from app.db.db import engine
+
+logger = logging.getLogger(__name__)
+
+
+def archive_market_orders(batch_size: int = ORDER_ARCHIVE_BATCH_SIZE) -> int:
+    """
+    定时任务：归档已结束的订单（状态不会再变）。
+    每批一个短事务，直到不足一批为止，返回归档总数。
+    """
+    total = 0
+    start = time.perf_counter()
+    while True:
+        with Session(engine) as session:
+            moved = crud_market.archive_orders(session, batch_size)
+            session.commit()
+        total += moved
+        if moved < batch_size:
+            break
+    if total:
+        logger.info(f"archived {total} market orders in {round(time.perf_counter() - start, 3)}s")
+    return total
+
+
+TRADE_TABLE = "exchange_trade_history"
+# pg_get_expr(relpartbound) 形如 FOR VALUES FROM ('2026-10-18 00:00:00') TO ('2026-10-19 00:00:00')
+PARTITION_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+# lock_not_available：等锁超过 lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _trade_partitions(conn, detach_pending: bool) -> List[Tuple[str, date, date]]:
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass) AND i.inhdetachpending = :pending
+    """), {"table": TRADE_TABLE, "pending": detach_pending}).all()
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND.search(bound)
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)).date(),
+                               datetime.fromisoformat(match.group(2)).date()))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def get_trade_partitions(session: Session) -> List[Tuple[str, date, date]]:
+    """ 成交表现有分区 [(分区名, 起始日, 结束日)]，按起始日排序；不含 detach 到一半的分区 """
+    return _trade_partitions(session, False)
+
+
+def _create_trade_partition(day: date, lock_timeout_ms: int) -> Optional[str]:
+    """ 建 day 当天的分区，返回分区名；等父表锁超时返回 None """
+    name = f"{TRADE_TABLE}_p{day:%Y%m%d}"
+    try:
+        with Session(engine) as session:
+            session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+            session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TRADE_TABLE} "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            ))
+            session.commit()
+    except OperationalError as e:
+        if getattr(e.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+            raise
+        logger.warning(f"trade partition {name} not created: lock timeout, retry next run")
+        return None
+    return name
+
+
+def maintain_trade_partitions(premake_days: int = TRADE_PARTITION_PREMAKE_DAYS,
+                              retention_days: int = TRADE_HISTORY_RETENTION_DAYS,
+                              retention_action: str = TRADE_HISTORY_RETENTION_ACTION,
+                              lock_timeout_ms: int = TRADE_PARTITION_LOCK_TIMEOUT_MS) -> dict:
+    """
+    定时任务（启动时也执行一次）：
+    1. 今天起 premake_days 天内没有分区覆盖的日期，各建一个按天分区；
+    2. 结束日早于保留期的分区 detach（保留为独立表，可另行导出）或 drop。
+    created_at 为 UTC，日期边界也按 UTC。
+    """
+    today = datetime.utcnow().date()
+    created, removed = [], []
+    # CONCURRENTLY 不能在事务里执行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # 上次 detach 中途失败的分区先收尾
+        pending = _trade_partitions(conn, True)
+        for name, _, _ in pending:
+            conn.execute(text(f"ALTER TABLE {TRADE_TABLE} DETACH PARTITION {name} FINALIZE"))
+        partitions = _trade_partitions(conn, False)
+
+    for offset in range(premake_days + 1):
+        day = today + timedelta(days=offset)
+        if any(start <= day and day + timedelta(days=1) <= end for _, start, end in partitions):
+            continue
+        name = _create_trade_partition(day, lock_timeout_ms)
+        if name:
+            created.append(name)
+
+    if retention_days > 0:
+        cutoff = today - timedelta(days=retention_days)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # 上次收尾的分区已经 detach
+            removed = [name for name, _, end in pending if end <= cutoff]
+            for name, _, end in partitions:
+                if end <= cutoff:
+                    conn.execute(text(f"ALTER TABLE {TRADE_TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+                    removed.append(name)
+            if retention_action == "drop":
+                # 已是独立表，删除不再锁父表
+                for name in removed:
+                    conn.execute(text(f"DROP TABLE {name}"))
+    if created or removed:
+        logger.info(f"trade partitions created: {created}, {retention_action}: {removed}")
+    return {"created": created, "removed": removed}
@@ -0,0 +1,95 @@
+"""
+全服经济指标视图（/api/public/economy）
+
+指标计算涉及全表聚合，不在请求里算：后台每 ECONOMY_VIEW_REFRESH_SECONDS 秒重建一次，
+请求直接返回缓存的 JSON，并发的未命中合并为一次计算。
+"""
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from app.core.config import GOVERNMENT_PLAYER_ID, ECONOMY_VIEW_REFRESH_SECONDS
+from app.crud import crud_player, crud_inventory, crud_monetary
+from app.db.db import engine
+from app.logic.cpi import DEFAULT_BASKET
+from app.logic.view_cache import ViewCache
+from app.models import GovernmentOrder, GovernmentActionLog
+from app.service.ExchangeService import calculate_cpi_baskets, calculate_wealth_distribution, get_cpi_trend, \
+    get_all_resource_market_snapshot, get_market_history, calculate_sector_24h_trade_stats, get_24h_trade_stats, \
+    trade_stats
+
+
+def build_economy_view(session: Session) -> dict:
+    """ 经济指标，每项只算一次 """
+    # 1. 货币维度
+    totals = crud_monetary.get_monetary_totals(session)
+    m0_cash = totals["cash"]  # 所有玩家口袋里的钱
+    locked_cash = totals["locked_cash"]  # 正在买单中锁定的钱
+    m1 = round(m0_cash + locked_cash, 3)
+
+    # 2. 市场活跃维度
+    daily_volume = get_24h_trade_stats(session)  # 过去24小时成交总额
+    trade_windows = trade_stats.windows()  # 1h / 24h / 7d 成交
+
+    # 3. 生产力维度 (社会总财富估计)
+    # 所有 Inventory 数量 * 该资源基础价格/市场均价
+    total_inventory_value = crud_monetary.get_inventory_value(session)
+
+    cpi_baskets = calculate_cpi_baskets(session)
+    cpi = cpi_baskets[DEFAULT_BASKET]
+    velocity_val = round(daily_volume['turnover'] / (m0_cash + locked_cash + total_inventory_value), 2)
+
+    # 4. 财富分布（Gini 也取自这里，只扫描一遍玩家）
+    wealth = calculate_wealth_distribution(session)
+
+    # 政府公开
+    cash = crud_player.get_player_by_id(session, GOVERNMENT_PLAYER_ID).cash
+    inventoy = crud_inventory.get_player_inventory(session, GOVERNMENT_PLAYER_ID)
+    current_policy = session.exec(
+        select(GovernmentActionLog).where(GovernmentActionLog.is_active == True)
+    ).first()
+
+    # 审计日志：给下方那个滚动列表
+    history_logs = session.exec(
+        select(GovernmentActionLog).order_by(GovernmentActionLog.created_at.desc()).limit(10)
+    ).all()
+
+    government_orders = session.exec(
+        select(GovernmentOrder).where(GovernmentOrder.status == 0)
+    ).all()
+
+    government = {
+        "cash": cash,
+        "inventory": inventoy,
+        "current_policy": current_policy,
+        "history": history_logs,
+        "orders": government_orders
+    }
+
+    return {
+        "m0": round(m0_cash, 3),
+        "m1": m1,
+        "market_24h": daily_volume,
+        "market_windows": trade_windows,
+        "total_assets_value": round(m1 + total_inventory_value, 3),
+        "cpi": cpi,  # 物价指数
+        "cpi_baskets": cpi_baskets,  # 各篮子（全部、等权、各行业）的物价指数
+        "cpi_trend": get_cpi_trend(session, cpi),
+        "gini": wealth["gini"],
+        "wealth": wealth,  # 分位数、头部占比、洛伦茨曲线；玩家多时为草图近似值
+        "velocity_val": velocity_val,  # 24h流转速率
+        "timestamp": datetime.utcnow(),
+        "history": get_market_history(session),
+        "sectors": calculate_sector_24h_trade_stats(session),
+        "resources": get_all_resource_market_snapshot(session),
+        "government": government
+    }
+
+
+def _build():
+    with Session(engine) as session:
+        return build_economy_view(session)
+
+
+# timestamp 为生成时间，每次重建都变，不计入 ETag
+economy_view = ViewCache("economy", _build, ECONOMY_VIEW_REFRESH_SECONDS, volatile=("timestamp",))
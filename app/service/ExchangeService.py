@@ -1,22 +1,42 @@
+import asyncio
 import random
+from collections import defaultdict
 from abc import ABC
-from typing import Dict
+from typing import Dict, List, Tuple
 import json
 
-from app.core.config import APP_CONFIG, GOVERNMENT_PLAYER_ID
+from app.core.config import APP_CONFIG, GOVERNMENT_PLAYER_ID, EXCHANGE_PUSH_INTERVAL_MS, EXCHANGE_JOURNAL_DIR, \
+    EXCHANGE_JOURNAL_FSYNC_MS, EXCHANGE_JOURNAL_SNAPSHOT_SECONDS, WEALTH_STREAM_CHUNK_SIZE, WEALTH_APPROX_THRESHOLD, \
+    WEALTH_SKETCH_ACCURACY, HEARTBEAT_BUDGET_SECONDS, LIQUIDITY_CACHE_SECONDS
+from app.core.error import GameError, NotFoundError
 from app.db.db import engine
 from app.db.session import SessionDep
-from app.crud import crud_market, crud_inventory, crud_player, crud_resources
+from app.crud import crud_market, crud_inventory, crud_player, crud_resources, crud_candle, crud_monetary
 from app.dependencies import get_current_user
 from app.models import MarketOrder, TransactionActionType, MarketOrderPublic, Player, Inventory, Resource, \
-    ExchangeTradeHistory, ResourceSnapshot
+    ExchangeTradeHistory, MarketOrderCreate
 from typing import Dict
 from abc import ABC, abstractmethod
 from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.service import AccountingService
 from app.service import InventoryService
+from app.service import MonetaryService
+from app.service import SnapshotService
 from app.service.ws import WSServiceBase
 from app.service.ws import manager
+from app.logic.exchange import BookOrder, OrderBookManager
+from app.logic.exchange_journal import ExchangeJournal, order_rows
+from app.logic.market_data import MarketDataCache, MARKET_PRICE_TRADES, WINDOW
+from app.logic.cpi import DEFAULT_BASKET, ResourceMeta, compute_cpi
+from app.logic.wealth import ExactWealth, WealthSketch
+from app.logic.trade_stats import TradeStatsAggregator
+from app.logic.liquidity import DEPTH_BAND_COLUMNS, compute_liquidity
+from app.logic.view_cache import TtlCache
+from app.service.MatchingService import matching_engine
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import time
 import logging
 from datetime import datetime, timedelta
 from app.models import MarketSnapshot
@@ -24,6 +44,25 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# 内存订单簿，单进程部署
+order_books = OrderBookManager()
+# 行情缓存
+market_data = MarketDataCache()
+
+
+def _resource_industry(resource_id: int):
+    with Session(engine) as session:
+        resource = crud_resources.get_resource_cached(session, resource_id)
+        return resource.industry_id if resource else None
+
+
+# 成交滚动统计（1h / 24h / 7d，按资源、行业、全服）
+trade_stats = TradeStatsAggregator(_resource_industry)
+# 经济心跳各段耗时
+heartbeat_metrics = {"runs": 0, "over_budget": 0, "last": {}}
+# 订单簿事件日志
+exchange_journal = ExchangeJournal(EXCHANGE_JOURNAL_DIR, EXCHANGE_JOURNAL_FSYNC_MS)
+
 
 class PriceStrategy(ABC):
     """ 委托单价格 各种定价策略"""
@@ -37,7 +76,7 @@ class MarketAvgFollowerStrategy(PriceStrategy):
     """ 跟随当前市场价格 来定价"""
 
     def calculate_price(self, session: SessionDep, resource_id: int, context: Dict) -> float:
-        price = crud_market.get_resource_market_price(session, resource_id)
+        price = market_data.market_price(resource_id)
         return round(price * (1 + context["fluctuation_margin"]), 2)
 
 
@@ -56,46 +95,68 @@ def calculate_price_per_unit(
     return MarketAvgFollowerStrategy().calculate_price(session, resource_id, context or {})
 
 
-def execute_settlement(session: SessionDep, order_a: MarketOrder, order_b: MarketOrder, qty: int):
-    """ 处理订单结算：货物金钱转移 """
+class Settlement:
+    """
+    一次撮合的结算批次：收集所有成交，按玩家轧差后统一落库。
+    流水和成交记录逐笔保留，余额和库存每个玩家只更新一次。
+    """
+
+    def __init__(self, resource_id: int, tax_rate: float):
+        self.resource_id = resource_id
+        self.tax_rate = tax_rate
+        # (player_id, amount, action_type, ref_id)，按发生顺序
+        self.cash_changes: List[Tuple[int, float, int, int]] = []
+        # 买家获得的货物 player_id -> qty
+        self.inventory_changes: Dict[int, int] = defaultdict(int)
+        self.trades: List[dict] = []
+
+    def flush(self, session: SessionDep):
+        if not self.trades:
+            return
+        InventoryService.change_resources(session, self.resource_id, self.inventory_changes)
+        AccountingService.change_cash_batch(session, self.cash_changes)
+        crud_market.create_trade_records(session, self.trades)
+        crud_candle.upsert_candles(session, self.trades)
+        turnover = sum(t["total_amount"] for t in self.trades)
+        logger.info(f"settled {len(self.trades)} trades, resource:{self.resource_id} turnover:{round(turnover, 3)}")
+
+
+def execute_settlement(settlement: Settlement, order_a: MarketOrder, order_b: MarketOrder, qty: int):
+    """ 处理订单结算：货物金钱转移，记入结算批次 """
     sell_order = order_a if order_a.order_type == "sell" else order_b
     buy_order = order_b if order_b.order_type == "buy" else order_a
 
     strike_price = order_b.price_per_unit
     total_cash = qty * strike_price
-    tax = total_cash * get_current_tax_rate(session)
+    tax = total_cash * settlement.tax_rate
     total_cash -= tax
 
     total_cash = round(total_cash, 3)
     tax = round(tax, 3)
 
     # 给买家增加货物
-    InventoryService.change_resource(session, buy_order.player_id, buy_order.resource_id, qty)
+    settlement.inventory_changes[buy_order.player_id] += qty
     # 给卖家增加金钱， 包含扣除税
-    AccountingService.change_cash(session, sell_order.player_id, total_cash,
-                                  TransactionActionType.MARKET_SELL,
-                                  sell_order.id)
+    settlement.cash_changes.append((sell_order.player_id, total_cash,
+                                    TransactionActionType.MARKET_SELL, sell_order.id))
     # 政府收取了交易税费
-    AccountingService.change_cash(session, GOVERNMENT_PLAYER_ID, tax,
-                                  TransactionActionType.MARKET_TAX_REVENUE,
-                                  sell_order.id)
+    settlement.cash_changes.append((GOVERNMENT_PLAYER_ID, tax,
+                                    TransactionActionType.MARKET_TAX_REVENUE, sell_order.id))
 
     # 买家挂单价大于成交价，退回差价
     if buy_order.price_per_unit > strike_price:
         refund = qty * (buy_order.price_per_unit - strike_price)
-        AccountingService.change_cash(session, buy_order.player_id, refund,
-                                      TransactionActionType.MARKET_REFUND,
-                                      buy_order.id)
-
+        settlement.cash_changes.append((buy_order.player_id, refund,
+                                        TransactionActionType.MARKET_REFUND, buy_order.id))
 
-    logger.info(f"order total:{total_cash} tax:{tax}")
-
-    crud_market.create_trade_record(session, sell_order.player_id,
-                                    buy_order.player_id,
-                                    order_b.resource_id,
-                                    quantity=qty,
-                                    price=strike_price
-                                    )
+    settlement.trades.append({
+        "seller_id": sell_order.player_id,
+        "buyer_id": buy_order.player_id,
+        "resource_id": order_b.resource_id,
+        "quantity": qty,
+        "price_per_unit": strike_price,
+        "total_amount": qty * strike_price,
+    })
 
 
 def refund_marker_order(session, order: MarketOrder):
@@ -111,67 +172,429 @@ def refund_marker_order(session, order: MarketOrder):
     print("refund market order !")
 
 
-def match_order(session: SessionDep, new_order: MarketOrder):
-    """ 在每次创建订单后执行 """
-    potential_matches = []
-    if new_order.order_type == "buy":
-        potential_matches = crud_market.get_sell_orders_where_le_price(session, new_order.resource_id,
-                                                                       new_order.price_per_unit,
-                                                                       )
-    if new_order.order_type == "sell":
-        potential_matches = crud_market.get_buy_orders_where_ge_price(session, new_order.resource_id,
-                                                                      new_order.price_per_unit,
-                                                                      )
-    for match in potential_matches:
-        if new_order.status != 0: break;
-        # 如果匹配了，但是发生自我冲突，跳过即可
-        if match.player_id == new_order.player_id:
+def check_price_band(session: SessionDep, resource_id: int, price: float):
+    """ 涨跌停：基准价的 0.5 ~ 2 倍，基准价取资源缓存 """
+    _check_price_band(crud_resources.get_resource_cached(session, resource_id), price)
+
+
+async def check_price_band_async(session: AsyncSession, resource_id: int, price: float):
+    _check_price_band(await crud_resources.get_resource_cached_async(session, resource_id), price)
+
+
+def _check_price_band(resource: Resource | None, price: float):
+    if not resource:
+        raise GameError("资源不存在")
+    min_price = resource.base_price * 0.5
+    max_price = resource.base_price * 2.0
+    if price > max_price:
+        raise GameError(f"价格超出涨停价: {max_price}")
+    if price < min_price:
+        raise GameError(f"价格低于跌停价: {min_price}")
+
+
+def check_orders_affordable(session: SessionDep, player_id: int, resource_id: int,
+                            orders_in: List[MarketOrderCreate]) -> List[str | None]:
+    """
+    按提交顺序预检资金/库存，返回每单的拒绝原因（None 为通过）。
+    只读不加锁，冻结时仍会在锁内再校验一次。
+    """
+    # 只取列值，不把 Player / Inventory 实体放进 session，避免冻结时读到旧值
+    cash = session.exec(select(Player.cash).where(Player.id == player_id)).one()
+    stock = session.exec(select(Inventory.quantity).where(
+        Inventory.player_id == player_id, Inventory.resource_id == resource_id
+    )).first() or 0
+    reasons = []
+    for order_in in orders_in:
+        if order_in.order_type == "buy":
+            cost = order_in.quantity * order_in.price_per_unit
+            if cost > cash:
+                reasons.append("资金不足")
+                continue
+            cash -= cost
+        elif order_in.order_type == "sell":
+            if order_in.quantity > stock:
+                reasons.append("库存不足")
+                continue
+            stock -= order_in.quantity
+        else:
+            reasons.append("订单类型错误")
             continue
+        reasons.append(None)
+    return reasons
+
+
+def match_orders(session: SessionDep, new_orders: List[MarketOrder]) -> List[List[Tuple[BookOrder, int]]]:
+    """
+    在内存订单簿上依次撮合新订单，返回每单的 [(对手挂单, 成交量)]。
+    确定本次涉及的玩家后按 id 顺序一次加锁，避免与其他资源的撮合事务死锁。
+    """
+    fills_list = []
+    player_ids = {GOVERNMENT_PLAYER_ID}
+    for new_order in new_orders:
+        book = order_books.get(new_order.resource_id)
         my_remaining = new_order.total_quantity - new_order.filled_quantity
-        match_remaining = match.total_quantity - match.filled_quantity
-        trade_qty = min(my_remaining, match_remaining)
+        fills = book.match(new_order.order_type, new_order.price_per_unit, my_remaining, new_order.player_id)
+        fills_list.append(fills)
+        player_ids.add(new_order.player_id)
+        player_ids.update(resting.player_id for resting, _ in fills)
+    AccountingService.lock_players(session, player_ids)
+    return fills_list
+
+
+def freeze_orders(session: SessionDep, player_id: int, resource_id: int, new_orders: List[MarketOrder]):
+    """ 冻结挂单所需库存/资金：卖单库存合并扣一次，买单逐单记流水、玩家只更新一次 """
+    sell_quantity = sum(o.total_quantity for o in new_orders if o.order_type == "sell")
+    if sell_quantity:
+        InventoryService.change_resource(session, player_id, resource_id, -sell_quantity)
+    AccountingService.change_cash_batch(session, [
+        (player_id, -o.total_quantity * o.price_per_unit, TransactionActionType.MARKET_BUY, o.id)
+        for o in new_orders if o.order_type == "buy"
+    ])
+    MonetaryService.record_locked_cash(session, player_id, sum(
+        o.total_quantity * o.price_per_unit for o in new_orders if o.order_type == "buy"))
+
+
+def settle_orders(session: SessionDep, new_orders: List[MarketOrder],
+                  fills_list: List[List[Tuple[BookOrder, int]]]) -> Settlement:
+    """ 结算同一资源一批新订单的撮合结果，未成交部分挂入订单簿，返回结算批次 """
+    resource_id = new_orders[0].resource_id
+    # 一次查询取回所有对手单
+    matches = crud_market.get_orders_by_ids(
+        session, list({resting.id for fills in fills_list for resting, _ in fills})
+    )
+    settlement = Settlement(resource_id, get_current_tax_rate(session))
+    for new_order, fills in zip(new_orders, fills_list):
+        for resting, trade_qty in fills:
+            match = matches.get(resting.id)
+            if not match or match.status != 0 or match.total_quantity - match.filled_quantity < trade_qty:
+                # 订单簿与数据库不一致，交给调用方回滚并重建
+                raise RuntimeError(f"order book out of sync, order {resting.id}")
+
+            execute_settlement(settlement, new_order, match, trade_qty)
+            # 买单按挂单价冻结，成交部分释放
+            buy_order = new_order if new_order.order_type == "buy" else match
+            MonetaryService.record_locked_cash(session, buy_order.player_id,
+                                               -trade_qty * buy_order.price_per_unit)
+            # 4. 更新订单状态
+            crud_market.update_order_filled_quantity(session, new_order.id, trade_qty)
+            crud_market.update_order_filled_quantity(session, match.id, trade_qty)
+    settlement.flush(session)
+
+    book = order_books.get(resource_id)
+    for new_order in new_orders:
+        if new_order.status == 0:
+            book.add(BookOrder.from_order(new_order))
+    return settlement
+
+
+def cancel_orders(session: SessionDep, resource_id: int, orders: List[MarketOrder]):
+    """ 撤单（同一资源）：退回剩余资金/库存，移出订单簿 """
+    refunds = []
+    stock_back: Dict[int, int] = defaultdict(int)
+    for order in orders:
+        remaining_qty = order.total_quantity - order.filled_quantity
+        if order.order_type == "buy":
+            refunds.append((order.player_id, remaining_qty * order.price_per_unit,
+                            TransactionActionType.MARKET_CANCEL_REFUND, order.id))
+            MonetaryService.record_locked_cash(session, order.player_id, -remaining_qty * order.price_per_unit)
+        if order.order_type == "sell":
+            stock_back[order.player_id] += remaining_qty
+        order.status = 2
+    AccountingService.change_cash_batch(session, refunds)
+    InventoryService.change_resources(session, resource_id, stock_back)
+    session.add_all(orders)
+    book = order_books.get(resource_id)
+    for order in orders:
+        book.remove(order.id)
+
+
+def order_events(orders: List[MarketOrder], fills_list: List[List[Tuple[BookOrder, int]]]) -> List[dict]:
+    """ 下单的日志事件：每单先 accepted，随后是它的成交 """
+    events = []
+    for order, fills in zip(orders, fills_list):
+        events.append({"type": "accepted", "resource_id": order.resource_id, "order_id": order.id,
+                       "player_id": order.player_id, "order_type": order.order_type,
+                       "price": order.price_per_unit, "quantity": order.total_quantity})
+        events.extend({"type": "fill", "resource_id": order.resource_id, "taker_id": order.id,
+                       "maker_id": resting.id, "quantity": qty, "price": resting.price}
+                      for resting, qty in fills)
+    return events
+
+
+def new_market_order(player_id: int, order_in: MarketOrderCreate) -> MarketOrder:
+    order = MarketOrder(
+        **order_in.model_dump()
+    )
+    order.player_id = player_id
+    order.total_quantity = order_in.quantity
+    order.filled_quantity = 0
+    order.status = 0
+    return order
+
+
+def place_market_orders(player_id: int, orders_in: List[MarketOrderCreate]) -> List[dict]:
+    """
+    批量下单（同一资源）：预检，撮合，冻结资金/库存，结算，一个事务提交。
+    由撮合 worker 在线程中调用，使用独立 session。
+    返回与 orders_in 一一对应的结果，预检未通过的订单带 error。
+    """
+    resource_id = orders_in[0].resource_id
+    settlement = None
+    events = []
+    with Session(engine) as session:
+        reasons = check_orders_affordable(session, player_id, resource_id, orders_in)
+        orders = [new_market_order(player_id, o) for o, reason in zip(orders_in, reasons) if reason is None]
+        try:
+            if orders:
+                crud_market.create_market_orders(session, orders)
+                # 先撮合再冻结：冻结也要锁 player 行，必须在统一加锁之后
+                fills_list = match_orders(session, orders)
+                freeze_orders(session, player_id, resource_id, orders)
+                settlement = settle_orders(session, orders, fills_list)
+                events = order_events(orders, fills_list)
+            placed = iter([{
+                "order_id": order.id,
+                "status": order.status,
+                "filled_quantity": order.filled_quantity,
+            } for order in orders])
+            results = [next(placed) if reason is None else {"error": reason} for reason in reasons]
+            session.commit()
+        except Exception:
+            # 订单簿已被撮合修改，以数据库为准重建
+            session.rollback()
+            reload_order_book(resource_id)
+            raise
+    # 提交后再记日志、更新行情
+    exchange_journal.append(events)
+    if settlement is not None:
+        market_data.record_trades(settlement.trades)
+        trade_stats.record_trades(settlement.trades)
+    return results
+
+
+def place_market_order(player_id: int, order_in: MarketOrderCreate) -> dict:
+    """ 下单，由撮合 worker 在线程中调用 """
+    result = place_market_orders(player_id, [order_in])[0]
+    if "error" in result:
+        raise GameError(result["error"])
+    return result
+
+
+ORDER_NOT_FOUND = "订单不存在"
 
-        if trade_qty <= 0: continue
 
-        execute_settlement(session, new_order, match, trade_qty)
-        # 4. 更新订单状态
-        crud_market.update_order_filled_quantity(session, new_order.id, trade_qty)
-        crud_market.update_order_filled_quantity(session, match.id, trade_qty)
+def cancel_market_orders(player_id: int, order_ids: List[int]) -> List[dict]:
+    """ 批量撤单（同一资源），由撮合 worker 在线程中调用，返回每单结果 """
+    with Session(engine) as session:
+        orders = crud_market.get_orders_by_ids(session, order_ids)
+        results = []
+        to_cancel = []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if not order or order.player_id != player_id:
+                results.append({"order_id": order_id, "error": ORDER_NOT_FOUND})
+            elif order.status != 0:
+                results.append({"order_id": order_id, "error": "订单已完成或已撤销"})
+            else:
+                to_cancel.append(order)
+                results.append({"order_id": order_id, "status": 2})
+        if not to_cancel:
+            return results
+        resource_id = to_cancel[0].resource_id
+        events = [{"type": "cancel", "resource_id": resource_id, "order_id": order.id} for order in to_cancel]
+        try:
+            cancel_orders(session, resource_id, to_cancel)
+            session.commit()
+        except Exception:
+            session.rollback()
+            reload_order_book(resource_id)
+            raise
+    exchange_journal.append(events)
+    return results
+
+
+def cancel_market_order(player_id: int, order_id: int) -> dict:
+    """ 撤单，由撮合 worker 在线程中调用 """
+    result = cancel_market_orders(player_id, [order_id])[0]
+    if result.get("error") == ORDER_NOT_FOUND:
+        # 预检之后订单已不在挂单表中（如已结束并归档），与预检查不到时一样按不存在处理
+        raise NotFoundError(ORDER_NOT_FOUND)
+    if "error" in result:
+        raise GameError(result["error"])
+    return result
 
 
-def calculate_cpi(session: SessionDep):
+def load_order_books():
     """
-    cpi指数
-    :param session:
-    :return:
+    启动时重建全部订单簿。
+    启用事件日志时先用 快照 + 日志 重放，与数据库中的挂单一致才采用，否则以数据库为准；
+    之后立即写一次快照，下次启动只需重放快照之后的事件。
+    """
+    with Session(engine) as session:
+        orders = crud_market.get_all_active_orders(session)
+    if not exchange_journal.enabled:
+        order_books.load(orders)
+        logger.info(f"order books loaded: {len(orders)} active orders")
+        return
+    exchange_journal.open()
+    books, seq = exchange_journal.replay()
+    mismatches = diff_order_books(books, orders)
+    if mismatches:
+        logger.warning(f"journal replay (seq {seq}) does not match database, "
+                       f"{len(mismatches)} mismatches, e.g. {mismatches[:5]}; loading from database")
+        order_books.load(orders)
+    else:
+        order_books.books = books.books
+        logger.info(f"order books replayed from journal up to seq {seq}: {len(orders)} active orders")
+    # worker 尚未启动，直接取快照
+    seq = exchange_journal.rotate()
+    exchange_journal.write_snapshot(seq, {rid: book_state(rid) for rid in order_books.books})
+
+
+def diff_order_books(books: OrderBookManager, orders: List[MarketOrder]) -> List[str]:
+    """ 比较订单簿与数据库中的进行中订单，返回不一致的描述 """
+    expected = {o.id: (o.resource_id, o.player_id, o.order_type, o.price_per_unit,
+                       o.total_quantity - o.filled_quantity) for o in orders}
+    actual = {o.id: (resource_id, o.player_id, o.order_type, o.price, o.remaining)
+              for resource_id, book in books.books.items() for o in book.orders()}
+    mismatches = []
+    for order_id in sorted(expected.keys() | actual.keys()):
+        if expected.get(order_id) != actual.get(order_id):
+            mismatches.append(f"order {order_id}: db={expected.get(order_id)} journal={actual.get(order_id)}")
+    return mismatches
+
+
+def book_state(resource_id: int) -> dict:
+    """ 单个资源的快照，由撮合 worker 调用，与该资源已记录的事件一致 """
+    return {"after": exchange_journal.resource_seq.get(resource_id, 0),
+            "orders": order_rows(order_books.get(resource_id))}
+
+
+async def snapshot_journal():
+    """ 切换日志分段，逐个资源经撮合队列取快照，写入后删除已覆盖的分段 """
+    if not exchange_journal.is_open:
+        return
+    seq = exchange_journal.rotate()
+    books = {}
+    for resource_id in list(order_books.books):
+        state = await matching_engine.submit(resource_id, partial(book_state, resource_id))
+        state["after"] = max(state["after"], seq)
+        books[resource_id] = state
+    exchange_journal.write_snapshot(seq, books)
+    logger.info(f"exchange journal snapshot at seq {seq}, {len(books)} books")
+
+
+async def journal_snapshot_task(interval: int = EXCHANGE_JOURNAL_SNAPSHOT_SECONDS):
+    """ 定期快照，控制启动时需要重放的事件数 """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await snapshot_journal()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"exchange journal snapshot failed. {e}")
+
+
+def verify_journal() -> dict:
+    """ 重放日志（快照 + 事件），与数据库中的进行中订单核对 """
+    exchange_journal.flush()
+    books, seq = exchange_journal.replay()
+    with Session(engine) as session:
+        orders = crud_market.get_all_active_orders(session)
+    mismatches = diff_order_books(books, orders)
+    return {"seq": seq, "active_orders": len(orders), "ok": not mismatches, "mismatches": mismatches[:100]}
+
+
+def load_market_data():
+    """ 启动时用 24h 内成交和各资源最近几笔成交预热行情缓存 """
+    with Session(engine) as session:
+        trades = {t.id: t for t in crud_market.get_trades_since(session, datetime.utcnow() - WINDOW)}
+        for t in crud_market.get_latest_trades_per_resource(session, MARKET_PRICE_TRADES):
+            trades.setdefault(t.id, t)
+        market_data.load(sorted(trades.values(), key=lambda t: (t.created_at, t.id)))
+    logger.info(f"market data loaded: {len(trades)} trades")
+
+
+def load_trade_stats():
+    """ 启动时用 7d 内按小时、24h 内按分钟聚合的成交预热滚动统计 """
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        industry_of = {row[0]: row[3] for row in crud_resources.get_resource_price_meta(session)}
+        hour_rows = crud_market.get_trade_buckets(session, now - timedelta(days=7), "hour")
+        minute_rows = crud_market.get_trade_buckets(session, now - timedelta(hours=24), "minute")
+    trade_stats.load(industry_of, hour_rows, minute_rows)
+    logger.info(f"trade stats loaded: {len(hour_rows)} hour buckets, {len(minute_rows)} minute buckets")
+
+
+def reload_order_book(resource_id: int):
+    """ 事务回滚后，以数据库为准重建该资源的订单簿 """
+    with Session(engine) as session:
+        order_books.load(crud_market.get_all_active_orders(session, resource_id), resource_id)
+    exchange_journal.append([{"type": "reset", "resource_id": resource_id,
+                              "orders": order_rows(order_books.get(resource_id))}])
+
+
+def get_order_book_snapshot(resource_id: int) -> dict:
+    """ L2 盘口快照，由撮合 worker 调用 """
+    return order_books.get(resource_id).l2_snapshot()
+
+
+def get_order_book_depth(resource_id: int, levels: int, cumulative: bool = False) -> dict:
+    """
+    聚合盘口深度，由撮合 worker 调用。
+    每档返回价格、剩余总量、订单数；cumulative 时附带从最优价累计的数量（深度图用）。
     """
-    resources = crud_resources.get_resources_all(session)
-    weighted_sum = 0.0
-    total_weight = 0.0
+    snapshot = order_books.get(resource_id).l2_snapshot(levels)
+
+    def rows(levels_):
+        result = []
+        total = 0
+        for price, quantity, count in levels_:
+            row = {"price": price, "quantity": quantity, "orders": count}
+            if cumulative:
+                total += quantity
+                row["cumulative"] = total
+            result.append(row)
+        return result
 
-    for resource in resources:
-        # 获取当前市场价（如果没有成交，回退到基准价）
-        recent_price = crud_market.get_resource_market_price(session, resource.id)
-        current_price = recent_price if recent_price > 0 else resource.base_price
+    return {
+        "resource_id": resource_id,
+        "seq": snapshot["seq"],
+        "asks": rows(snapshot["asks"]),
+        "bids": rows(snapshot["bids"]),
+    }
 
-        # 获取权重，确保最小值为 0.001 防止除以 0
-        weight = getattr(resource, 'base_weight', 1.0)
 
-        # 计算价格变动率：P_current / P_base
-        price_ratio = current_price / resource.base_price
+def get_market_prices(resource_ids: List[int]) -> np.ndarray:
+    """ 行情缓存中的市场价，与 resource_ids 对齐，无成交为 0 """
+    return np.fromiter((market_data.market_price(rid) for rid in resource_ids), dtype=float, count=len(resource_ids))
 
-        # 累加加权变动
-        weighted_sum += price_ratio * weight
-        total_weight += weight
 
-    if total_weight == 0:
-        return 1.0  # 默认基准值
+def calculate_cpi_baskets(session: SessionDep, names: List[str] | None = None) -> Dict[str, float]:
+    """ 各篮子的 cpi 指数，默认全部篮子（含每个行业）；只查询一次资源表 """
+    meta = ResourceMeta(crud_resources.get_resource_price_meta(session))
+    baskets = meta.baskets()
+    if names is not None:
+        missing = [name for name in names if name not in baskets]
+        if missing:
+            raise GameError(f"CPI 篮子不存在: {missing}")
+        baskets = {name: baskets[name] for name in names}
+    return compute_cpi(meta, get_market_prices(meta.ids), list(baskets.values()))
 
-    # 最终 CPI = 加权变动总和 / 总权重
-    return round(weighted_sum / total_weight, 3) * 100
+
+def calculate_cpi(session: SessionDep, basket: str = DEFAULT_BASKET):
+    """
+    cpi指数：市场价相对基准价的加权变动（没有成交的资源按基准价），默认篮子按 base_weight 加权
+    :param session:
+    :param basket: 篮子名，见 app.logic.cpi.BASKETS
+    :return:
+    """
+    return calculate_cpi_baskets(session, [basket])[basket]
 
 
-def get_player_assets_list(session: Session):
+def _player_wealth_statement():
+    """ 每个玩家（不含政府）的总资产：现金 + 库存按基准价估值 """
     # 1. 子查询：计算每个玩家的库存总价值
     # 注意：这里建议用 Inventory.resource_id 关联 Resource
     inventory_value_stmt = (
@@ -186,7 +609,7 @@ def get_player_assets_list(session: Session):
     )
 
     # 2. 主查询：玩家现金 + 库存价值 (使用 coalesce 处理没有库存的玩家)
-    statement = (
+    return (
         select(
             (Player.cash + func.coalesce(inventory_value_stmt.c.inv_val, 0)).label("total_wealth")
         )
@@ -194,63 +617,46 @@ def get_player_assets_list(session: Session):
         .outerjoin(inventory_value_stmt, Player.id == inventory_value_stmt.c.player_id)
     )
 
-    # 3. 执行并转换为 Python List
-    results = session.exec(statement).all()
-    return [float(wealth) for wealth in results]
+
+def calculate_wealth_distribution(session: Session, approximate: bool | None = None) -> dict:
+    """
+    财富分布：Gini、分位数、头部占比、洛伦茨曲线采样。
+    资产经服务端游标按 WEALTH_STREAM_CHUNK_SIZE 分块读出，直接写进 NumPy 数组；
+    approximate 为 None 时玩家数超过 WEALTH_APPROX_THRESHOLD 改用分位数草图（内存与玩家数无关）。
+    """
+    players = session.exec(select(func.count()).select_from(Player).where(Player.id != 0)).one()
+    if approximate is None:
+        approximate = players > WEALTH_APPROX_THRESHOLD
+    acc = WealthSketch(WEALTH_SKETCH_ACCURACY) if approximate else ExactWealth(players)
+    result = session.execute(_player_wealth_statement(), execution_options={"yield_per": WEALTH_STREAM_CHUNK_SIZE})
+    for rows in result.partitions():
+        acc.add(np.fromiter((float(row[0]) for row in rows), dtype=np.float64, count=len(rows)))
+    return acc.summary()
 
 
 def calculate_m0(session: SessionDep):
-    m0_cash = crud_player.total_cash(session)  # 你已有的：所有玩家口袋里的钱
-    return round(m0_cash, 3)
+    """ 所有玩家口袋里的钱，读增量维护的汇总 """
+    return round(crud_monetary.get_monetary_totals(session)["cash"], 3)
 
 
 def calculate_m1(session: SessionDep):
-    """ 计算m1 """
-    m0_cash = crud_player.total_cash(session)  # 你已有的：所有玩家口袋里的钱
-    locked_cash = crud_market.total_locked_buy_cash(session)  # 正在买单中锁定的钱
-    return round(m0_cash + locked_cash, 3)
+    """ 计算m1：M0 + 正在买单中锁定的钱 """
+    totals = crud_monetary.get_monetary_totals(session)
+    return round(totals["cash"] + totals["locked_cash"], 3)
 
 
 def calculate_total_assets(session: SessionDep):
     """ 社会总资产： m1 + 仓库价格 """
-    total_inventory_value = crud_inventory.get_all_assets_value(session)
+    total_inventory_value = crud_monetary.get_inventory_value(session)
     return round(calculate_m1(session) + total_inventory_value, 3)
 
 
 def calculate_gini(session: SessionDep):
     """ 计算财富gini指数
-    资产列表必须包含每个玩家的总资产（资金+库存估值）。
+    按每个玩家的总资产（资金+库存估值）计算，见 calculate_wealth_distribution。
     基尼系数范围 0 (完美平等) 到 1 (完美不平等)。
     """
-    assets_list = get_player_assets_list(session)
-
-    # 确保输入是 numpy 数组以便计算
-    assets = np.array(assets_list)
-
-    # 排除资产为 0 或负数的异常情况，如果需要可以自行处理
-    assets = assets[assets >= 0]
-    if len(assets) == 0:
-        return 0.0
-
-    # 1. 对资产进行排序（这是最关键的一步）
-    sorted_assets = np.sort(assets)
-    n = len(sorted_assets)
-
-    # 2. 计算洛伦茨曲线下的面积（梯形法则的简化版）
-    # 使用累积和来高效计算面积
-    cumulative_assets = np.cumsum(sorted_assets)
-
-    # 3. 应用基尼系数公式
-    # 公式: (n + 1 - 2 * sum(i * yi) / sum(yi)) / n
-    # 这里的 indices 是 [1, 2, ..., n]
-    indices = np.arange(1, n + 1)
-
-    # G = (np.sum(indices * sorted_assets) / np.sum(sorted_assets) - (n + 1) / 2) * (2 / n) # 另一种写法
-
-    # 标准的累积和公式实现（更常见）
-    gini = (2 * np.sum(indices * sorted_assets) - (n + 1) * np.sum(sorted_assets)) / (n * np.sum(sorted_assets))
-
-    return round(gini, 3)
+    return calculate_wealth_distribution(session)["gini"]
 
 
 def get_cpi_trend(session: Session, current_cpi: float):
@@ -271,215 +677,160 @@ def get_cpi_trend(session: Session, current_cpi: float):
 
 def get_24h_trade_stats(session: Session):
     """
-    宏观数据核心：计算过去 24 小时全服交易额，交易订单数, 交易量
+    宏观数据核心：过去 24 小时全服交易额，交易订单数, 交易量
+    读内存滚动统计，不扫描成交表
     """
-    time_threshold = datetime.utcnow() - timedelta(hours=24)
-    statement = select(
-        func.sum(ExchangeTradeHistory.total_amount).label("total_turnover"),
-        func.count(ExchangeTradeHistory.id).label("trade_count"),
-        func.sum(ExchangeTradeHistory.quantity).label("total_quantity")
-    ).where(ExchangeTradeHistory.created_at >= time_threshold)
-
-    result = session.exec(statement).first()
-    return {
-        "turnover": round(result[0] or 0.0, 3),
-        "volume": result[2] or 0,
-        "count": result[1] or 0
-    }
+    return trade_stats.totals("24h")
 
 
 def calculate_sector_24h_trade_stats(session: SessionDep):
-    # 1. 定义时间窗口（过去24小时）
-    one_day_ago = datetime.now() - timedelta(days=1)
-
-    # 2. 构造聚合查询
-    # 我们需要：Resource.category (产业链名称), sum(成交额)
-    statement = (
-        select(
-            Resource.industry_id,
-            func.sum(ExchangeTradeHistory.price_per_unit * ExchangeTradeHistory.quantity).label("turnover"),
-            func.sum(ExchangeTradeHistory.quantity).label("volume")
-        )
-        .join(ExchangeTradeHistory, Resource.id == ExchangeTradeHistory.resource_id)
-        .where(ExchangeTradeHistory.created_at >= one_day_ago)
-        .group_by(Resource.industry_id)
-    )
-
-    # 3. 执行查询
-    results = session.exec(statement).all()
-    # 4. 格式化为前端需要的 JSON 列表
-    # result 每一行是一个 Row 对象，包含 name 和 volume
-    sector_data = [
-        {
-            "industry_id": row.industry_id,
-            "turnover": round(row.turnover, 3) if row.turnover else 0.0,
-            "volume": row.volume
-        }
-        for row in results
+    """ 过去 24 小时各产业链的成交额、成交量，只列有成交的行业 """
+    return [
+        {"industry_id": industry_id, "turnover": stats["turnover"], "volume": stats["volume"]}
+        for industry_id, stats in trade_stats.by_industry("24h").items()
+        if stats["count"] > 0
     ]
-    # 如果没有任何交易，返回空列表防止前端图表报错
-    return sector_data
 
 
-def create_market_snapshot():
-    """ 创建市场宏观快照 """
-    # 1. 调用你之前写的计算逻辑获取各项指标
-    # 这里的函数名需对应你实际定义的逻辑
+def _build_liquidity() -> Dict[int, dict]:
     with Session(engine) as session:
-        current_cpi = calculate_cpi(session)
-        m1 = calculate_m1(session)
-        total_assets = calculate_total_assets(session)
-        gini = calculate_gini(session)  # 记得传入 assets_list
-        daily_stat = get_24h_trade_stats(session)
-        # 2. 创建快照模型对象
-        snapshot = MarketSnapshot(
-            timestamp=datetime.now(),
-            cpi=current_cpi,
-            m1_total=m1,
-            total_assets=total_assets,
-            gini_index=gini,
-            volume=daily_stat['volume'],
-            turnover=daily_stat['turnover'],
-            order_count=daily_stat['count']
-        )
+        rows = crud_market.get_liquidity_rows(session, DEPTH_BAND_COLUMNS)
+    return compute_liquidity(rows, trade_stats.by_resource("24h"))
 
-        # 3. 写入数据库
-        session.add(snapshot)
-        session.commit()
-        logger.info(f"[{datetime.now()}] 市场快照已保存")
 
+# 全部资源的流动性指标，经济页与交易所页共用，LIQUIDITY_CACHE_SECONDS 内不重算
+liquidity_cache = TtlCache("liquidity", _build_liquidity, LIQUIDITY_CACHE_SECONDS)
 
-def calculate_liquidity_score(session: SessionDep, res_id: int):
-    """
-    计算资源的市场流动性
-    """
-    # 1. 获取过去24H成交笔数 (反映热度)
-    one_day_ago = datetime.now() - timedelta(days=1)
-    trade_count = session.exec(
-        select(func.count(ExchangeTradeHistory.id))
-        .where(ExchangeTradeHistory.resource_id == res_id)
-        .where(ExchangeTradeHistory.created_at >= one_day_ago)
-    ).first() or 0
-
-    # 2. 获取买卖价差 (反映市场共识)
-    min_ask = session.exec(select(func.min(MarketOrder.price_per_unit))
-                           .where(MarketOrder.resource_id == res_id, MarketOrder.order_type == "sell")).first()
-    max_bid = session.exec(select(func.max(MarketOrder.price_per_unit))
-                           .where(MarketOrder.resource_id == res_id, MarketOrder.order_type == "buy")).first()
-
-    spread_ratio = 1.0
-    if min_ask and max_bid and min_ask > 0:
-        spread_ratio = (min_ask - max_bid) / min_ask  # 价差越小越好
-
-    # 3. 综合评分逻辑 (算法可根据游戏手感调整)
-    # 基础分：成交笔数越多分越高 (封顶 60 分)
-    score = min(60, trade_count * 2)
-
-    # 修正分：价差越小加分越多 (最高加 40 分)
-    if spread_ratio < 0.01:
-        score += 40  # 价差在1%以内
-    elif spread_ratio < 0.05:
-        score += 20  # 价差在5%以内
-
-    return min(100, score)
-
-
-def get_resource_row(session: SessionDep, res_id: int):
-    """ 辅助资源快照 """
-    # 1. 获取当前最新成交价
-    current_price = session.exec(
-        select(ExchangeTradeHistory.price_per_unit)
-        .where(ExchangeTradeHistory.resource_id == res_id)
-        .order_by(ExchangeTradeHistory.id.desc())
-    ).first() or 0.0
-
-    # 2. 获取24小时前的价格 (计算 change)
-    one_day_ago = datetime.now() - timedelta(days=1)
-    old_price = session.exec(
-        select(ResourceSnapshot.price)
-        .where(ResourceSnapshot.resource_id == res_id, ResourceSnapshot.timestamp <= one_day_ago)
-        .order_by(ResourceSnapshot.timestamp.desc())
-    ).first() or current_price
-
-    change = round(((current_price - old_price) / old_price * 100), 2) if old_price > 0 else 0
-
-    # 3. 统计挂单深度 (Ask/Bid)
-    ask_v = (session.exec(
-        select(func.sum(MarketOrder.total_quantity - MarketOrder.filled_quantity))
-        .where(MarketOrder.resource_id == res_id, MarketOrder.order_type == "sell"))
-             .first() or 0)
-    bid_v = (session.exec(
-        select(func.sum(MarketOrder.total_quantity - MarketOrder.filled_quantity))
-        .where(MarketOrder.resource_id == res_id, MarketOrder.order_type == "buy"))
-             .first() or 0
-             )
-
-    # 4. 返回填充 JSON
-    return {
-        "resource_id": res_id,
-        "current_price": current_price,
-        "change": change,
-        "stock": session.exec(
-            select(func.sum(Inventory.quantity)).where(Inventory.resource_id == res_id)).first() or 0,
-        "ask_depth": ask_v,
-        "bid_depth": bid_v,
-        "liquidity": calculate_liquidity_score(session, res_id)  # 自定义评分函数
-    }
+
+def get_liquidity() -> Dict[int, dict]:
+    """ {resource_id: 流动性指标}，见 app.logic.liquidity """
+    return liquidity_cache.get()
 
 
 def get_all_resource_market_snapshot(session: SessionDep):
-    """ 所有资源的市场状态 """
-    resources = crud_resources.get_resources_all(session)
+    """
+    所有资源的市场状态：行情汇总一次查询，深度与流动性取自缓存。
+    stock 为全服库存（含政府）；turnover_ratio 的分母是 player_stock（玩家持有量，不含政府）
+    """
+    rows = crud_market.get_resource_market_rows(
+        session,
+        # 资源快照时间为本地时间
+        snapshot_before=datetime.now() - timedelta(days=1),
+    )
+    liquidity = get_liquidity()
     result = []
-    for res in resources:
-        result.append(get_resource_row(session, res.id))
+    for row in rows:
+        current_price = row["current_price"]
+        old_price = row["old_price"] or current_price
+        change = round(((current_price - old_price) / old_price * 100), 2) if old_price > 0 else 0
+        metrics = liquidity.get(row["resource_id"], {})
+        result.append({
+            "resource_id": row["resource_id"],
+            "current_price": current_price,
+            "change": change,
+            "stock": row["stock"],
+            "ask_depth": metrics.get("ask_depth", 0),
+            "bid_depth": metrics.get("bid_depth", 0),
+            "liquidity": metrics.get("liquidity", 0),
+            "spread_ratio": metrics.get("spread_ratio"),
+            "depth_1pct": metrics.get("ask_depth_1pct", 0) + metrics.get("bid_depth_1pct", 0),
+            "depth_5pct": metrics.get("ask_depth_5pct", 0) + metrics.get("bid_depth_5pct", 0),
+            "player_stock": metrics.get("player_stock", 0),
+            "turnover_ratio": metrics.get("turnover_ratio", 0.0),
+        })
     return result
 
 
+def _heartbeat_wealth() -> Tuple[dict, float]:
+    """ 心跳中耗时随玩家数增长的一段，独立连接，与其余指标并行；返回 (财富分布, 耗时) """
+    start = time.perf_counter()
+    with Session(engine) as session:
+        return calculate_wealth_distribution(session), round(time.perf_counter() - start, 3)
+
+
 def economy_heartbeat_task():
     """
     市场宏观快照和资源微观快照， 定时保存
 
-    :return:
+    各项指标都是集合查询或内存读取：
+      prices    资源表一次查询；cpi 与各资源最新成交价取自行情缓存
+      monetary  货币 / 库存汇总表
+      wealth    财富分布（流式扫描玩家），在另一个线程、另一个连接上与前两段并行
+      trades    24h 成交取自内存滚动统计
+      write     宏观快照 + 全部资源快照在一个事务里写入，资源快照为一条多行 INSERT
+    各段耗时记入 heartbeat_metrics，总耗时超过 HEARTBEAT_BUDGET_SECONDS 打警告。
+    :return: 各段耗时（秒）
     """
-    with Session(engine) as session:
-        # --- A. 存宏观快照 ---
-        create_market_snapshot()
+    start = time.perf_counter()
+    timings = {}
 
-        # --- B. 存每个资源的微观快照 ---
-        all_resources = session.exec(select(Resource)).all()
-        for res in all_resources:
-            row = get_resource_row(session, res.id)
-            snapshot = ResourceSnapshot(
-                resource_id=res.id,
-                price=row['current_price'],
-            )
-            session.add(snapshot)
-        session.commit()
+    def stage(name: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[name] = round(now - since, 3)
+        return now
 
-        logger.info("全服宏观与资源微观快照同步保存完成")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="heartbeat") as pool:
+        wealth_future = pool.submit(_heartbeat_wealth)
+        with Session(engine) as session:
+            t = time.perf_counter()
+            meta = ResourceMeta(crud_resources.get_resource_price_meta(session))
+            cpi = compute_cpi(meta, get_market_prices(meta.ids), [meta.baskets()[DEFAULT_BASKET]])[DEFAULT_BASKET]
+            prices = [market_data.get(rid).last_price or 0.0 for rid in meta.ids]
+            t = stage("prices", t)
+
+            totals = crud_monetary.get_monetary_totals(session)
+            m1 = round(totals["cash"] + totals["locked_cash"], 3)
+            total_assets = round(m1 + crud_monetary.get_inventory_value(session), 3)
+            t = stage("monetary", t)
+
+            daily_stat = trade_stats.totals("24h")
+            t = stage("trades", t)
+
+            wealth, timings["wealth"] = wealth_future.result()
+            # 主线程等待财富分布的时间
+            t = stage("wealth_wait", t)
+
+            # 快照时间为本地时间
+            timestamp = datetime.now()
+            session.add(MarketSnapshot(
+                timestamp=timestamp,
+                cpi=cpi,
+                m1_total=m1,
+                total_assets=total_assets,
+                gini_index=wealth["gini"],
+                volume=daily_stat['volume'],
+                turnover=daily_stat['turnover'],
+                order_count=daily_stat['count']
+            ))
+            crud_market.create_resource_snapshots(session, [
+                {"resource_id": rid, "price": price, "timestamp": timestamp}
+                for rid, price in zip(meta.ids, prices)
+            ])
+            session.commit()
+            stage("write", t)
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    heartbeat_metrics["runs"] += 1
+    heartbeat_metrics["last"] = timings
+    if timings["total"] > HEARTBEAT_BUDGET_SECONDS:
+        heartbeat_metrics["over_budget"] += 1
+        logger.warning(f"economy heartbeat over budget ({HEARTBEAT_BUDGET_SECONDS}s): {timings}")
+    logger.info(f"全服宏观与资源微观快照同步保存完成, {len(prices)} resources, timings: {timings}")
+    return timings
 
 
 def get_market_history(session: Session):
     """
-    获取市场历史快照
+    获取市场历史快照：最近 30 天，按 cpi 曲线形状降采样到约 SNAPSHOT_SERIES_POINTS 个点
 
     :param session:
     :return:
     """
-    snapshots = session.exec(
-        select(MarketSnapshot)
-        .order_by(MarketSnapshot.timestamp.desc())
-        .limit(1000)
-    ).all()
-
-    # 翻转回正序（因为 limit 用了 desc）
-    snapshots.reverse()
-
+    series = SnapshotService.get_market_series(session)
     return {
-        "dates": [s.timestamp.isoformat() for s in snapshots],
-        "cpi_values": [round(s.cpi, 2) for s in snapshots],
-        "volume_values": [round(s.volume, 0) for s in snapshots]
+        "dates": series["timestamps"],
+        "cpi_values": [round(v, 2) for v in series["cpi"]],
+        "volume_values": series["volume"]
     }
 
 
@@ -491,11 +842,51 @@ def get_current_tax_rate(session: SessionDep):
     return rate
 
 
+def merge_book_changes(pending: Tuple[str, dict], changes: Tuple[str, dict]) -> Tuple[str, dict]:
+    """
+    合并同一资源尚未推送的两次盘口变动。
+    档位数值是绝对量，后到的覆盖先到的；新快照直接替换，快照后的增量叠加到快照上。
+    合并后的增量 prev_seq 取最早一次，seq 取最新一次。
+    """
+    pending_type, old = pending
+    sub_type, new = changes
+    if sub_type == "snapshot":
+        return changes
+    asks = {level[0]: level for level in old["asks"]}
+    bids = {level[0]: level for level in old["bids"]}
+    asks.update((level[0], level) for level in new["asks"])
+    bids.update((level[0], level) for level in new["bids"])
+    merged = {
+        **old,
+        "seq": new["seq"],
+        "asks": sorted(asks.values()),
+        "bids": sorted(bids.values(), reverse=True),
+    }
+    if pending_type == "snapshot":
+        # 快照里不保留已清空的档位
+        merged["asks"] = [level for level in merged["asks"] if level[1] > 0]
+        merged["bids"] = [level for level in merged["bids"] if level[1] > 0]
+    return pending_type, merged
+
+
 class ExchangeWS(WSServiceBase):
+    """
+    交易所盘口推送（L2 档位）
+    切换资源时发一份全量快照，之后只推送变动档位；增量的 prev_seq 大于本地 seq 时说明漏了消息，
+    客户端发 resync 重新拉取快照。
+    撮合产生的变动先按资源合并，每个推送间隔最多发一次。
+    """
 
-    def __init__(self):
+    def __init__(self, push_interval_ms: int):
         """ username , resource id"""
         self.user_watching_resource: Dict[str, int] = {}
+        self.push_interval = push_interval_ms / 1000
+        # 待推送的盘口变动 resource_id -> (sub_type, data)
+        self.pending: Dict[int, Tuple[str, dict]] = {}
+        self.ticker: asyncio.Task | None = None
+        # changes: 撮合产生的变动次数，coalesced: 被合并掉的次数，
+        # sent: 实际广播次数，messages: 发给各连接的消息总数
+        self.metrics = {"changes": 0, "coalesced": 0, "sent": 0, "messages": 0}
 
     async def handle(self, user_name, sub_type, data):
         data = json.loads(data)
@@ -503,6 +894,8 @@ class ExchangeWS(WSServiceBase):
         """ 处理到来消息 """
         if sub_type == "switch_resource":
             await self.switch_resource(user_name, data)
+        elif sub_type == "resync":
+            await self.send_snapshot(user_name, data["resource_id"])
 
     def set_watching_resource(self, user_name: str, resource_id: int):
         """设置当前监督的资源（直接覆盖旧值）"""
@@ -513,42 +906,94 @@ class ExchangeWS(WSServiceBase):
         res_id = data["resource_id"]
         # 1. 记录该连接正在看这个 res_id
         self.set_watching_resource(user_name, resource_id=res_id)
-
         # 2. 切换瞬间，只给【当前这一个连接】发一份初始数据（Snapshot）
-        with Session(engine) as session:
-            orders = crud_market.get_active_orders_by_resource(session, res_id)
-            ret_orders = {
-                'asks': [],
-                'bids': []
-            }
-            for o in orders['asks']:
-                op = o.model_dump()
-                op['quantity'] = o.total_quantity - o.filled_quantity
-                op = MarketOrderPublic.model_validate(op)
-                ret_orders['asks'].append(op.model_dump(mode="json"))
-            for o in orders['bids']:
-                op = o.model_dump()
-                op['quantity'] = o.total_quantity - o.filled_quantity
-                op = MarketOrderPublic.model_validate(op)
-                op.quantity = o.total_quantity - o.filled_quantity
-                ret_orders['bids'].append(op.model_dump(mode="json"))
-
-            await manager.send_personal_message(user_name, {
-                "type": "exchange",
-                "sub_type": "snapshot",
-                "data": {
-                    "resource_id": res_id,
-                    "orders": ret_orders
-                }
-            })
-
-    async def broadcast_to_resource(self, resource_id: int, msg):
+        await self.send_snapshot(user_name, res_id)
+
+    async def send_snapshot(self, user_name: str, resource_id: int):
+        """
+        全量 L2 快照。
+        经撮合队列在两次撮合之间读取，与已推送的增量序号一致。
+        """
+        try:
+            snapshot = await matching_engine.submit(resource_id, partial(get_order_book_snapshot, resource_id))
+        except GameError as e:
+            logger.warning(f"order book snapshot failed. {e}")
+            return
+        await manager.send_personal_message(user_name, {
+            "type": "exchange",
+            "sub_type": "snapshot",
+            "data": snapshot
+        })
+
+    async def publish_book_changes(self, resource_id: int):
+        """ 撮合任务结束后取出该资源的盘口变动，放入待推送队列 """
+        changes = order_books.get(resource_id).drain_changes()
+        if changes is None:
+            return
+        self.metrics["changes"] += 1
+        if self.push_interval <= 0:
+            await self._push(resource_id, changes)
+            return
+        pending = self.pending.get(resource_id)
+        if pending is not None:
+            changes = merge_book_changes(pending, changes)
+            self.metrics["coalesced"] += 1
+        self.pending[resource_id] = changes
+        if self.ticker is None:
+            self.ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        """ 定时推送；单次出错只记日志，任务退出时清掉 ticker，下次有变动再启动 """
+        try:
+            while True:
+                await asyncio.sleep(self.push_interval)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.exception(f"order book flush failed. {e}")
+        finally:
+            if self.ticker is asyncio.current_task():
+                self.ticker = None
+
+    async def flush(self):
+        """ 推送全部待推送的盘口变动，一个资源推送失败不影响其余资源 """
+        pending, self.pending = self.pending, {}
+        for resource_id, changes in pending.items():
+            try:
+                await self._push(resource_id, changes)
+            except Exception as e:
+                logger.exception(f"order book push failed, resource {resource_id}. {e}")
+
+    async def _push(self, resource_id: int, changes: Tuple[str, dict]):
+        sub_type, data = changes
+        watchers = await self.broadcast_to_resource(resource_id, {
+            "type": "exchange",
+            "sub_type": sub_type,
+            "data": data
+        })
+        self.metrics["sent"] += 1
+        self.metrics["messages"] += watchers
+
+    async def stop(self):
+        if self.ticker is not None:
+            self.ticker.cancel()
+            self.ticker = None
+        await self.flush()
+
+    async def broadcast_to_resource(self, resource_id: int, msg) -> int:
+        """ 发给正在看该资源的玩家，返回接收人数 """
         watchers = [username for username, res_id in self.user_watching_resource.items() if
                     res_id == resource_id]
         logger.info(f"broadcast to {watchers}, {self.user_watching_resource}")
         for name in watchers:
-            await manager.send_personal_message(name, msg)
+            # 已断开但还没注销的连接发送会抛异常，不能挡住其他玩家
+            try:
+                await manager.send_personal_message(name, msg)
+            except Exception as e:
+                logger.warning(f"send to {name} failed. {e}")
+        return len(watchers)
 
 
-exchangeWs = ExchangeWS()
+exchangeWs = ExchangeWS(EXCHANGE_PUSH_INTERVAL_MS)
 manager.register("exchange", exchangeWs)
+matching_engine.add_listener(exchangeWs.publish_book_changes)
@@ -2,7 +2,9 @@ from app.core.error import GameError
 from app.db.session import SessionDep
 from app.models import Player, TransactionLog,Inventory
 from app.crud import crud_inventory
+from app.service import MonetaryService
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import logging
 
 from app.service.ws import manager
@@ -22,7 +24,7 @@ def change_resource(session:SessionDep, player_id:int,resource_id: int, quantity
         db_inventory = Inventory(
             player_id=player_id,
             resource_id=resource_id,
-            quantity=quantity
+            quantity=0
         )
         session.add(db_inventory)
 
@@ -34,6 +36,61 @@ def change_resource(session:SessionDep, player_id:int,resource_id: int, quantity
 
     session.add(db_inventory)
     session.flush()
+    MonetaryService.record_inventory(session, player_id, resource_id, quantity)
+
+
+async def change_resource_async(session: AsyncSession, player_id: int, resource_id: int, quantity: int):
+    """ change_resource 的异步版本 """
+    statement = select(Inventory).where(
+        Inventory.player_id == player_id,
+        Inventory.resource_id == resource_id
+    )
+    db_inventory = (await session.exec(statement)).first()
+
+    if not db_inventory:
+        db_inventory = Inventory(
+            player_id=player_id,
+            resource_id=resource_id,
+            quantity=0
+        )
+        session.add(db_inventory)
+
+    db_inventory.quantity += quantity
+
+    if db_inventory.quantity < 0:
+        raise GameError(f"库存资源不足 {resource_id}, change:{quantity}, after:{db_inventory.quantity}")
+
+    session.add(db_inventory)
+    await session.flush()
+    MonetaryService.record_inventory(session, player_id, resource_id, quantity)
+
+
+def change_resources(session:SessionDep, resource_id: int, changes):
+    """ 批量改变同一资源的库存：changes 为 {player_id: quantity}，一次查询取回所有库存行 """
+    if not changes:
+        return
+    statement = select(Inventory).where(
+        Inventory.resource_id == resource_id,
+        Inventory.player_id.in_(changes.keys())
+    )
+    inventories = {inv.player_id: inv for inv in session.exec(statement).all()}
+
+    for player_id, quantity in changes.items():
+        db_inventory = inventories.get(player_id)
+        if not db_inventory:
+            db_inventory = Inventory(
+                player_id=player_id,
+                resource_id=resource_id,
+                quantity=0
+            )
+            inventories[player_id] = db_inventory
+        db_inventory.quantity += quantity
+        if db_inventory.quantity < 0:
+            raise GameError(f"库存资源不足 {resource_id}, change:{quantity}, after:{db_inventory.quantity}")
+        MonetaryService.record_inventory(session, player_id, resource_id, quantity)
+
+    session.add_all(inventories.values())
+    session.flush()
 
 
 def get_player_current_inventory_value(session:SessionDep, player_id:int):
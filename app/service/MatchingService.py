@@ -0,0 +1,113 @@
+"""
+撮合调度
+
+每个资源一个串行 worker（单写者），请求把撮合任务放进该资源的有界队列后等待结果。
+同一资源的下单/撤单排队依次执行，订单簿和对手单不会被并发修改；
+不同资源的 worker 在独立线程中并行撮合。
+每个任务结束后依次调用监听器（如推送盘口增量），监听器与该资源的任务同样是串行的。
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import MATCHING_QUEUE_SIZE, MATCHING_THREADS
+from app.core.error import GameError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 死锁 / 序列化失败，可以整体重试
+RETRYABLE_SQLSTATES = ("40P01", "40001")
+MAX_RETRIES = 3
+
+
+class MatchingEngine:
+
+    def __init__(self, queue_size: int, threads: int):
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="matching")
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.listeners: List[Callable[[int], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[int], Awaitable[None]]):
+        """ 注册任务完成监听器，参数为 resource_id """
+        self.listeners.append(listener)
+
+    def _queue(self, resource_id: int) -> asyncio.Queue:
+        """ 懒创建资源队列和对应 worker """
+        queue = self.queues.get(resource_id)
+        if queue is None:
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self.queues[resource_id] = queue
+            self.workers[resource_id] = asyncio.create_task(self._worker(resource_id, queue))
+        return queue
+
+    async def submit(self, resource_id: int, job: Callable[[], Any]) -> Any:
+        """
+        提交撮合任务并等待执行结果。
+        job 在撮合线程中执行，异常原样抛回给调用方；队列满时直接拒绝。
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue(resource_id).put_nowait((job, future))
+        except asyncio.QueueFull:
+            raise GameError("交易所繁忙，请稍后重试")
+        return await future
+
+    @staticmethod
+    def _run(job: Callable[[], Any]) -> Any:
+        """
+        执行任务，遇到死锁重试。
+        不同资源的 worker 会并发锁 player 行，任务本身是完整事务，失败已回滚，可以安全重做。
+        """
+        for attempt in range(MAX_RETRIES):
+            try:
+                return job()
+            except OperationalError as e:
+                if getattr(e.orig, "sqlstate", None) not in RETRYABLE_SQLSTATES or attempt == MAX_RETRIES - 1:
+                    raise
+                logger.warning(f"matching job deadlock, retry {attempt + 1}")
+
+    async def _worker(self, resource_id: int, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future = await queue.get()
+            try:
+                result = await loop.run_in_executor(self.executor, self._run, job)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                # 请求方可能已断开，任务照常执行完
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                await self._notify(resource_id)
+                queue.task_done()
+
+    async def _notify(self, resource_id: int):
+        for listener in self.listeners:
+            try:
+                await listener(resource_id)
+            except Exception as e:
+                logger.exception(f"matching listener failed. {e}")
+
+    def pending(self) -> Dict[int, int]:
+        """ 各资源排队中的任务数 """
+        return {resource_id: queue.qsize() for resource_id, queue in self.queues.items()}
+
+    async def stop(self):
+        """ 等待排队任务执行完，再停止 worker """
+        for queue in self.queues.values():
+            await queue.join()
+        for task in self.workers.values():
+            task.cancel()
+        self.queues.clear()
+        self.workers.clear()
+        self.executor.shutdown(wait=True)
+
+
+matching_engine = MatchingEngine(MATCHING_QUEUE_SIZE, MATCHING_THREADS)
@@ -0,0 +1,122 @@
+"""
+货币总量（M0、买单冻结资金）与全服库存的增量维护
+
+资金 / 库存 / 冻结资金变动时调用 record_*，增量先记在 session 上，
+事务提交前（before_commit）一次写入汇总表，回滚则丢弃，汇总与余额始终同一事务生效。
+写汇总表放在事务最后，行锁只持有到提交为止，也不会和玩家行锁交叉形成死锁。
+政府（GOVERNMENT_PLAYER_ID）不计入，与全表扫描的口径一致。
+
+reconcile_aggregates 定时用全表扫描核对并修正（漏记的写入路径、直接改库等）。
+"""
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from app.core.config import GOVERNMENT_PLAYER_ID, MONETARY_AGGREGATE_SHARDS
+from app.crud import crud_monetary, crud_player, crud_market
+from app.db.db import engine
+
+logger = logging.getLogger(__name__)
+
+DELTA_KEY = "monetary_delta"
+# 浮点累加误差以内不告警
+TOLERANCE = 0.01
+# 对账等待汇总行锁的上限，超时本轮放弃，下一轮再对
+RECONCILE_LOCK_TIMEOUT_MS = 5000
+
+
+class MonetaryDelta:
+    """ 一个事务内累计的增量 """
+    __slots__ = ("cash", "locked_cash", "inventory")
+
+    def __init__(self):
+        self.cash = 0.0
+        self.locked_cash = 0.0
+        self.inventory: Dict[int, int] = defaultdict(int)
+
+
+def _delta(session) -> MonetaryDelta:
+    delta = session.info.get(DELTA_KEY)
+    if delta is None:
+        delta = session.info[DELTA_KEY] = MonetaryDelta()
+    return delta
+
+
+def record_cash(session, player_id: int, amount: float):
+    """ 玩家资金变动 amount """
+    if player_id != GOVERNMENT_PLAYER_ID and amount:
+        _delta(session).cash += amount
+
+
+def record_locked_cash(session, player_id: int, amount: float):
+    """ 买单冻结资金变动 amount：挂单为正，成交 / 撤单释放为负 """
+    if player_id != GOVERNMENT_PLAYER_ID and amount:
+        _delta(session).locked_cash += amount
+
+
+def record_inventory(session, player_id: int, resource_id: int, quantity: int):
+    if player_id != GOVERNMENT_PLAYER_ID and quantity:
+        _delta(session).inventory[resource_id] += quantity
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _apply_delta(session):
+    delta = session.info.pop(DELTA_KEY, None)
+    if delta is None:
+        return
+    crud_monetary.add_deltas(session, random.randrange(MONETARY_AGGREGATE_SHARDS),
+                             delta.cash, delta.locked_cash, delta.inventory)
+
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _discard_delta(session, transaction):
+    # 回滚或关闭时丢弃未提交的增量（提交时已在 before_commit 中取走）
+    if transaction.parent is None:
+        session.info.pop(DELTA_KEY, None)
+
+
+def reconcile_aggregates() -> dict:
+    """
+    定时任务（启动时也执行一次）：锁住汇总行后全表扫描核对，有偏差则修正为扫描值。
+    锁住期间其他事务提交前写汇总会排队，扫描看到的正好是已提交的全部变动。
+    """
+    start = time.perf_counter()
+    with Session(engine) as session:
+        shards, inventory = crud_monetary.lock_aggregates(session, MONETARY_AGGREGATE_SHARDS,
+                                                          RECONCILE_LOCK_TIMEOUT_MS)
+        actual_cash = crud_player.total_cash(session)
+        actual_locked = crud_market.total_locked_buy_cash(session)
+        actual_inventory = crud_monetary.scan_inventory_totals(session)
+
+        cash_diff = actual_cash - sum(s.cash for s in shards)
+        locked_diff = actual_locked - sum(s.locked_cash for s in shards)
+        if abs(cash_diff) > TOLERANCE or abs(locked_diff) > TOLERANCE:
+            logger.warning(f"monetary aggregates drifted: cash {round(cash_diff, 3)}, "
+                           f"locked_cash {round(locked_diff, 3)}; corrected")
+
+        inventory_drift = {}
+        for resource_id in sorted(actual_inventory.keys() | inventory.keys()):
+            row = inventory.get(resource_id)
+            diff = actual_inventory.get(resource_id, 0) - (row.quantity if row else 0)
+            if diff:
+                inventory_drift[resource_id] = diff
+        if inventory_drift:
+            logger.warning(f"inventory aggregates drifted: {inventory_drift}; corrected")
+        # 修正也走增量 upsert，与结算写入同一条路径
+        crud_monetary.add_deltas(session, 0, cash_diff, locked_diff, inventory_drift)
+        session.commit()
+
+    report = {
+        "cash_diff": round(cash_diff, 3) or 0.0,
+        "locked_cash_diff": round(locked_diff, 3) or 0.0,
+        "inventory_diff": inventory_drift,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"monetary aggregates reconciled: {report}")
+    return report
@@ -0,0 +1,127 @@
+"""
+快照时间序列：保留期压缩与区间查询
+
+market_snapshot / resource_snapshot 由经济心跳每小时写入，不压缩会无限增长：
+  小时快照超过 SNAPSHOT_HOURLY_RETENTION_DAYS 天压缩为日快照
+  日快照超过 SNAPSHOT_DAILY_RETENTION_DAYS 天压缩为周快照（周快照一直保留，每个资源每年 52 行）
+区间查询按跨度选粒度（桶数不超过目标点数的 OVERSAMPLE 倍），再用 LTTB 降到约 points 个点。
+快照时间为本地时间，区间参数也按本地时间。
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from sqlmodel import Session
+
+from app.core.config import SNAPSHOT_HOURLY_RETENTION_DAYS, SNAPSHOT_DAILY_RETENTION_DAYS, SNAPSHOT_SERIES_POINTS
+from app.core.error import GameError
+from app.crud import crud_snapshot
+from app.crud.crud_snapshot import MARKET_METRICS, INT_METRICS
+from app.db.db import engine
+from app.logic.timeseries import lttb
+from app.models import SnapshotResolution
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_SECONDS = {
+    SnapshotResolution.HOUR: 60 * 60,
+    SnapshotResolution.DAY: 24 * 60 * 60,
+    SnapshotResolution.WEEK: 7 * 24 * 60 * 60,
+}
+# 分桶后的点数最多为目标点数的几倍，再交给 LTTB 挑点
+OVERSAMPLE = 4
+# 区间查询默认跨度
+DEFAULT_SPAN = timedelta(days=30)
+
+
+def bucket_floor(ts: datetime, resolution: SnapshotResolution) -> datetime:
+    """ ts 所在日 / 周（周一起）的起始时间，与 date_trunc 一致 """
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == SnapshotResolution.WEEK:
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def compact_snapshots(now: Optional[datetime] = None) -> dict:
+    """
+    定时任务：压缩过了保留期的快照。
+    截止时间取整到日 / 周边界，一个桶总是整体压缩，不会被拆到两次执行里。
+    每一级一个短事务，返回各级写入的桶数。
+    """
+    now = now or datetime.now()
+    start = time.perf_counter()
+    levels = [
+        (SnapshotResolution.HOUR, SnapshotResolution.DAY, now - timedelta(days=SNAPSHOT_HOURLY_RETENTION_DAYS)),
+        (SnapshotResolution.DAY, SnapshotResolution.WEEK, now - timedelta(days=SNAPSHOT_DAILY_RETENTION_DAYS)),
+    ]
+    report = {}
+    for source, target, cutoff in levels:
+        before = bucket_floor(cutoff, target)
+        with Session(engine) as session:
+            market = crud_snapshot.rollup_market_snapshots(session, source, target, before)
+            resource = crud_snapshot.rollup_resource_snapshots(session, source, target, before)
+            session.commit()
+        report[f"{source}->{target}"] = {"market": market, "resource": resource}
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    if any(v["market"] or v["resource"] for k, v in report.items() if k != "seconds"):
+        logger.info(f"snapshots compacted: {report}")
+    return report
+
+
+def choose_resolution(start: datetime, end: datetime, points: int) -> SnapshotResolution:
+    """ 桶数不超过 points * OVERSAMPLE 的最细粒度 """
+    span = (end - start).total_seconds()
+    for resolution, seconds in RESOLUTION_SECONDS.items():
+        if span / seconds <= points * OVERSAMPLE:
+            return resolution
+    return SnapshotResolution.WEEK
+
+
+def _range(start: Optional[datetime], end: Optional[datetime]):
+    end = end or datetime.now()
+    start = start or end - DEFAULT_SPAN
+    if start >= end:
+        raise GameError("起始时间需早于结束时间")
+    return start, end
+
+
+def _downsample(rows, metric_index: int, points: int):
+    """ 以第 metric_index 列为 y 做 LTTB，返回选中的行 """
+    if len(rows) <= points:
+        return rows
+    x = np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    y = np.fromiter((float(row[metric_index]) for row in rows), dtype=np.float64, count=len(rows))
+    return [rows[i] for i in lttb(x, y, points)]
+
+
+def get_market_series(session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      points: int = SNAPSHOT_SERIES_POINTS, metric: str = "cpi") -> dict:
+    """ 宏观指标时间序列，按 metric 的形状做 LTTB，约 points 个点，按列返回 """
+    if metric not in MARKET_METRICS:
+        raise GameError(f"未知指标 {metric}")
+    start, end = _range(start, end)
+    resolution = choose_resolution(start, end, points)
+    rows = crud_snapshot.get_market_series(session, start, end, resolution)
+    rows = _downsample(rows, 1 + MARKET_METRICS.index(metric), points)
+    series = {
+        name: [int(row[i + 1]) if name in INT_METRICS else round(row[i + 1], 3) for row in rows]
+        for i, name in enumerate(MARKET_METRICS)
+    }
+    return {"resolution": resolution, "timestamps": [row[0].isoformat() for row in rows], **series}
+
+
+def get_resource_series(session: Session, resource_id: int, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, points: int = SNAPSHOT_SERIES_POINTS) -> dict:
+    """ 资源价格时间序列，约 points 个点 """
+    start, end = _range(start, end)
+    resolution = choose_resolution(start, end, points)
+    rows = _downsample(crud_snapshot.get_resource_series(session, resource_id, start, end, resolution), 1, points)
+    return {
+        "resource_id": resource_id,
+        "resolution": resolution,
+        "timestamps": [row[0].isoformat() for row in rows],
+        "prices": [round(row[1], 3) for row in rows],
+    }
@@ -0,0 +1,119 @@
+"""
+盘口合并推送：一个连接或一个资源推送失败，不能让定时推送停下来
+"""
+import asyncio
+
+import pytest
+
+from app.service import ExchangeService
+from app.service.ExchangeService import ExchangeWS
+from app.service.ws import manager
+
+INTERVAL_MS = 10
+
+
+class FakeSocket:
+    def __init__(self, broken: bool = False):
+        self.broken = broken
+        self.messages = []
+
+    async def send_json(self, message: dict):
+        if self.broken:
+            raise RuntimeError("websocket is closed")
+        self.messages.append(message)
+
+
+class FakeBook:
+    def __init__(self):
+        self.changes = None
+
+    def drain_changes(self):
+        changes, self.changes = self.changes, None
+        return changes
+
+
+class FakeBooks:
+    def __init__(self):
+        self.books = {}
+
+    def get(self, resource_id: int) -> FakeBook:
+        return self.books.setdefault(resource_id, FakeBook())
+
+
+@pytest.fixture
+def books(monkeypatch):
+    books = FakeBooks()
+    monkeypatch.setattr(ExchangeService, "order_books", books)
+    return books
+
+
+@pytest.fixture
+def sockets(monkeypatch):
+    sockets = {"bad": FakeSocket(broken=True), "good": FakeSocket(), "other": FakeSocket()}
+    monkeypatch.setattr(manager, "active_connections", sockets)
+    return sockets
+
+
+def watching_ws() -> ExchangeWS:
+    ws = ExchangeWS(INTERVAL_MS)
+    ws.user_watching_resource = {"bad": 1, "good": 1, "other": 2}
+    return ws
+
+
+async def publish(ws: ExchangeWS, books: FakeBooks, resource_id: int, seq: int):
+    books.get(resource_id).changes = ("delta", {"resource_id": resource_id, "seq": seq})
+    await ws.publish_book_changes(resource_id)
+
+
+async def next_tick():
+    await asyncio.sleep(INTERVAL_MS / 1000 * 5)
+
+
+def seqs(socket: FakeSocket) -> list:
+    return [message["data"]["seq"] for message in socket.messages]
+
+
+def test_broken_socket_does_not_stop_pushes(books, sockets):
+    async def run():
+        ws = watching_ws()
+        await publish(ws, books, 1, 1)
+        await publish(ws, books, 2, 1)
+        await next_tick()
+        await publish(ws, books, 1, 2)
+        await next_tick()
+        assert ws.ticker is not None and not ws.ticker.done()
+        await ws.stop()
+
+    asyncio.run(run())
+    assert seqs(sockets["good"]) == [1, 2]
+    assert seqs(sockets["other"]) == [1]
+
+
+def test_failed_resource_does_not_drop_batch(books, sockets, monkeypatch):
+    async def run():
+        ws = watching_ws()
+        broadcast = ws.broadcast_to_resource
+
+        async def flaky(resource_id, msg):
+            if resource_id == 1 and msg["data"]["seq"] == 1:
+                raise RuntimeError("push failed")
+            return await broadcast(resource_id, msg)
+
+        monkeypatch.setattr(ws, "broadcast_to_resource", flaky)
+        await publish(ws, books, 1, 1)
+        await publish(ws, books, 2, 1)
+        await next_tick()
+        await publish(ws, books, 1, 2)
+        await next_tick()
+
+        # ticker 意外退出后，下一次变动重新启动
+        ws.ticker.cancel()
+        await asyncio.sleep(0)
+        assert ws.ticker is None
+        await publish(ws, books, 2, 2)
+        await next_tick()
+        await ws.stop()
+
+    asyncio.run(run())
+    assert seqs(sockets["good"]) == [2]
+    assert seqs(sockets["other"]) == [1, 2]
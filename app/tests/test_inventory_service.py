@@ -0,0 +1,42 @@
+"""
+库存增减：首次获得某种资源时新建库存行，数量从 0 开始加
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session, SQLModel, select
+
+from app.core.error import GameError
+from app.models import Inventory
+from app.service import InventoryService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[Inventory.__table__])
+    with Session(engine) as session:
+        yield session
+
+
+def quantity(session: Session, player_id: int, resource_id: int) -> int:
+    return session.exec(select(Inventory.quantity).where(Inventory.player_id == player_id,
+                                                         Inventory.resource_id == resource_id)).one()
+
+
+def test_first_insert_credits_delta_once(session):
+    InventoryService.change_resource(session, 1, 7, 5)
+    assert quantity(session, 1, 7) == 5
+    InventoryService.change_resource(session, 1, 7, 3)
+    assert quantity(session, 1, 7) == 8
+
+
+def test_first_insert_cannot_go_negative(session):
+    with pytest.raises(GameError):
+        InventoryService.change_resource(session, 1, 7, -5)
+
+
+def test_batch_first_insert_credits_delta_once(session):
+    InventoryService.change_resource(session, 1, 7, 2)
+    InventoryService.change_resources(session, 7, {1: 4, 2: 5})
+    assert quantity(session, 1, 7) == 6
+    assert quantity(session, 2, 7) == 5
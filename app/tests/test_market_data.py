@@ -0,0 +1,32 @@
+"""
+行情缓存：24h 窗口在写入时就滚动，没有读取也不会无限增长
+"""
+from datetime import datetime, timedelta
+
+from app.logic.market_data import ResourceTicker
+
+
+def test_add_expires_window_without_reads():
+    ticker = ResourceTicker(1)
+    start = datetime(2026, 1, 1)
+    # 48h，每 10 分钟一笔，从不调用 stats()
+    for i in range(48 * 6):
+        ticker.add(10.0 + i % 7, 2, start + timedelta(minutes=10 * i))
+    last = start + timedelta(minutes=10 * (48 * 6 - 1))
+
+    assert len(ticker.window) <= 24 * 6 + 1
+    assert all(created_at >= last - timedelta(hours=24) for created_at, _, _ in ticker.window)
+    assert ticker.volume_24h == sum(q for _, _, q in ticker.window)
+    assert abs(ticker.turnover_24h - sum(p * q for _, p, q in ticker.window)) < 1e-6
+    assert len(ticker._highs) <= len(ticker.window) and len(ticker._lows) <= len(ticker.window)
+
+
+def test_stats_after_add_matches_window():
+    ticker = ResourceTicker(1)
+    start = datetime(2026, 1, 1)
+    ticker.add(50.0, 1, start)
+    ticker.add(10.0, 3, start + timedelta(hours=25))
+    stats = ticker.stats(start + timedelta(hours=25))
+    assert stats["high_24h"] == 10.0 and stats["low_24h"] == 10.0
+    assert stats["volume_24h"] == 3
+    assert stats["turnover_24h"] == 30.0
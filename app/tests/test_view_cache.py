@@ -0,0 +1,38 @@
+"""
+视图缓存的 ETag / Last-Modified：数据不变时重建不改变
+"""
+import asyncio
+from datetime import datetime
+
+from app.logic.view_cache import ViewCache
+
+
+def rebuild(cache: ViewCache, times: int):
+    async def run():
+        views = []
+        for _ in range(times):
+            views.append(await cache.refresh())
+            # Last-Modified 精确到秒，跨秒才能看出是否被刷新
+            await asyncio.sleep(1.1)
+        return views
+
+    return asyncio.run(run())
+
+
+def test_unchanged_data_keeps_etag_and_last_modified():
+    data = {"m0": 100.0, "cpi": 101.5}
+    cache = ViewCache("test", lambda: {**data, "timestamp": datetime.utcnow()}, 60, volatile=("timestamp",))
+    first, second = rebuild(cache, 2)
+    assert first.body != second.body
+    assert first.etag == second.etag
+    assert first.last_modified == second.last_modified
+
+
+def test_changed_data_changes_etag_and_last_modified():
+    data = {"m0": 100.0}
+    cache = ViewCache("test", lambda: {**data, "timestamp": datetime.utcnow()}, 60, volatile=("timestamp",))
+    first = rebuild(cache, 1)[0]
+    data["m0"] = 200.0
+    second = rebuild(cache, 1)[0]
+    assert first.etag != second.etag
+    assert second.last_modified > first.last_modified
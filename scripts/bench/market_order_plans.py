@@ -0,0 +1,125 @@
+"""
+market_order 索引基准
+
+在独立 schema 中复制 market_order 表结构，灌入大量历史订单（已完成 / 已撤单）和少量进行中订单，
+对比只有 status 索引（迁移前）和加上部分索引（迁移后）时，热点查询的执行计划与耗时。
+不会修改 public schema 中的数据。
+
+python -m scripts.bench.market_order_plans --rows 2000000
+"""
+import argparse
+
+from sqlalchemy import MetaData, text
+
+from app.db.db import engine
+from app.models import MarketOrder
+
+SCHEMA = "bench"
+BASELINE_INDEXES = {"ix_market_order_status"}
+
+# 与 crud_market 中的查询一致
+QUERIES = {
+    "盘口卖单": """
+        SELECT * FROM bench.market_order
+        WHERE resource_id = :rid AND status = 0 AND order_type = 'sell'
+        ORDER BY price_per_unit ASC, id ASC LIMIT 10""",
+    "盘口买单": """
+        SELECT * FROM bench.market_order
+        WHERE resource_id = :rid AND status = 0 AND order_type = 'buy'
+        ORDER BY price_per_unit DESC, id ASC LIMIT 10""",
+    "可成交卖单": """
+        SELECT * FROM bench.market_order
+        WHERE resource_id = :rid AND order_type = 'sell' AND price_per_unit <= :price AND status = 0
+        ORDER BY price_per_unit ASC, id ASC""",
+    "最低卖价": """
+        SELECT * FROM bench.market_order
+        WHERE resource_id = :rid AND order_type = 'sell' AND status = 0
+        ORDER BY price_per_unit ASC LIMIT 1""",
+    "最高买价": """
+        SELECT * FROM bench.market_order
+        WHERE resource_id = :rid AND order_type = 'buy' AND status = 0
+        ORDER BY price_per_unit DESC LIMIT 1""",
+    "买单锁定资金": """
+        SELECT sum(price_per_unit * (total_quantity - filled_quantity)) FROM bench.market_order
+        WHERE order_type = 'buy' AND status = 0 AND player_id != 0""",
+    "重建订单簿": """
+        SELECT * FROM bench.market_order WHERE status = 0 ORDER BY id""",
+}
+
+SEED_SQL = """
+INSERT INTO bench.market_order
+    (id, player_id, order_type, resource_id, quality, total_quantity, filled_quantity,
+     price_per_unit, status, created_at)
+SELECT g,
+       1 + (random() * 999)::int,
+       CASE WHEN random() < 0.5 THEN 'buy' ELSE 'sell' END,
+       1 + (random() * (:resources - 1))::int,
+       0,
+       q,
+       CASE WHEN g > :history THEN 0 WHEN random() < 0.9 THEN q ELSE (q * random())::int END,
+       round((5 + random() * 20)::numeric, 3),
+       CASE WHEN g > :history THEN 0 WHEN random() < 0.9 THEN 1 ELSE 2 END,
+       now() - (:rows - g) * interval '1 second'
+FROM (SELECT g, 10 + (random() * 90)::int AS q FROM generate_series(1, :rows) AS g) AS s
+"""
+
+
+def bench_indexes():
+    """ 模型上定义的索引，挂到 bench schema 的表上 """
+    table = MarketOrder.__table__.to_metadata(MetaData(), schema=SCHEMA)
+    return sorted(table.indexes, key=lambda index: index.name)
+
+
+def explain(conn, params, verbose: bool):
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = [row[0] for row in conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params)]
+        results[name] = plan
+        nodes = [line.strip() for line in plan if "Scan" in line or "Sort" in line]
+        print(f"  {name}: {plan[-1].strip()}")
+        for line in plan if verbose else nodes:
+            print(f"      {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="market_order 索引前后执行计划对比")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="订单总数")
+    parser.add_argument("--active", type=int, default=5_000, help="其中进行中的订单数")
+    parser.add_argument("--resources", type=int, default=16, help="资源种类")
+    parser.add_argument("--verbose", action="store_true", help="打印完整执行计划")
+    parser.add_argument("--keep", action="store_true", help="保留 bench schema")
+    args = parser.parse_args()
+
+    params = {"rows": args.rows, "history": args.rows - args.active, "resources": args.resources}
+    query_params = {"rid": 1, "price": 15}
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.market_order (LIKE public.market_order)"))
+        conn.execute(text(f"ALTER TABLE {SCHEMA}.market_order ADD PRIMARY KEY (id)"))
+        print(f"灌入 {args.rows} 条订单（进行中 {args.active}）...")
+        conn.execute(text(SEED_SQL), params)
+
+        indexes = bench_indexes()
+        for index in indexes:
+            if index.name in BASELINE_INDEXES:
+                index.create(conn)
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.market_order"))
+        print("迁移前（仅 status 索引）:")
+        explain(conn, query_params, args.verbose)
+
+        for index in indexes:
+            if index.name not in BASELINE_INDEXES:
+                index.create(conn)
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.market_order"))
+        print("迁移后:")
+        explain(conn, query_params, args.verbose)
+
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+撮合基准
+
+在独立 schema 中建全套表，灌入 N 个玩家、M 笔挂单，然后用固定随机种子生成的委托流
+经撮合队列调用真实的 ExchangeService.place_market_order（预检、撮合、冻结、结算、提交），统计：
+  - 吞吐（orders/sec）
+  - 单笔下单延迟 p50 / p99（从提交到撮合队列到返回，含排队）
+  - 每笔委托执行的 SQL 语句数
+  - 加锁语句（FOR UPDATE / FOR NO KEY UPDATE）耗时，以及采样到的会话锁等待时间
+同样的参数和种子得到同样的初始盘口和委托流，可以用 --baseline 与之前的结果比较，退步超过 --tolerance 时退出码为 1。
+回归门禁用 --concurrency 1：委托按流的顺序逐笔撮合，成交和语句数可以复现，只有耗时有波动；
+默认的并发 32 用来观察锁争用，客户端之间的交错不确定，结果只作参考。
+--baseline 只和参数（含并发数、种子）完全相同的基线比较，参数不同时直接报错。
+撮合依赖 PostgreSQL 的行锁、ON CONFLICT 和分区表，只支持 PostgreSQL；不会修改 public schema 中的数据。
+
+python -m scripts.bench.matching --players 1000 --resting 20000 --orders 5000 --output bench.json
+python -m scripts.bench.matching --concurrency 1 --output baseline.json          # 门禁基线
+python -m scripts.bench.matching --concurrency 1 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel
+
+# 事件日志写到临时目录：计入撮合开销，但不碰正式日志
+os.environ.setdefault("EXCHANGE_JOURNAL_DIR", tempfile.mkdtemp(prefix="bench-journal-"))
+
+from app.db.db import engine
+
+SCHEMA = "bench_matching"
+
+
+class SqlStats:
+    """ 通过 engine 事件统计语句数和加锁语句耗时，采样连接走原始 DBAPI 游标，不计入 """
+
+    def __init__(self):
+        self.enabled = False
+        self.statements = 0
+        self.lock_statements = 0
+        self.lock_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["bench_start"] = time.perf_counter()
+
+    def after(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - conn.info.pop("bench_start", time.perf_counter())
+        is_lock = "FOR UPDATE" in statement or "FOR NO KEY UPDATE" in statement
+        with self._lock:
+            self.statements += 1
+            if is_lock:
+                self.lock_statements += 1
+                self.lock_seconds += elapsed
+
+
+class LockWaitSampler(threading.Thread):
+    """ 定时采样 pg_stat_activity 中等待锁的会话数，累计为锁等待时间估计 """
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.wait_seconds = 0.0
+        self.max_waiting = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            while not self.stopped.is_set():
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND wait_event_type = 'Lock' AND pid <> pg_backend_pid()"
+                )
+                waiting = cursor.fetchone()[0]
+                conn.commit()
+                self.wait_seconds += waiting * self.interval
+                self.max_waiting = max(self.max_waiting, waiting)
+                time.sleep(self.interval)
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def use_bench_schema(dbapi_conn, connection_record):
+    """ 所有连接只看得到 bench schema，业务代码不用改 """
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.close()
+    dbapi_conn.commit()
+
+
+def seed(args):
+    """ 建表并灌入玩家、资源、库存和挂单 """
+    from app.service import ArchiveService
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    # 连接池里可能有 search_path 还没有 schema 时建立的连接
+    engine.dispose()
+    SQLModel.metadata.create_all(engine)
+    ArchiveService.maintain_trade_partitions(retention_days=0)
+
+    params = {"players": args.players, "resources": args.resources, "resting": args.resting,
+              "cash": args.cash, "stock": args.stock}
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO industry (id, name, icon) VALUES ('bench', 'bench', '')"))
+        conn.execute(text("""
+            INSERT INTO resource (id, name, base_price, icon, industry_id, base_weight, sensitivity)
+            SELECT g, 'r' || g, 10 + g, '', 'bench', 1, 0 FROM generate_series(1, :resources) AS g
+        """), params)
+        conn.execute(text("""
+            INSERT INTO player (id, name, email, password, is_bot, description, icon, level, experience, cash,
+                                rating, created_at)
+            SELECT g, 'p' || g, '', '', true, '', '', 1, 0, CASE WHEN g = 0 THEN 0 ELSE :cash END, 'B', now()
+            FROM generate_series(0, :players) AS g
+        """), params)
+        conn.execute(text("""
+            INSERT INTO inventory (player_id, resource_id, quantity)
+            SELECT p, r, :stock FROM generate_series(1, :players) AS p, generate_series(1, :resources) AS r
+        """), params)
+        # 挂单：卖单在基准价上方、买单在下方，各自已冻结（资金/库存不再从余额扣除，余额足够大）
+        conn.execute(text("""
+            INSERT INTO market_order (player_id, order_type, resource_id, quality, total_quantity, filled_quantity,
+                                      price_per_unit, status, created_at)
+            VALUES (:player_id, :side, :resource_id, 0, :quantity, 0, :price, 0, :created_at)
+        """), list(resting_orders(args)))
+        conn.execute(text(
+            "INSERT INTO game_config (key, value, \"group\") VALUES ('market_tax_rate', '0.05', 'market')"
+        ))
+        conn.execute(text("SELECT setval('player_id_seq', :players + 1)"), params)
+        conn.execute(text("SELECT setval('resource_id_seq', :resources + 1)"), params)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE player, inventory, market_order"))
+
+
+def resting_orders(args):
+    """ 固定种子的初始挂单，同一种子得到同样的盘口；created_at 相同，同价按 id 排队 """
+    rng = random.Random(f"{args.seed}:book")
+    created_at = datetime.utcnow()
+    for g in range(1, args.resting + 1):
+        side = "sell" if g % 2 == 0 else "buy"
+        resource_id = 1 + g % args.resources
+        spread = rng.uniform(0, 0.1)
+        yield {
+            "player_id": rng.randint(1, args.players),
+            "side": side,
+            "resource_id": resource_id,
+            "quantity": rng.randint(1, 50),
+            "price": round((10 + resource_id) * (1 + spread if side == "sell" else 1 - spread), 2),
+            "created_at": created_at,
+        }
+
+
+def order_stream(args):
+    """ 固定种子的委托流：价格在基准价 ±8% 内，约一半能立即成交 """
+    from app.models import MarketOrderCreate
+
+    rng = random.Random(args.seed)
+    created_at = datetime.utcnow().isoformat()
+    for _ in range(args.orders):
+        resource_id = rng.randint(1, args.resources)
+        base = 10 + resource_id
+        yield rng.randint(1, args.players), MarketOrderCreate(
+            order_type=rng.choice(["buy", "sell"]),
+            resource_id=resource_id,
+            price_per_unit=round(base * rng.uniform(0.92, 1.08), 2),
+            quantity=rng.randint(1, 20),
+            created_at=created_at,
+        )
+
+
+async def replay(args, stats: SqlStats):
+    """ 以 concurrency 个并发客户端把委托流提交给撮合队列 """
+    from app.core.error import GameError
+    from app.service import ExchangeService
+    from app.service.MatchingService import matching_engine
+
+    stream = iter(list(order_stream(args)))
+    latencies = []
+    errors = {}
+
+    async def client():
+        for player_id, order_in in stream:
+            start = time.perf_counter()
+            try:
+                await matching_engine.submit(order_in.resource_id,
+                                             partial(ExchangeService.place_market_order, player_id, order_in))
+            except GameError as e:
+                errors[e.message] = errors.get(e.message, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    stats.enabled = True
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    stats.enabled = False
+    await matching_engine.stop()
+    await ExchangeService.exchangeWs.stop()
+    ExchangeService.exchange_journal.close()
+    return elapsed, latencies, errors
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """ 与基线比较，返回退步项；参数不同的基线没有可比性 """
+    if result["params"] != baseline.get("params"):
+        sys.exit(f"基线参数不同，不能比较: {baseline.get('params')} vs {result['params']}")
+    regressions = []
+    if result["orders_per_sec"] < baseline["orders_per_sec"] * (1 - tolerance):
+        regressions.append(f"orders/sec {result['orders_per_sec']} < {baseline['orders_per_sec']}")
+    for key in ("p50_ms", "p99_ms", "statements_per_order"):
+        if result[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {result[key]} > {baseline[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="撮合 + 结算基准")
+    parser.add_argument("--players", type=int, default=1000, help="玩家数")
+    parser.add_argument("--resources", type=int, default=8, help="资源种类")
+    parser.add_argument("--resting", type=int, default=20_000, help="初始挂单数")
+    parser.add_argument("--orders", type=int, default=5_000, help="回放的委托数")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发提交的客户端数，门禁用 1")
+    parser.add_argument("--cash", type=float, default=10_000_000, help="每个玩家初始资金")
+    parser.add_argument("--stock", type=int, default=1_000_000, help="每个玩家每种资源初始库存")
+    parser.add_argument("--seed", type=int, default=42, help="初始挂单与委托流的随机种子")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="基线结果 JSON，退步时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退步比例")
+    parser.add_argument("--keep", action="store_true", help="保留 bench schema")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("撮合基准需要 PostgreSQL")
+
+    stats = SqlStats()
+    event.listen(engine, "connect", use_bench_schema)
+    event.listen(engine, "before_cursor_execute", stats.before)
+    event.listen(engine, "after_cursor_execute", stats.after)
+
+    from app.core.config import load_config
+    from app.service import ExchangeService
+
+    print(f"灌入 {args.players} 个玩家、{args.resources} 种资源、{args.resting} 笔挂单...")
+    seed(args)
+    load_config()
+    ExchangeService.load_order_books()
+    ExchangeService.load_market_data()
+
+    print(f"回放 {args.orders} 笔委托（并发 {args.concurrency}，种子 {args.seed}）...")
+    sampler = LockWaitSampler()
+    sampler.start()
+    elapsed, latencies, errors = asyncio.run(replay(args, stats))
+    sampler.stop()
+
+    with engine.connect() as conn:
+        trades = conn.execute(text("SELECT count(*) FROM exchange_trade_history")).scalar()
+    result = {
+        "orders": args.orders,
+        "trades": trades,
+        "rejected": sum(errors.values()),
+        "seconds": round(elapsed, 3),
+        "orders_per_sec": round(args.orders / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statements_per_order": round(stats.statements / args.orders, 2),
+        "lock_statements_per_order": round(stats.lock_statements / args.orders, 2),
+        "lock_statement_ms_per_order": round(stats.lock_seconds * 1000 / args.orders, 3),
+        "sampled_lock_wait_seconds": round(sampler.wait_seconds, 3),
+        "max_waiting_sessions": sampler.max_waiting,
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "keep", "tolerance")},
+    }
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+    if errors:
+        print(f"  预检拒绝: {errors}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    if not args.keep:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"  退步: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -121,11 +121,28 @@ class ProducerBot(BaseBot):
             logger.error(f"{self.username} create sell market failed. {resp.status_code} {resp.text}")
 
 
+    async def submit_orders(self, orders):
+        """ 一次请求批量提交委托 """
+        if not orders:
+            return
+        resp = await self.client.post("/api/exchange/orders/batch", json={"orders": orders})
+        if resp.status_code != 200:
+            logger.error(f"{self.username} batch market order failed. {resp.status_code} {resp.text}")
+            return
+        for order, result in zip(orders, resp.json()["results"]):
+            desc = f"{order['order_type']} {order['resource_id']}:{order['quantity']}@{order['price_per_unit']}"
+            if "error" in result:
+                logger.error(f"{self.username} create market order failed. {desc} {result['error']}")
+            else:
+                logger.info(f"{self.username} create market order succeed. {desc}")
+
     async def try_purchase(self):
         """ 目标为4个小时生产 """
         # 0. 先更新一次钱包余额（假设存在 self.balance）
         await self.sync_player()
         await self.sync_inventory()
+        available_cash = max(0, self.player['cash'] - self.reserve_cash)
+        orders = []
 
         # 1. 计算每秒消耗量
         # 消耗率 = (配方量 / 周期) * 建筑数
@@ -143,16 +160,25 @@ class ProducerBot(BaseBot):
                 needed_qty = target_amount - current_amount
                 resp = await self.client.get(f"/api/exchange/simple/{input_resource_id}")
                 simple_price = resp.json()
-                market_price = simple_price['market_price']
-                available_cash = max(0, self.player['cash'] - self.reserve_cash)
+                price = self.get_float_price(simple_price['market_price'], simple_price['base_price'], behavior='buy')
 
                 # 2. 核心：资金校验
                 # 钱包能买的最大数量 = 总余额 / 单价 (预留一部分钱手续费或生产费)
-                max_affordable = int((available_cash * 0.7// market_price))
+                max_affordable = int((available_cash * 0.7 // price))
                 # 3. 取 需求量 和 财力 之间的最小值
                 buy_qty = int(min(needed_qty, max_affordable))
-
-                await self.buy_market_order(input_resource_id, buy_qty)
+                if buy_qty <= 0:
+                    continue
+                available_cash -= buy_qty * price
+                orders.append({
+                    "order_type": "buy",
+                    "resource_id": input_resource_id,
+                    "price_per_unit": price,
+                    "quantity": buy_qty,
+                    "created_at": datetime.now().isoformat()
+                })
+        # 所有原料一次提交
+        await self.submit_orders(orders)
         logger.info(f"{self.username} try purchase done.")
 
     async def try_claim(self):
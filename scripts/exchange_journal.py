@@ -0,0 +1,48 @@
+"""
+交易所事件日志工具
+
+python -m scripts.exchange_journal verify            重放 快照 + 日志，与数据库中的进行中订单核对
+python -m scripts.exchange_journal replay --resource 1 --depth 10
+                                                     重放后打印该资源的盘口
+服务运行时日志有最多一个刷盘间隔的延迟，核对期间新成交的订单可能显示为差异，可停服后再核对。
+"""
+import argparse
+import sys
+
+from app.service import ExchangeService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="交易所事件日志")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("verify", help="重放并与数据库核对")
+    replay = sub.add_parser("replay", help="重放并打印盘口")
+    replay.add_argument("--resource", type=int, required=True)
+    replay.add_argument("--depth", type=int, default=10)
+    args = parser.parse_args()
+
+    journal = ExchangeService.exchange_journal
+    if not journal.enabled:
+        sys.exit("EXCHANGE_JOURNAL_DIR 未配置")
+
+    if args.command == "verify":
+        result = ExchangeService.verify_journal()
+        print(f"seq {result['seq']}, 进行中订单 {result['active_orders']}, "
+              f"{'一致' if result['ok'] else '不一致'}")
+        for line in result["mismatches"]:
+            print(f"  {line}")
+        sys.exit(0 if result["ok"] else 1)
+
+    books, seq = journal.replay()
+    snapshot = books.get(args.resource).l2_snapshot(args.depth)
+    print(f"seq {seq}, resource {args.resource}")
+    print("  卖盘:")
+    for price, quantity, count in reversed(snapshot["asks"]):
+        print(f"    {price:>10} {quantity:>8} x{count}")
+    print("  买盘:")
+    for price, quantity, count in snapshot["bids"]:
+        print(f"    {price:>10} {quantity:>8} x{count}")
+
+
+if __name__ == "__main__":
+    main()